@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""benchmark cmany's own hot paths with synthetic inputs. Usage:
+
+    python bench/hotpaths.py [-k PATTERN] [--repeat N] [--save NAME]
+                             [--compare NAME] [--max-slowdown F]
+
+Each case is timed with timeit, and the best of the repeats is reported as
+the time per call. --save writes the results to bench/results/NAME.json.
+Commit that file along with changes to the hot paths. --compare shows the
+change relative to a saved result. With --max-slowdown, the exit status is
+nonzero when a case gets slower than that factor, which flags regressions
+in review."""
+
+import os
+import sys
+import json
+import atexit
+import shutil
+import timeit
+import fnmatch
+import argparse
+import platform
+import tempfile
+from collections import OrderedDict as odict
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(root, 'src'))
+resultsdir = os.path.join(root, 'bench', 'results')
+
+# the cases must neither use nor fill the user's cmany dir (eg, with its
+# caches of the configs and of the cmake system info), so point it to a
+# scratch dir before cmany is imported
+userdir = tempfile.mkdtemp(prefix='cmany.bench.user.')
+atexit.register(shutil.rmtree, userdir, True)
+os.environ['CMANY_USER_DIR'] = userdir
+
+from c4.cmany import util  # noqa: E402
+
+
+cases = odict()
+
+
+def case(name, number=1):
+    """register a benchmark case. The decorated function receives a
+    scratch dir, does any setup, and returns the function to be timed,
+    which is called number times per repeat"""
+    def _reg(setup):
+        cases[name] = (setup, number)
+        return setup
+    return _reg
+
+
+def _write(path, txt):
+    d = os.path.dirname(path)
+    if not os.path.exists(d):
+        os.makedirs(d)
+    with open(path, 'w') as f:
+        f.write(txt)
+
+
+def _make_project(tmpdir):
+    projdir = os.path.join(tmpdir, 'proj')
+    _write(os.path.join(projdir, 'CMakeLists.txt'),
+           "cmake_minimum_required(VERSION 3.5)\nproject(bench NONE)\n")
+    return projdir
+
+
+def _project_kwargs(tmpdir, *args):
+    from c4.cmany import args as c4args
+    parser = argparse.ArgumentParser()
+    c4args.add_proj(parser)
+    c4args.add_select(parser)
+    c4args.add_bundle_flags(parser)
+    return vars(parser.parse_args([_make_project(tmpdir),
+                                   '--build-dir', os.path.join(tmpdir, 'build'),
+                                   '--install-dir', os.path.join(tmpdir, 'install')]
+                                  + list(args)))
+
+
+def _variants(num):
+    return ",".join(f"'v{i}: -D V{i} -X \"-O{i % 4}\"'" for i in range(num))
+
+
+# -----------------------------------------------------------------------------
+@case("project_1k_builds")
+def _(tmpdir):
+    """construct a project with 10 build types x 100 variants"""
+    from c4.cmany.project import Project
+    types = ",".join(f"T{i}" for i in range(10))
+    kwargs = _project_kwargs(tmpdir, '-t', types, '-v', _variants(100))
+    return lambda: Project(**kwargs)
+
+
+@case("valid_combinations", number=5)
+def _(tmpdir):
+    """filter 5x2x2x10x50 combinations with 4 rules"""
+    from c4.cmany.system import System
+    from c4.cmany.architecture import Architecture
+    from c4.cmany.compiler import Compiler
+    from c4.cmany.build_type import BuildType
+    from c4.cmany.variant import Variant
+    from c4.cmany.combination_rules import CombinationRules
+    s = [System(n) for n in ('linux', 'windows', 'mac', 'freebsd', 'android')]
+    a = [Architecture(n) for n in ('x86', 'x86_64')]
+    c = [Compiler.default()] * 2
+    t = [BuildType(f"T{i}") for i in range(10)]
+    v = [Variant(f"v{i}") for i in range(50)]
+    cr = CombinationRules([
+        ('x', 'builds_any', ['.*windows.*x86_64.*', '.*mac.*x86[^_].*']),
+        ('i', 'builds_any', ['.*-T[0-7]-.*']),
+        ('x', 'builds_all', ['.*android.*', '.*v1[0-9]$']),
+        ('x', 'variants', ['v4.*']),
+    ])
+    return lambda: cr.valid_combinations(s, a, c, t, v)
+
+
+@case("cmake_loadvars_10k", number=5)
+def _(tmpdir):
+    """load a CMakeCache.txt with 10k entries"""
+    from c4.cmany import cmake
+    lines = []
+    for i in range(10000):
+        if i % 10 == 0:
+            lines.append(f"// the help string for VAR{i}\n")
+        lines.append(f"VAR{i}:STRING=the value of variable number {i}\n")
+    _write(os.path.join(tmpdir, 'CMakeCache.txt'), "".join(lines))
+    return lambda: cmake.loadvars(tmpdir)
+
+
+@case("build_item_parse_args", number=20)
+def _(tmpdir):
+    """parse a spec list of 100 build items with flags"""
+    from c4.cmany.build_item import BuildItem
+    specs = _variants(100)
+    return lambda: BuildItem.parse_args(specs)
+
+
+@case("build_item_create", number=5)
+def _(tmpdir):
+    """create and resolve 100 variants with flags and references"""
+    from c4.cmany.build_item import BuildItem
+    from c4.cmany.variant import Variant
+    specs = _variants(99) + ",'vall: @v1 @v2 @v3 -D ALL'"
+    return lambda: BuildItem.create({'variants': (Variant, specs)})
+
+
+def _configs_seq(tmpdir):
+    from c4.cmany import conf
+    files = [os.path.join(conf.CONF_DIR, 'cmany.yml')]
+    for i in range(2):
+        fn = os.path.join(tmpdir, f'cfg{i}', 'cmany.yml')
+        aliases = "".join(f"  alias{i}_{j}:\n    gcc,clang: -DFOO{j}\n    vs: /DFOO{j}\n"
+                          for j in range(50))
+        _write(fn, f"project:\n  name: bench{i}\nflag_aliases:\n{aliases}")
+        files.append(fn)
+    return files
+
+
+def _configs_load_seq(files, cold):
+    """load the configs without the in-process memo, and with the on-disk
+    cache either emptied before each call (cold) or kept (warm)"""
+    from c4.cmany import conf
+    cachedir = os.path.join(conf.USER_DIR, conf.Configs.cache_dir)
+    prev = conf.Configs.memo
+    conf.Configs.memo = None
+    def run():
+        if cold:
+            shutil.rmtree(cachedir, ignore_errors=True)
+        return conf.Configs.load_seq(files)
+    run.teardown = lambda: setattr(conf.Configs, 'memo', prev)
+    return run
+
+
+@case("configs_load_seq_cold", number=5)
+def _(tmpdir):
+    """load, merge and cache the default config with two user configs"""
+    return _configs_load_seq(_configs_seq(tmpdir), cold=True)
+
+
+@case("configs_load_seq_warm", number=5)
+def _(tmpdir):
+    """load the default config with two user configs from the cache"""
+    return _configs_load_seq(_configs_seq(tmpdir), cold=False)
+
+
+@case("build_deserialize", number=10)
+def _(tmpdir):
+    """deserialize a build from its build dir"""
+    from c4.cmany.project import Project
+    from c4.cmany.build import Build
+    proj = Project(**_project_kwargs(tmpdir, '-v', _variants(3)))
+    b = proj.builds[-1]
+    b.create_dir()
+    b._serialize()
+    return lambda: Build.deserialize(b.builddir)
+
+
+# -----------------------------------------------------------------------------
+def run_case(name, repeat):
+    setup, number = cases[name]
+    tmpdir = tempfile.mkdtemp(prefix='cmany.bench.')
+    try:
+        with util.setcwd(tmpdir):
+            fn = setup(tmpdir)
+            fn()  # warm up
+            times = timeit.repeat(fn, number=number, repeat=repeat)
+            teardown = getattr(fn, 'teardown', None)
+            if teardown is not None:
+                teardown()
+    finally:
+        shutil.rmtree(tmpdir)
+    return odict([
+        ('best', min(times) / number),
+        ('median', sorted(times)[len(times) // 2] / number),
+        ('number', number),
+        ('repeat', repeat),
+    ])
+
+
+def result_file(name):
+    return os.path.join(resultsdir, name + '.json')
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    p.add_argument('-k', default='*', help="run only the cases matching this glob pattern")
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--list', action='store_true', help="list the cases and exit")
+    p.add_argument('--save', metavar='NAME', help="save the results to bench/results/NAME.json")
+    p.add_argument('--compare', metavar='NAME', help="compare with bench/results/NAME.json")
+    p.add_argument('--max-slowdown', type=float, default=None,
+                   help="fail if a case is slower than this factor of the compared results")
+    args = p.parse_args()
+    names = [n for n in cases if fnmatch.fnmatch(n, args.k)]
+    if args.list:
+        for n in names:
+            print(f"{n}: {cases[n][0].__doc__}")
+        return 0
+    ref = {}
+    if args.compare:
+        with open(result_file(args.compare)) as f:
+            ref = json.load(f)['cases']
+    results = odict()
+    slower = []
+    for n in names:
+        r = run_case(n, args.repeat)
+        results[n] = r
+        line = f"{n:25s} {r['best'] * 1e3:10.3f}ms"
+        prev = ref.get(n)
+        if prev is not None:
+            ratio = r['best'] / prev['best']
+            line += f"  {ratio:6.2f}x vs {args.compare}"
+            if args.max_slowdown is not None and ratio > args.max_slowdown:
+                slower.append(n)
+                line += "  <-- SLOWER"
+        print(line, flush=True)
+    if args.save:
+        if not os.path.exists(resultsdir):
+            os.makedirs(resultsdir)
+        data = odict([
+            ('python', platform.python_version()),
+            ('machine', platform.machine()),
+            ('cases', results),
+        ])
+        with open(result_file(args.save), 'w') as f:
+            json.dump(data, f, indent=2)
+            f.write("\n")
+        print("saved:", result_file(args.save))
+    if slower:
+        print(f"{len(slower)} cases are slower than {args.max_slowdown}x:",
+              ", ".join(slower), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
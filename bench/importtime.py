@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""measure the import time of cmany, as paid by every invocation of the
+cmany command. Usage:
+
+    python bench/importtime.py [--repeat N] [--module M] [--top N] [--budget-ms MS]
+
+The import is repeated in fresh interpreters, and the median times are
+reported. The exit status is nonzero when the median total exceeds the
+budget, so that this can be used to gate regressions. The default budget
+is the one checked in for c4.cmany.main; --budget-ms 0 disables it."""
+
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# the startup budget of the cmany command, ie of importing c4.cmany.main.
+# It was ~250ms before the imports were made lazy, and is now ~90ms;
+# the margin is for slow or loaded machines.
+budget_ms = 150.
+
+_line_re = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def measure(module):
+    """import the module in a fresh interpreter, and return a dict
+    {module: cumulative microseconds} for the top-level imports"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.join(root, 'src'), env.get('PYTHONPATH', '')])
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                         env=env, stderr=subprocess.PIPE, universal_newlines=True,
+                         check=True).stderr
+    times = {}
+    for line in out.splitlines():
+        m = _line_re.match(line)
+        if m is None:
+            continue
+        cumul, indent, name = int(m.group(2)), len(m.group(3)), m.group(4)
+        if indent <= 3:  # the module itself, or one of its direct imports
+            times[name] = times.get(name, 0) + cumul
+    return times
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    p.add_argument('--repeat', type=int, default=11)
+    p.add_argument('--module', default='c4.cmany.main')
+    p.add_argument('--top', type=int, default=15, help="show the N slowest imports")
+    p.add_argument('--budget-ms', type=float, default=budget_ms,
+                   help=f"fail if the median import time exceeds this. Default: {budget_ms}ms")
+    args = p.parse_args()
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    names = set()
+    for r in runs:
+        names.update(r.keys())
+    med = {n: statistics.median(r.get(n, 0) for r in runs) / 1000. for n in names}
+    total = med.get(args.module, 0.)
+    for n in sorted(med, key=lambda n: -med[n])[:args.top]:
+        print(f"{med[n]:9.2f}ms  {n}")
+    print(f"{args.module}: median import time {total:.2f}ms over {args.repeat} runs")
+    if args.budget_ms and total > args.budget_ms:
+        print(f"over budget: {total:.2f}ms > {args.budget_ms:.2f}ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""measure cmany's own overhead per build, driving configure, build and
+install over a build matrix with the fake toolchain in test/faketc.
+Usage:
+
+    python bench/overhead.py [--types N] [--variants N] [--latency S]
+                             [--output N] [--steps configure,build,install]
+                             [--proj DIR] [--json]
+
+Each step is a cmany invocation. The time spent inside the fake tools
+(which is the latency, plus writing the output) and the cost of spawning
+them are subtracted from the wall time of the step, and the remainder is
+reported per build as cmany's overhead."""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(root, 'test', 'faketc'))
+
+import faketc  # noqa: E402
+
+
+def spawn_cost(env, repeat=10):
+    """the median cost of spawning a fake tool, outside of the tool"""
+    t = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(['g++', '-dumpversion'], env=env, stdout=subprocess.DEVNULL, check=True)
+        t.append(time.perf_counter() - t0)
+    return statistics.median(t)
+
+
+def run(args):
+    tmpdir = tempfile.mkdtemp(prefix='cmany.overhead.')
+    try:
+        log = os.path.join(tmpdir, 'faketc.jsonl')
+        env = faketc.env(latency=args.latency, output=args.output, log=log)
+        env['CMANY_USER_DIR'] = os.path.join(tmpdir, 'user')
+        env['PYTHONPATH'] = os.pathsep.join([os.path.join(root, 'src'), env.get('PYTHONPATH', '')])
+        types = ",".join(f"T{i}" for i in range(args.types))
+        variants = ",".join(f"'v{i}: -D V{i}'" for i in range(args.variants))
+        nbuilds = args.types * args.variants
+        spawn = spawn_cost(env)
+        os.remove(log)
+        results = []
+        for step in args.steps.split(','):
+            cmd = [sys.executable, '-m', 'c4.cmany.main', step, '-t', types, '-v', variants,
+                   '--build-dir', os.path.join(tmpdir, 'build'),
+                   '--install-dir', os.path.join(tmpdir, 'install'),
+                   args.proj]
+            t0 = time.perf_counter()
+            subprocess.run(cmd, env=env, cwd=tmpdir, stdout=subprocess.DEVNULL, check=True)
+            wall = time.perf_counter() - t0
+            calls = faketc.read_log(log)
+            os.remove(log)
+            tools = sum(c['duration'] for c in calls)
+            overhead = wall - tools - spawn * len(calls)
+            results.append({
+                'step': step,
+                'builds': nbuilds,
+                'wall': wall,
+                'tool_calls': len(calls),
+                'tool_time': tools,
+                'spawn_time': spawn * len(calls),
+                'overhead': overhead,
+                'overhead_per_build': overhead / nbuilds,
+            })
+        return results
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    p.add_argument('--types', type=int, default=4, help="number of build types")
+    p.add_argument('--variants', type=int, default=8, help="number of variants")
+    p.add_argument('--latency', type=float, default=0., help="latency of each tool call, in seconds")
+    p.add_argument('--output', type=int, default=1, help="lines of output of each tool call")
+    p.add_argument('--steps', default='configure,build,install')
+    p.add_argument('--proj', default=os.path.join(root, 'test', 'libhello'))
+    p.add_argument('--json', action='store_true', help="print the results as json")
+    args = p.parse_args()
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'step':10s} {'builds':>6s} {'wall':>9s} {'calls':>6s} {'tools':>9s} "
+          f"{'spawn':>9s} {'overhead':>9s} {'per build':>10s}")
+    for r in results:
+        print(f"{r['step']:10s} {r['builds']:6d} {r['wall']:8.3f}s {r['tool_calls']:6d} "
+              f"{r['tool_time']:8.3f}s {r['spawn_time']:8.3f}s {r['overhead']:8.3f}s "
+              f"{r['overhead_per_build'] * 1e3:8.2f}ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,3 @@
-__import__('pkg_resources').declare_namespace(__name__)
+# pkgutil-style namespace: pkg_resources.declare_namespace() is equivalent,
+# but importing pkg_resources costs more than all of cmany's startup
+__path__ = __import__('pkgutil').extend_path(__path__, __name__)
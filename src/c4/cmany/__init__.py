@@ -2,11 +2,29 @@
 
 from .conf import *   # lgtm[py/polluting-import]
 
-from .build_flags import BuildFlags as BuildFlags
-from .system import System as System
-from .architecture import Architecture as Architecture
-from .compiler import Compiler as Compiler
-from .build_type import BuildType as BuildType
-from .variant import Variant as Variant
-from .build import Build as Build
-from .project import Project as Project
+# these are imported on first access, so that importing a cmany module
+# (eg when running cmany) does not import every other cmany module
+_lazy_exports = {
+    'BuildFlags': 'build_flags',
+    'System': 'system',
+    'Architecture': 'architecture',
+    'Compiler': 'compiler',
+    'BuildType': 'build_type',
+    'Variant': 'variant',
+    'Build': 'build',
+    'Project': 'project',
+}
+
+
+def __getattr__(name):
+    modname = _lazy_exports.get(name)
+    if modname is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    obj = getattr(importlib.import_module('.' + modname, __name__), name)
+    globals()[name] = obj
+    return obj
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_lazy_exports.keys()))
@@ -0,0 +1,194 @@
+import os
+import re
+import glob
+
+from . import util
+from . import err
+from . import compdb
+from . import fileapi
+from .util import logdbg as dbg
+
+
+_depsep_re = re.compile(r'(?<!\\)\s+')
+
+
+def changed_files(spec, root):
+    """return the absolute paths of changed files, given either a list of
+    files (relative to the current dir) or git-diff[:<rev>] for the files
+    which differ from the git revision (HEAD by default), including the
+    untracked files"""
+    if isinstance(spec, str):
+        spec = [spec]
+    if len(spec) == 1 and (spec[0] == 'git-diff' or spec[0].startswith('git-diff:')):
+        rev = spec[0][len('git-diff:'):] or 'HEAD'
+        return git_diff(root, rev)
+    return [os.path.normpath(util.abspath(f)) for f in spec]
+
+
+def git_diff(root, rev='HEAD'):
+    def _git(*args):
+        return util.runsyscmd(['git', '-C', root] + list(args), echo_cmd=False,
+                              echo_output=False, capture_output=True)
+    try:
+        top = _git('rev-parse', '--show-toplevel').strip()
+        files = _git('diff', '--name-only', rev).split('\n')
+        files += _git('ls-files', '--others', '--exclude-standard', '--full-name').split('\n')
+    except Exception as e:
+        raise err.Error("could not get the changed files from git: {}", e)
+    return [os.path.normpath(os.path.join(top, f)) for f in files if f.strip()]
+
+
+def _parse_depfile(filename):
+    """parse a make-style depfile, returning its list of dependencies"""
+    with open(filename) as f:
+        txt = f.read().replace('\\\n', ' ')
+    deps = []
+    for tok in _depsep_re.split(txt):
+        if not tok or tok.endswith(':'):
+            continue
+        deps.append(tok.replace('\\ ', ' '))
+    return deps
+
+
+# the depfiles found in each build dir, with the stamp of the build when
+# they were found. See depfiles()
+_depfiles = {}
+
+
+def _depfiles_stamp(builddir):
+    def _mtime(name):
+        try:
+            return os.path.getmtime(os.path.join(builddir, name))
+        except OSError:
+            return None
+    return (_mtime('CMakeCache.txt'), _mtime('cmany_build.done'))
+
+
+def depfiles(builddir):
+    """return the depfiles in a build dir. The build dir is searched
+    again only when it was configured or built since the last search, or
+    after forget_depfiles()."""
+    stamp = _depfiles_stamp(builddir)
+    found = _depfiles.get(builddir)
+    if found is None or found[0] != stamp:
+        pattern = os.path.join(builddir, '**', 'CMakeFiles', '*.dir', '**', '*.d')
+        found = (stamp, glob.glob(pattern, recursive=True))
+        _depfiles[builddir] = found
+    return found[1]
+
+
+def forget_depfiles(builddir):
+    """search again for the depfiles of a build dir, eg after a build
+    which failed (and so left no new stamp)"""
+    _depfiles.pop(builddir, None)
+
+
+def depfile_deps(builddir):
+    """return {target: [files]} from the depfiles written by the compiler
+    when building with make. Relative paths are relative to the directory
+    of the CMakeFiles folder."""
+    out = {}
+    for fn in depfiles(builddir):
+        t = compdb.path_target(fn)
+        if t is None:
+            continue
+        try:
+            deps = _parse_depfile(fn)
+        except FileNotFoundError:  # eg, removed by a clean
+            continue
+        base = fn[:fn.replace('\\', '/').rfind('CMakeFiles/')]
+        files = out.setdefault(t, set())
+        for d in deps:
+            files.add(os.path.normpath(os.path.join(base, d)))
+    return out
+
+
+def ninja_deps(builddir):
+    """return {target: [files]} from the ninja deps log"""
+    if not os.path.exists(os.path.join(builddir, '.ninja_deps')) or not util.which('ninja'):
+        return {}
+    try:
+        txt = util.runsyscmd(['ninja', '-C', builddir, '-t', 'deps'], echo_cmd=False,
+                             echo_output=False, capture_output=True)
+    except Exception as e:
+        dbg("could not read the ninja deps:", e)
+        return {}
+    out = {}
+    files = None
+    for line in txt.split('\n'):
+        if not line.strip():
+            continue
+        if not line[0].isspace():
+            t = compdb.path_target(line)
+            files = out.setdefault(t, set()) if t is not None else None
+        elif files is not None:
+            files.add(os.path.normpath(os.path.join(builddir, line.strip())))
+    return out
+
+
+def reverse_deps_closure(model, targets):
+    """return the given targets and all the targets which depend on them,
+    directly or indirectly"""
+    rdeps = {}
+    for t in model['targets']:
+        for d in t['dependencies']:
+            rdeps.setdefault(d, []).append(t['name'])
+    out = []
+    todo = list(targets)
+    while todo:
+        t = todo.pop(0)
+        if t in out:
+            continue
+        out.append(t)
+        todo += rdeps.get(t, [])
+    return out
+
+
+def affected_targets(build, changed):
+    """return the targets of a build which must be built for the changed
+    files: None if the build is not affected by the changes, an empty list
+    if all of its default targets must be built, or the list of targets
+    which use the changed files, together with the targets depending on
+    them.
+
+    The targets using a file are found from the compile database and the
+    codemodel (for sources), and from the dependencies written by the
+    compiler in the last build (for headers)."""
+    if changed is None:
+        return []
+    changed = [os.path.normpath(f) for f in changed]
+    if any(compdb.is_cmake_input(f) for f in changed):
+        return []
+    db = compdb.CompileDB.load(build.builddir)
+    model = build.codemodel()
+    if db is None and model is None:  # not configured yet
+        return []
+    uses = {}
+    def _add(target, files):
+        for f in files:
+            uses.setdefault(f, set()).add(target)
+    if db is not None:
+        for f, targets in db.targets_by_file.items():
+            for t in targets:
+                _add(t, [f])
+    if model is not None:
+        for t in model['targets']:
+            _add(t['name'], t['sources'])
+    deps = depfile_deps(build.builddir)
+    deps.update(ninja_deps(build.builddir))
+    for t, files in deps.items():
+        _add(t, files)
+    targets = []
+    for f in changed:
+        ts = uses.get(f)
+        if ts is None:
+            # a header of unknown users, eg because it was never built
+            if compdb.is_header(f) and not deps:
+                return []
+            continue
+        targets += sorted(t for t in ts if t not in targets)
+    if not targets:
+        return None
+    if model is not None:
+        targets = reverse_deps_closure(model, targets)
+    return targets
@@ -1,19 +1,14 @@
 #!/usr/bin/env python3
 
 import argparse
-import pprint
 import os
 
 from . import util
 from . import help
-from . import system
-from . import build_item
-from . import architecture
-from . import compiler
 from . import err
 
 from .util import cslist
-from multiprocessing import cpu_count as cpu_count
+from os import cpu_count as cpu_count  # multiprocessing is slow to import
 
 
 def _dbg_argparser(parser, arg, curr, recv, *args):
@@ -98,7 +93,8 @@ def merge_envargs(cmds, sysargs):
     pos = find_subcommand(cmds, sysargs)
     args = sysargs
     cmd = sysargs[pos]
-    if cmd not in ('help', 'h'):
+    # the commands run by batch get the arguments themselves
+    if cmd not in ('help', 'h', 'batch'):
         args = sysargs[0:pos]
         if pfxargs:
             # print("inserting CMANY_PFX_ARGS:", pfxargs)
@@ -133,6 +129,7 @@ def add_hidden_args(parser):
 
 
 def _handle_hidden_args__skip_rest(args):
+    import pprint
     if args.debug_cmany:
         util._debug_mode = True
     if util._debug_mode or args.show_args or args.only_show_args:
@@ -169,6 +166,47 @@ def add_basic(parser):
                         (defaults to %(default)s on this machine).""")
     parser.add_argument("--continue", default=False, action="store_true",
                         help="attempt to continue when a build fails")
+    parser.add_argument("--workers", default=[], type=cslist,
+                        metavar="worker1,worker2,...",
+                        help="""[EXPERIMENTAL] dispatch the builds to the given
+                        workers, running them concurrently. Each worker is
+                        either host:port of a running `cmany worker`, or
+                        local[:N] to spawn N local workers.""")
+
+
+# -----------------------------------------------------------------------------
+def add_worker(parser):
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="""the address to listen on (defaults to
+                        %(default)s). Addresses other than the loopback
+                        require --allow-remote.""")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="""allow listening on a non-loopback address.
+                        The clients must have the worker token of this
+                        user (~/.cmany/worker.token) in their user dir.""")
+    parser.add_argument("--port", default=0, type=int,
+                        help="""the port to listen on. The default, 0, picks
+                        any free port; the chosen port is then printed.""")
+    parser.add_argument("--build-dir", default=None,
+                        help="""set the build root of this worker. Defaults to
+                        the build root of each requested build.""")
+    parser.add_argument("--install-dir", default=None,
+                        help="""set the install root of this worker. Defaults to
+                        the install root of each requested build.""")
+
+
+# -----------------------------------------------------------------------------
+def add_watch(parser):
+    parser.add_argument("--debounce", default=0.3, type=float,
+                        help="""wait until no files change for this many
+                        seconds before rebuilding (defaults to %(default)s)""")
+    parser.add_argument("--poll", action="store_true",
+                        help="""find changes by polling the files instead of
+                        using inotify. This is the default where inotify is
+                        not available.""")
+    parser.add_argument("--poll-interval", default=0.5, type=float,
+                        help="""the interval in seconds between polls of the
+                        files (defaults to %(default)s)""")
 
 
 # -----------------------------------------------------------------------------
@@ -219,6 +257,25 @@ def add_proj(parser):
                    external dependencies to the given dir.""")
     d.add_argument('--with-conan', action='store_true', default=False,
                    help="""(WIP)""")
+    #
+    a = parser.add_argument_group('Artifact store')
+    a.add_argument('--artifact-store', default=None, type=str,
+                   metavar='path/to/store',
+                   help="""Use a store of install trees at this directory,
+                   which may be in a shared filesystem. The install trees are
+                   keyed by a fingerprint of the project sources, the cmake
+                   cache variables given to cmany, the compiler, the generator
+                   and the toolchain. When installing a build whose fingerprint
+                   is in the store, its install dir is restored from the
+                   store instead of building and installing. Otherwise, after
+                   a successful install, the install dir is added to the
+                   store.""")
+    a.add_argument('--artifact-store-size', default="10G", type=str,
+                   metavar='SIZE',
+                   help="""The maximum size of the artifact store, eg 512M
+                   or 10G. When a new install tree makes the store exceed
+                   this size, the least recently used trees are evicted.
+                   Defaults to %(default)s.""")
 
 
 # -----------------------------------------------------------------------------
@@ -232,6 +289,11 @@ def _item_printer(dft):
 
 
 def add_select(parser):
+    # the items' defaults probe cmake and the compilers, so these are
+    # imported only when the parser is built
+    from . import system
+    from . import architecture
+    from . import compiler
     g = parser.add_argument_group(
         title="Build items",
         description="""Items to be combined by cmany. Each item can be made to
@@ -436,7 +498,9 @@ class FlagArgument(argparse.Action):
     are compiler flags"""
     def __call__(self, parser, namespace, values, option_string=None):
         def _dbg(*args): _dbg_argparser(self, self.dest, licurr, values, *args)
-        li = getattr(namespace, self.dest)
+        # copy, as the list may be the default, which must not be changed
+        # so that the parser can be reused
+        li = list(getattr(namespace, self.dest))
         licurr = li
         v = values
         _dbg("initial.")
@@ -464,16 +528,15 @@ class BuildItemArgument(argparse.Action):
         def _dbg(*args): _dbg_argparser(self, self.dest, licurr, values, *args)
         li = getattr(namespace, self.dest)
         licurr = li
+        from . import build_item
         vli = build_item.BuildItem.parse_args(values)
-        # clear the defaults from the list
-        if not hasattr(parser, 'non_default_args'):
-            parser.non_default_args = {}
-        if parser.non_default_args.get(self.dest) is None:
+        # clear the defaults from the list. Don't change the default
+        # list, so that the parser can be reused.
+        if li is self.default:
             _dbg("reset current li:", li)
             li = []
-            parser.non_default_args[self.dest] = True
         _dbg("current li:", li, " + ", vli)
-        li += vli
+        li = li + vli
         _dbg("resulting li:", li)
         setattr(namespace, self.dest, li)
 
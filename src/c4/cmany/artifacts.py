@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from collections import OrderedDict as odict
+
+from . import util
+from .util import logdbg as dbg
+
+
+# bump this when changing the fingerprint or the layout of the store
+store_version = 1
+
+# the hashes of the project's files are kept in this file of the build
+# dir, and reused while the files keep their size and mtime
+hashes_file = "cmany_artifact_hashes.json"
+
+
+def parse_size(s):
+    """parse a size such as 512M or 10G to a number of bytes"""
+    if isinstance(s, int):
+        return s
+    s = s.strip().upper().rstrip('B')
+    mult = 1
+    for i, unit in enumerate('KMGT'):
+        if s.endswith(unit):
+            mult = 1024 ** (i + 1)
+            s = s[:-1]
+            break
+    return int(float(s) * mult)
+
+
+def _sha(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _tree_size(d):
+    size = 0
+    for root, _, files in os.walk(d):
+        for f in files:
+            p = os.path.join(root, f)
+            if not os.path.islink(p):
+                size += os.path.getsize(p)
+    return size
+
+
+def source_files(projdir, exclude=[]):
+    """the files of a project, skipping hidden dirs, build dirs and the
+    given dirs (eg the build and install roots)"""
+    exclude = [os.path.normpath(e) for e in exclude]
+    for root, dirs, files in os.walk(projdir):
+        dirs[:] = sorted(
+            d for d in dirs
+            if not d.startswith('.')
+            and os.path.normpath(os.path.join(root, d)) not in exclude
+            and not os.path.exists(os.path.join(root, d, 'CMakeCache.txt')))
+        for f in sorted(files):
+            if not f.startswith('.'):
+                yield os.path.join(root, f)
+
+
+def hash_sources(projdir, exclude=[], memo=None):
+    """a hash of the contents of the project's files. The hashes of
+    the files are kept in the memo dict, and reused for the files
+    whose mtime and size did not change"""
+    memo = {} if memo is None else memo
+    h = hashlib.sha256()
+    for p in source_files(projdir, exclude):
+        st = os.stat(p)
+        stamp = [st.st_mtime_ns, st.st_size]
+        e = memo.get(p)
+        if e is None or e[:2] != stamp:
+            e = memo[p] = stamp + [_sha(p)]
+        h.update(os.path.relpath(p, projdir).replace('\\', '/').encode())
+        h.update(b'\0' + e[2].encode() + b'\n')
+    return h.hexdigest()
+
+
+def _deps_hash(build, exclude, memo):
+    if not build.deps:
+        return None
+    d = build.deps
+    if os.path.isfile(d):
+        d = os.path.dirname(d)
+    return [build.deps, hash_sources(d, exclude, memo)]
+
+
+def fingerprint(build):
+    """return the fingerprint of a build and the data it was computed
+    from: the project's sources, the preload vars, the compiler, the
+    generator and the toolchain"""
+    memofile = os.path.join(build.builddir, hashes_file)
+    memo = {}
+    if os.path.exists(memofile):
+        try:
+            with open(memofile) as f:
+                memo = json.load(f)
+        except ValueError:
+            pass
+    prev = dict(memo)
+    exclude = [build.buildroot, build.installroot]
+    c = build.compiler
+    data = odict([
+        ('version', store_version),
+        ('sources', hash_sources(build.projdir, exclude, memo)),
+        ('deps', _deps_hash(build, exclude, memo)),
+        # the var types are left out: they may differ between the
+        # input and what is read back from the cmake cache
+        ('vars', sorted(f"{v.name}={v.val}" for v in build.varcache.from_input_vars())),
+        ('compiler', [c.shortname, c.version_full, c.path, c.c_compiler]),
+        ('generator', build.generator.name),
+        ('toolchain', _sha(build.toolchain_file) if build.toolchain_file else None),
+    ])
+    if memo != prev:
+        if not os.path.exists(build.builddir):
+            os.makedirs(build.builddir)
+        with open(memofile, 'w') as f:
+            json.dump(memo, f)
+    fp = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    return fp, data
+
+
+# -----------------------------------------------------------------------------
+class ArtifactStore:
+    """a content-addressed store of install trees, in a local or shared
+    directory:
+
+        <store>/objects/<fp[:2]>/<fp>/tree       the install tree
+        <store>/objects/<fp[:2]>/<fp>/meta.json  the fingerprint data and size
+        <store>/objects/<fp[:2]>/<fp>/last_used  its mtime is the last use
+        <store>/tmp/                             for atomic renames
+
+    Entries are published by copying to tmp and renaming into objects, and
+    removed by renaming into tmp and deleting there, so that concurrent
+    users never see partial entries. When the store exceeds its size, the
+    least recently used entries are evicted."""
+
+    def __init__(self, root, max_size=None):
+        self.root = util.abspath(root)
+        self.max_size = parse_size(max_size) if max_size is not None else None
+        self.objdir = os.path.join(self.root, 'objects')
+        self.tmpdir = os.path.join(self.root, 'tmp')
+
+    def entry(self, fp):
+        return os.path.join(self.objdir, fp[:2], fp)
+
+    def __contains__(self, fp):
+        return os.path.exists(os.path.join(self.entry(fp), 'meta.json'))
+
+    def _tmp(self):
+        if not os.path.exists(self.tmpdir):
+            os.makedirs(self.tmpdir, exist_ok=True)
+        return os.path.join(self.tmpdir, uuid.uuid4().hex)
+
+    def _touch(self, fp):
+        fn = os.path.join(self.entry(fp), 'last_used')
+        try:
+            with open(fn, 'a'):
+                pass
+            os.utime(fn)
+        except OSError:
+            pass  # evicted meanwhile
+
+    def restore(self, fp, dst):
+        """replace the dir dst with the tree stored for the fingerprint.
+        Returns False if the store does not have it."""
+        if fp not in self:
+            return False
+        tree = os.path.join(self.entry(fp), 'tree')
+        if os.path.exists(dst):
+            shutil.rmtree(dst)
+        try:
+            shutil.copytree(tree, dst, symlinks=True)
+        except (OSError, shutil.Error) as e:
+            dbg("could not restore", fp, ":", e)  # eg, evicted meanwhile
+            if os.path.exists(dst):
+                shutil.rmtree(dst)
+            return False
+        self._touch(fp)
+        return True
+
+    def publish(self, fp, src, data=None):
+        """store a copy of the tree in the dir src for the fingerprint.
+        Returns False if the fingerprint was already stored."""
+        if fp in self:
+            self._touch(fp)
+            return False
+        tmp = self._tmp()
+        shutil.copytree(src, os.path.join(tmp, 'tree'), symlinks=True)
+        meta = odict([
+            ('fingerprint', fp),
+            ('size', _tree_size(tmp)),
+            ('created', time.time()),
+            ('data', data),
+        ])
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=1)
+        with open(os.path.join(tmp, 'last_used'), 'w'):
+            pass
+        dst = self.entry(fp)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            os.rename(tmp, dst)
+        except OSError:
+            # someone else published it meanwhile
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        if self.max_size is not None:
+            self.evict(self.max_size)
+        return True
+
+    def entries(self):
+        """return [(fp, size, last_used)] for the entries in the store"""
+        out = []
+        if not os.path.exists(self.objdir):
+            return out
+        for pfx in os.listdir(self.objdir):
+            d = os.path.join(self.objdir, pfx)
+            for fp in os.listdir(d):
+                try:
+                    with open(os.path.join(d, fp, 'meta.json')) as f:
+                        size = json.load(f)['size']
+                    last_used = os.path.getmtime(os.path.join(d, fp, 'last_used'))
+                except (OSError, ValueError, KeyError):
+                    continue  # being published or removed
+                out.append((fp, size, last_used))
+        return out
+
+    def size(self):
+        return sum(e[1] for e in self.entries())
+
+    def evict(self, max_size):
+        """remove the least recently used entries until the store is no
+        larger than max_size. Returns the removed fingerprints."""
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(e[1] for e in entries)
+        removed = []
+        for fp, size, _ in entries:
+            if total <= max_size:
+                break
+            tmp = self._tmp()
+            try:
+                os.rename(self.entry(fp), tmp)
+            except OSError:
+                continue  # already removed by someone else
+            shutil.rmtree(tmp, ignore_errors=True)
+            total -= size
+            removed.append(fp)
+        return removed
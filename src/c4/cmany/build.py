@@ -1,13 +1,13 @@
 import os
 import copy
 import re
-import dill
+import json
 import subprocess
-from datetime import datetime
+import hashlib
 from collections import OrderedDict as odict
 
 from .generator import Generator
-from . import util, cmake, vsinfo
+from . import util, cmake, vsinfo, fileapi, compdb, artifacts, plan
 from .named_item import NamedItem
 from .variant import Variant
 from .build_flags import BuildFlags
@@ -26,6 +26,7 @@ class Build(NamedItem):
 
     pfile = "cmany_preload.cmake"
     sfile = "cmany_build.dill"
+    cfile = "cmany_configure.json"
 
     def __init__(self, proj_root, build_root, install_root,
                  system, arch, build_type, compiler, variant, flags,
@@ -99,6 +100,21 @@ class Build(NamedItem):
             dbg("    {}: {}={}".format(self.tag, prop, getattr(self, prop)))
         return self.tag
 
+    def relocate(self, build_root=None, install_root=None):
+        """change the build and/or install roots of this build, eg when it
+        is handed over to a worker which has its own roots"""
+        prev_builddir = self.builddir
+        if build_root:
+            self.buildroot = util.abspath(build_root)
+        if install_root:
+            self.installroot = util.abspath(install_root)
+        self._set_name_and_paths()
+        if self.deps_prefix == prev_builddir:
+            self.deps_prefix = self.builddir
+        # the cache must be reloaded from the new location
+        self.varcache = cmake.CMakeCache(self.builddir)
+        self.gather_input_cache_vars()
+
     def create_generator(self, num_jobs, fallback_generator="Unix Makefiles"):
         """create a generator, adjusting the build parameters if necessary"""
         #if self.toolchain_file is not None:
@@ -161,6 +177,7 @@ class Build(NamedItem):
         # https://stackoverflow.com/questions/4529815/saving-an-object-data-persistence
         protocol = 0  # serialize in ASCII
         fn = os.path.join(self.builddir, __class__.sfile)
+        import dill
         with open(fn, 'wb') as f:
             dill.dump(self, f, protocol)
 
@@ -172,6 +189,7 @@ class Build(NamedItem):
         fn = os.path.join(builddir, __class__.sfile)
         if not os.path.exists(fn):
             raise err.BuildSerializationNotFound(fn, builddir)
+        import dill
         with open(fn, 'rb') as f:
             return dill.load(f)
 
@@ -189,13 +207,19 @@ class Build(NamedItem):
     def configure(self):
         self.create_dir()
         self.create_preload_file()
+        deps_done = self.deps_done
         self.handle_deps()
         if self.needs_cache_regeneration():
             self.varcache.commit(self.builddir)
+        fileapi.write_query(self.builddir)
+        if deps_done and self.configure_is_current():
+            util.loginfo(self.name + ": configure is up to date")
+            return
         with util.setcwd(self.builddir, silent=False):
             cmd = self.configure_cmd()
             try:
-                util.runsyscmd(cmd)
+                with plan.timed(self.builddir, 'configure'):
+                    util.runsyscmd(cmd)
                 self.mark_configure_done(cmd)
             except Exception as e:
                 raise err.ConfigureFailed(self, cmd, e)
@@ -204,32 +228,68 @@ class Build(NamedItem):
                 util.logwarn("WARNING: this generator cannot export compile commands. Use 'cmany export_compile_commands/xcc to export the compile commands.'")
 
     def export_compile_commands(self):
-        # some generators (notably VS/msbuild) cannot export compile
-        # commands, so to get that, we'll configure a second build using the
-        # ninja generator so that compile_commands.json is generated;
-        # finally, copy over that file to this build directory
+        """make sure the build has a compile_commands.json. When the
+        generator did not export it, it is obtained from the build tool or
+        from the cmake file API. Configuring a second build with the Ninja
+        generator is only the last resort."""
         if self.needs_configure():
             self.configure()
-        trickdir = os.path.join(self.builddir, '.export_compile_commands')
-        if not os.path.exists(trickdir):
-            os.makedirs(trickdir)
-        with util.setcwd(trickdir, silent=False):
-            cmd = ['cmake', '-G', 'Ninja', '-DCMAKE_EXPORT_COMPILE_COMMANDS=ON', '-C', self.preload_file, self.projdir]
-            try:
-                if not self.compiler.is_msvc:
-                    util.runsyscmd(cmd)
-                else:
-                    self.vsinfo.runsyscmd(cmd)
-            except Exception as e:
-                raise err.ConfigureFailed(self, cmd, e)
-        src = os.path.join(trickdir, "compile_commands.json")
-        dst = os.path.join(self.builddir, "compile_commands.json")
-        if os.path.exists(src):
-            from shutil import copyfile
-            if os.path.exists(dst):
-                os.remove(dst)
-            copyfile(src, dst)
-            util.loginfo("exported compile_commands.json:", dst)
+        dst = os.path.join(self.builddir, compdb.filename)
+        if self.generator.exports_compile_commands and os.path.exists(dst):
+            dbg("compile commands were exported by the generator:", dst)
+            return
+        for how, fn in (("ninja", self._compdb_from_ninja),
+                        ("the cmake file api", self._compdb_from_fileapi),
+                        ("a shadow ninja build", self._compdb_from_shadow_build)):
+            entries = fn()
+            if entries is not None:
+                compdb.save(dst, entries)
+                util.loginfo("exported compile_commands.json from", how + ":", dst)
+                return
+
+    def _compdb_from_ninja(self):
+        if not self.generator.is_ninja or not util.which('ninja'):
+            return None
+        try:
+            out = util.runsyscmd(['ninja', '-C', self.builddir, '-t', 'compdb'], echo_cmd=False,
+                                 echo_output=False, capture_output=True)
+            entries = json.loads(out)
+        except Exception as e:
+            dbg("could not get the compile commands from ninja:", e)
+            return None
+        # ninja lists all the rules, not only the compile rules
+        return [e for e in entries if compdb.is_source(e['file'])]
+
+    def _compdb_from_fileapi(self):
+        model = self.codemodel()
+        if model is None:
+            return None
+        return compdb.from_codemodel(model)
+
+    def _compdb_from_shadow_build(self):
+        # configure a second build with the ninja generator, which exports
+        # the compile commands. It is kept and reused, so that cmake runs
+        # only when the build was configured since.
+        shadowdir = os.path.join(self.builddir, '.export_compile_commands')
+        src = os.path.join(shadowdir, compdb.filename)
+        done = os.path.join(self.builddir, "cmany_configure.done")
+        if os.path.exists(src) and os.path.getmtime(src) >= os.path.getmtime(done):
+            dbg("reusing the shadow build:", shadowdir)
+        else:
+            if not os.path.exists(shadowdir):
+                os.makedirs(shadowdir)
+            with util.setcwd(shadowdir, silent=False):
+                cmd = ['cmake', '-G', 'Ninja', '-DCMAKE_EXPORT_COMPILE_COMMANDS=ON', '-C', self.preload_file, self.projdir]
+                try:
+                    if not self.compiler.is_msvc:
+                        util.runsyscmd(cmd)
+                    else:
+                        self.vsinfo.runsyscmd(cmd)
+                except Exception as e:
+                    raise err.ConfigureFailed(self, cmd, e)
+        if not os.path.exists(src):
+            return None
+        return list(compdb.iter_entries(src))
 
     def run_custom_cmd(self, cmd, **subprocess_args):
         try:
@@ -240,6 +300,7 @@ class Build(NamedItem):
     def reconfigure(self):
         """reconfigure a build directory, without touching any cache entry"""
         self._check_successful_configure('reconfigure')
+        fileapi.write_query(self.builddir)
         with util.setcwd(self.builddir, silent=False):
             cmd = ['cmake', self.projdir]
             try:
@@ -261,6 +322,50 @@ class Build(NamedItem):
         with util.setcwd(self.builddir):
             with open("cmany_configure.done", "w") as f:
                 f.write(" ".join(cmd) + "\n")
+            stamp = odict([
+                ('cmd', cmd),
+                ('preload', self._preload_hash()),
+                ('inputs', _stat_files(self.configure_inputs())),
+            ])
+            with open(__class__.cfile, "w") as f:
+                json.dump(stamp, f, indent=1)
+
+    def configure_inputs(self):
+        """the files read by cmake when configuring: the project's
+        CMakeLists.txt and *.cmake files, as reported by the cmake file
+        API, or found in the project dir when it is not available"""
+        model = self.codemodel()
+        if model is not None and model['cmake_inputs']:
+            files = list(model['cmake_inputs'])
+        else:
+            files = [f for f in artifacts.source_files(self.projdir, [self.builddir])
+                     if os.path.basename(f) == 'CMakeLists.txt' or f.endswith('.cmake')]
+        if self.toolchain_file:
+            files.append(os.path.abspath(self.toolchain_file))
+        return files
+
+    def configure_is_current(self):
+        """True if a previous configure used the same command, the same
+        preload file and the same inputs, so that running cmake again
+        would not change anything, and if the build system it generated
+        is still there"""
+        fn = os.path.join(self.builddir, __class__.cfile)
+        if not os.path.exists(fn) or not os.path.exists(self.cachefile):
+            return False
+        bf = self.generator.build_file
+        if bf is not None and not os.path.exists(os.path.join(self.builddir, bf)):
+            return False
+        try:
+            with open(fn) as f:
+                stamp = json.load(f)
+        except ValueError:
+            return False
+        if stamp.get('cmd') != self.configure_cmd():
+            return False
+        if stamp.get('preload') != self._preload_hash():
+            return False
+        inputs = stamp.get('inputs', {})
+        return _stat_files(inputs.keys()) == inputs
 
     def needs_configure(self):
         if not os.path.exists(self.builddir):
@@ -288,17 +393,16 @@ class Build(NamedItem):
                     targets = ["ALL_BUILD"]
                 else:
                     targets = ["all"]
-            # cmake --build and visual studio won't handle
-            # multiple targets at once, so loop over them.
-            for t in targets:
-                try:
-                    cmd = self.generator.cmd([t])
-                    util.runsyscmd(cmd)
-                except Exception as e:
-                    raise err.CompileFailed(self, cmd, e)
-            # this was written before using the loop above.
-            # it can come to fail in some corner cases.
-            self.mark_build_done(cmd)
+            cmds = []
+            with plan.timed(self.builddir, 'build'):
+                for t in self._target_groups(targets):
+                    try:
+                        cmd = self.generator.cmd(t)
+                        util.runsyscmd(cmd)
+                        cmds.append(cmd)
+                    except Exception as e:
+                        raise err.CompileFailed(self, cmd, e)
+            self.mark_build_done(*cmds)
 
     def rebuild(self, targets=[]):
         self._check_successful_configure('rebuild')
@@ -308,19 +412,28 @@ class Build(NamedItem):
                     targets = ["ALL_BUILD"]
                 else:
                     targets = ["all"]
-            # cmake --build and visual studio won't handle
-            # multiple targets at once, so loop over them.
-            for t in targets:
-                cmd = self.generator.cmd([t])
-                try:
-                    util.runsyscmd(cmd)
-                except Exception as e:
-                    raise err.CompileFailed(self, cmd, e)
-
-    def mark_build_done(self, cmd):
+            with plan.timed(self.builddir, 'build'):
+                for t in self._target_groups(targets):
+                    cmd = self.generator.cmd(t)
+                    try:
+                        util.runsyscmd(cmd)
+                    except Exception as e:
+                        raise err.CompileFailed(self, cmd, e)
+
+    def _target_groups(self, targets):
+        """group the targets to build with each command. Building all the
+        targets at once lets the build tool scan the dependencies only
+        once, and build the targets in parallel."""
+        if self.generator.builds_multiple_targets:
+            return [list(targets)]
+        # older versions of cmake --build handle only one target
+        return [[t] for t in targets]
+
+    def mark_build_done(self, *cmds):
         with util.setcwd(self.builddir):
             with open("cmany_build.done", "w") as f:
-                f.write(" ".join(cmd) + "\n")
+                for cmd in cmds:
+                    f.write(" ".join(cmd) + "\n")
 
     def needs_build(self):
         if not os.path.exists(self.builddir):
@@ -334,14 +447,30 @@ class Build(NamedItem):
 
     def install(self):
         self.create_dir()
+        store = self._artifact_store()
+        if store is not None:
+            fp, data = artifacts.fingerprint(self)
+            if store.restore(fp, self.installdir):
+                util.logdone(self.name + ': restored install dir from the artifact store:', fp)
+                return
         with util.setcwd(self.builddir, silent=False):
             if self.needs_build():
                 self.build()
             cmd = self.generator.install()
             try:
-                util.runsyscmd(cmd)
+                with plan.timed(self.builddir, 'install'):
+                    util.runsyscmd(cmd)
             except Exception as e:
                 raise err.InstallFailed(self, cmd, e)
+        if store is not None and os.path.exists(self.installdir):
+            if store.publish(fp, self.installdir, data):
+                dbg(self.name + ': published install dir to the artifact store:', fp)
+
+    def _artifact_store(self):
+        root = self.kwargs.get('artifact_store')
+        if not root:
+            return None
+        return artifacts.ArtifactStore(root, self.kwargs.get('artifact_store_size'))
 
     def reinstall(self):
         self._check_successful_configure('reinstall')
@@ -350,7 +479,8 @@ class Build(NamedItem):
                 self.build()
             cmd = self.generator.install()
             try:
-                util.runsyscmd(cmd)
+                with plan.timed(self.builddir, 'install'):
+                    util.runsyscmd(cmd)
             except Exception as e:
                 raise err.InstallFailed(self, cmd, e)
 
@@ -452,19 +582,30 @@ class Build(NamedItem):
         self.create_dir()
         lines = []
         s = '_cmany_set({} "{}" {})'
-        for _, v in self.varcache.items():
-            if v.from_input:
-                lines.append(s.format(v.name, v.val, v.vartype))
+        for v in self.varcache.from_input_vars():
+            lines.append(s.format(v.name, v.val, v.vartype))
+        # sorted, so that the contents do not depend on the order of the cache
+        lines.sort()
         if lines:
             tpl = _preload_file_tpl
         else:
             tpl = _preload_file_tpl_empty
-        now = datetime.now().strftime("%Y/%m/%d %H:%m")
-        txt = tpl.format(date=now, vars="\n".join(lines))
-        with open(self.preload_file, "w") as f:
-            f.write(txt)
+        txt = tpl.format(vars="\n".join(lines))
+        # the contents are deterministic, so write only when they change;
+        # the mtime is then kept, and the hash recorded when configuring
+        # tells whether the configure is current
+        if self._preload_hash() != _hash(txt):
+            with open(self.preload_file, "w") as f:
+                f.write(txt)
         return self.preload_file
 
+    def _preload_hash(self):
+        fn = os.path.join(self.builddir, self.preload_file)
+        if not os.path.exists(fn):
+            return None
+        with open(fn) as f:
+            return _hash(f.read())
+
     @property
     def deps_done(self):
         dmark = os.path.join(self.builddir, "cmany_deps.done")
@@ -489,22 +630,23 @@ class Build(NamedItem):
             self.mark_deps_done()
             return
         util.lognotice(self.tag + ': building dependencies', self.deps)
-        dup = copy.copy(self)
-        dup.builddir = os.path.join(self.builddir, 'cmany_deps-build')
-        dup.installdir = self.deps_prefix
-        util.logwarn('installdir:', dup.installdir)
-        dup.projdir = self.deps
-        dup.preload_file = os.path.join(self.builddir, self.preload_file)
-        dup.deps = None
-        dup.generator.build = dup
-        dup.configure()
-        dup.build()
-        try:
-            # if the dependencies cmake project is purely consisted of
-            # external projects, there won't be an install target.
-            dup.install()
-        except Exception as e:
-            util.logwarn(self.name + ": could not install. Maybe there's no install target?")
+        with plan.timed(self.builddir, 'deps'):
+            dup = copy.copy(self)
+            dup.builddir = os.path.join(self.builddir, 'cmany_deps-build')
+            dup.installdir = self.deps_prefix
+            util.logwarn('installdir:', dup.installdir)
+            dup.projdir = self.deps
+            dup.preload_file = os.path.join(self.builddir, self.preload_file)
+            dup.deps = None
+            dup.generator.build = dup
+            dup.configure()
+            dup.build()
+            try:
+                # if the dependencies cmake project is purely consisted of
+                # external projects, there won't be an install target.
+                dup.install()
+            except Exception as e:
+                util.logwarn(self.name + ": could not install. Maybe there's no install target?")
         util.logdone(self.name + ': finished building dependencies. Install dir=', self.installdir)
         self.varcache.p('CMAKE_PREFIX_PATH', self.installdir)
         self.mark_deps_done()
@@ -542,7 +684,19 @@ class Build(NamedItem):
             # ('variables', []),  # this is not needed since the vars are set in the preload file
         ])
 
+    def codemodel(self):
+        """return the targets of this build, as described by cmake's file
+        API. Returns None if the build was not configured with a cmake
+        version providing it."""
+        if not os.path.exists(self.builddir):
+            return None
+        return fileapi.load(self.builddir, self.build_type.name)
+
     def get_targets(self):
+        model = self.codemodel()
+        if model is not None:
+            return sorted(t['name'] for t in model['targets'])
+        # no codemodel: ask the build tool
         with util.setcwd(self.builddir):
             if self.generator.is_msvc:
                 # each target in MSVC has a corresponding vcxproj file
@@ -575,19 +729,35 @@ class Build(NamedItem):
         p('CMAKE_C_COMPILER', self.compiler.c_compiler)
         p('CMAKE_CXX_COMPILER', self.compiler.path)
         dont_show = ('CMAKE_INSTALL_PREFIX', 'CMAKE_CXX_COMPILER', 'CMAKE_C_COMPILER')
-        for _, v in self.varcache.items():
-            if v.from_input:
-                if v.name in dont_show:
-                    continue
-                p(v.name, v.val)
+        for v in self.varcache.from_input_vars():
+            if v.name in dont_show:
+                continue
+            p(v.name, v.val)
         p("PROJECT_BINARY_DIR", self.builddir)
         p("CMAKE_INSTALL_PREFIX", self.installdir)
 
 
+# -----------------------------------------------------------------------------
+def _hash(txt):
+    return hashlib.sha256(txt.encode()).hexdigest()
+
+
+def _stat_files(files):
+    """the mtime and size of each file, or None if it does not exist"""
+    out = odict()
+    for f in sorted(files):
+        try:
+            st = os.stat(f)
+            out[f] = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            out[f] = None
+    return out
+
+
 # -----------------------------------------------------------------------------
 _preload_file_tpl = ("""\
 # Do not edit. Will be overwritten.
-# Generated by cmany on {date}
+# Generated by cmany
 
 if(NOT _cmany_set_def)
     set(_cmany_set_def ON)
@@ -610,13 +780,13 @@ message(STATUS "cmany:preload----------------------")
 # endif()
 
 # Do not edit. Will be overwritten.
-# Generated by cmany on {date}
+# Generated by cmany
 """)
 
 # -----------------------------------------------------------------------------
 _preload_file_tpl_empty = ("""\
 # Do not edit. Will be overwritten.
-# Generated by cmany on {date}
+# Generated by cmany
 
 message(STATUS "cmany: nothing to preload...")
 """)
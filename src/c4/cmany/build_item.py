@@ -1,5 +1,6 @@
 from collections import OrderedDict as odict
 import re
+import copy
 
 from . import util
 from . import err
@@ -15,21 +16,59 @@ def _dbg(fmt, *args):
     print(fmt.format(*args))
 
 
+# the parser of the flag specs, shared by all the items, and the specs
+# it already parsed
+_flags_parser = None
+_parsed_specs = {}
+
+
+def parse_flag_spec(spec):
+    """parse a flag spec (eg, '-X "-fPIC" -D FOO') into a dict with the
+    values of the bundle flags"""
+    global _flags_parser
+    args = _parsed_specs.get(spec)
+    if args is None:
+        if _flags_parser is None:
+            import argparse
+            from . import args as c4args
+            _flags_parser = argparse.ArgumentParser()
+            c4args.add_bundle_flags(_flags_parser)
+        ss = util.splitesc_quoted(spec, ' ')
+        args = vars(_flags_parser.parse_args(ss))
+        _parsed_specs[spec] = args
+    # the parsed values are changed by the items, so give a copy
+    return copy.deepcopy(args)
+
+
 # -----------------------------------------------------------------------------
 class BuildItem(NamedItem):
     """A base class for build items."""
 
+    # set this in classes whose items are slow to construct (eg because
+    # they spawn processes), so that their items are created concurrently
+    create_concurrently = False
+
     @staticmethod
     def create(map_of_class_name_to_tuple_of_class_and_specs):
         items = BuildItemCollection()
         for cls_name, (cls, spec_list) in map_of_class_name_to_tuple_of_class_and_specs.items():
             if isinstance(spec_list, str):
                 spec_list = util.splitesc_quoted(spec_list, ',')
-            for s in spec_list:
-                items.add_build_item(cls(s))
+            for i in __class__._construct(cls, spec_list):
+                items.add_build_item(i)
         items.resolve_references()
         return items
 
+    @staticmethod
+    def _construct(cls, spec_list):
+        """construct the items from their specs, keeping the order of the
+        specs. If several items fail, the error of the first is raised."""
+        if not cls.create_concurrently or len(spec_list) < 2:
+            return [cls(s) for s in spec_list]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(len(spec_list), 16)) as pool:
+            return list(pool.map(cls, spec_list))
+
     def is_trivial(self):
         if self.name != self.default_str():
             return False
@@ -103,17 +142,10 @@ class BuildItem(NamedItem):
                     r.resolve_references(item_collection)
                 self.flags.append_flags(r.flags, append_to_name=False)
             else:
-                import argparse
-                from . import args as c4args
-                parser = argparse.ArgumentParser()
-                c4args.add_bundle_flags(parser)
-                ss = util.splitesc_quoted(s, ' ')
-                args = parser.parse_args(ss)
-                tmp = BuildFlags('', **vars(args))
+                args = parse_flag_spec(s)
+                tmp = BuildFlags('', **args)
                 self.flags.append_flags(tmp, append_to_name=False)
-                cr = []
-                if hasattr(args, 'combination_rules'):
-                    cr = getattr(args, 'combination_rules')
+                cr = args.get('combination_rules', [])
                 self.combination_rules = CombinationRules(cr)
         self._resolved_references = True
 
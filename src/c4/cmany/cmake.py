@@ -1,5 +1,7 @@
 import re
 import os
+import sys
+import subprocess
 
 from collections import OrderedDict as odict
 
@@ -11,6 +13,30 @@ from . import err
 _cache_entry = r'^(.*?)(:.*?)=(.*)$'
 
 
+# probed cmake versions, by path and mtime of cmake
+_probed_versions = {}
+
+
+def version():
+    """the version of the cmake in the PATH, as a tuple of ints (eg,
+    (3, 15, 2)). Probing spawns cmake, so the result is reused while cmake
+    is not changed."""
+    path = util.which('cmake')
+    if path is None:
+        raise err.Error("cmake not found")
+    key = (path, os.path.getmtime(path))
+    v = _probed_versions.get(key)
+    if v is None:
+        out = runsyscmd([path, '--version'], echo_cmd=False,
+                        echo_output=False, capture_output=True)
+        m = re.search(r'version (\d+(?:\.\d+)*)', out)
+        if m is None:
+            raise err.Error("could not find the version of cmake: {}", out)
+        v = tuple(int(i) for i in m.group(1).split('.'))
+        _probed_versions[key] = v
+    return v
+
+
 def hascache(builddir):
     c = os.path.join(builddir, 'CMakeCache.txt')
     if os.path.exists(c):
@@ -63,35 +89,193 @@ def loadvars(builddir):
     if builddir is None or not os.path.exists(builddir):
         return v
     c = os.path.join(builddir, 'CMakeCache.txt')
-    if os.path.exists(c):
-        with open(c, 'r') as f:
-            for line in f:
-                # logdbg("loadvars0", line.strip())
-                if not re.match(_cache_entry, line):
-                    continue
-                ls = line.strip()
-                name = re.sub(_cache_entry, r'\1', ls)
-                vartype = re.sub(_cache_entry, r'\2', ls)[1:]
-                value = re.sub(_cache_entry, r'\3', ls)
-                # logdbg("loadvars1", name, vartype, value)
-                v[name] = CMakeCacheVar(name, value, vartype)
+    for name, vartype, value in _scanvars(c):
+        v[name] = CMakeCacheVar(name, value, vartype)
     return v
 
 
+_cache_entry_re = re.compile(_cache_entry)
+
+
+def _scanvars(cache_file, names=None):
+    """yield (name, vartype, value) for the entries of a cache file,
+    optionally restricted to the given names"""
+    if cache_file is None or not os.path.exists(cache_file):
+        return
+    with open(cache_file, 'r') as f:
+        for line in f:
+            m = _cache_entry_re.match(line.strip())
+            if m is None:
+                continue
+            name = m.group(1)
+            if names is not None and name not in names:
+                continue
+            yield name, m.group(2)[1:], m.group(3)
+
+
+def _indexvars(cache_file):
+    """return an odict {name: offset} locating the entries of a cache
+    file, in a single scan and without keeping their values"""
+    index = odict()
+    with open(cache_file, 'rb') as f:
+        pos = 0
+        for line in f:
+            m = _cache_entry_re.match(line.decode('utf-8', 'replace').strip())
+            if m is not None:
+                index[sys.intern(m.group(1))] = pos
+            pos += len(line)
+    return index
+
+
+def _readvars(cache_file, offsets):
+    """yield (name, vartype, value) for the entries at the given offsets
+    of a cache file"""
+    with open(cache_file, 'rb') as f:
+        for pos in offsets:
+            f.seek(pos)
+            m = _cache_entry_re.match(f.readline().decode('utf-8', 'replace').strip())
+            if m is not None:
+                yield m.group(1), m.group(2)[1:], m.group(3)
+
+
 # -----------------------------------------------------------------------------
-class CMakeCache(odict):
+class CMakeCache:
+    """the vars of a CMakeCache.txt. The file is read only when needed,
+    and then only for the vars which are asked for: the vars kept in
+    memory are those which were accessed or set. Vars set before the
+    file is read are pending, and are compared with the file when the
+    cache is next queried. The first lookup indexes the names of the
+    entries in the file, so that the next ones (including those of names
+    which are not in the file) read only the entry they need; the index
+    is rebuilt when the file changes."""
 
     def __init__(self, builddir=None):
-        super().__init__(loadvars(builddir))
-        self.dirty = False
         self.cache_file = None
         if builddir:
             self.cache_file = os.path.join(builddir, 'CMakeCache.txt')
+        self._vars = odict()
+        self._pending = odict()
+        self._dirty = False
+        self._offsets = None
+        self._offsets_stamp = None
+
+    def __getstate__(self):
+        # the index is cheap to rebuild, and may be stale when loaded
+        state = dict(self.__dict__)
+        state['_offsets'] = None
+        state['_offsets_stamp'] = None
+        return state
+
+    def __setstate__(self, state):
+        self._offsets = None
+        self._offsets_stamp = None
+        self.__dict__.update(state)
+
+    @property
+    def dirty(self):
+        self._resolve()
+        return self._dirty
+
+    @dirty.setter
+    def dirty(self, val):
+        self._resolve()
+        self._dirty = val
+
+    def _index(self):
+        """the odict {name: offset} of the entries in the file, valid while
+        the file is not changed"""
+        try:
+            st = os.stat(self.cache_file) if self.cache_file is not None else None
+        except OSError:
+            st = None
+        stamp = None if st is None else (st.st_mtime_ns, st.st_size)
+        if self._offsets is None or stamp != self._offsets_stamp:
+            self._offsets = _indexvars(self.cache_file) if stamp else odict()
+            self._offsets_stamp = stamp
+        return self._offsets
+
+    def _load(self, names):
+        """yield the vars in the file with the given names, in the order
+        of the file"""
+        index = self._index()
+        offsets = sorted(index[n] for n in names if n in index)
+        if not offsets:
+            return
+        for n, t, val in _readvars(self.cache_file, offsets):
+            yield CMakeCacheVar(n, val, t)
+
+    def _resolve(self):
+        """apply the pending vars, comparing them with the file"""
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = odict()
+        found = {v.name: v for v in self._load(pending)}
+        for name, (val, vartype, kwargs) in pending.items():
+            var = found.get(name)
+            if var is not None:
+                self._dirty |= var.reset(val, vartype, **kwargs)
+            else:
+                var = CMakeCacheVar(name, val, vartype, dirty=True, **kwargs)
+                self._dirty = True
+            self._vars[var.name] = var
+
+    def get(self, name, default=None):
+        self._resolve()
+        v = self._vars.get(name)
+        if v is not None:
+            return v
+        for v in self._load((name,)):
+            self._vars[v.name] = v
+            return v
+        return default
 
-    def __eq__(self, other):
-        """code quality checkers complain that this class adds attributes
-        without overriding __eq__. So just fool them!"""
-        return super().__init__(other)
+    def __getitem__(self, name):
+        v = self.get(name)
+        if v is None:
+            raise KeyError(name)
+        return v
+
+    def __contains__(self, name):
+        self._resolve()
+        return name in self._vars or name in self._index()
+
+    def from_input_vars(self):
+        """the vars given by cmany (eg, the compilers or the -V vars), in the
+        order they were set. Unlike items(), this reads only the entries of
+        the pending vars, and keeps the other entries out of memory."""
+        self._resolve()
+        return [v for v in self._vars.values() if v.from_input]
+
+    def items(self):
+        """the vars in the file, followed by those only set in memory. This
+        keeps every var of the file in memory: when only the vars given by
+        cmany are needed, use from_input_vars()"""
+        self._resolve()
+        index = self._index()
+        missing = [n for n in index if n not in self._vars]
+        for v in self._load(missing):
+            self._vars[v.name] = v
+        for n in index:
+            yield n, self._vars[n]
+        for n, v in list(self._vars.items()):
+            if n not in index:
+                yield n, v
+
+    def keys(self):
+        """the names in the file, followed by those only set in memory"""
+        self._resolve()
+        index = self._index()
+        return list(index.keys()) + [n for n in self._vars if n not in index]
+
+    def values(self):
+        return [v for _, v in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
 
     def getvars(self, names):
         out = odict()
@@ -125,15 +309,23 @@ class CMakeCache(odict):
         return self.setvar(name, val, "INTERNAL", **kwargs)
 
     def setvar(self, name, val, vartype=None, **kwargs):
-        v = self.get(name)
+        """set a var, returning whether it changed; None if that is
+        not known yet because the file was not read"""
+        v = self._vars.get(name)
+        if v is None and name in self._pending:
+            self._resolve()
+            v = self._vars.get(name)
         if v is not None:
             changed = v.reset(val, vartype, **kwargs)
-            self.dirty |= changed
+            self._dirty |= changed
             return changed
+        elif self.cache_file is not None and os.path.exists(self.cache_file):
+            self._pending[name] = (val, vartype, kwargs)
+            return None
         else:
             v = CMakeCacheVar(name, val, vartype, dirty=True, **kwargs)
-            self[name] = v
-            self.dirty = True
+            self._vars[v.name] = v
+            self._dirty = True
             return True
 
     def commit(self, builddir):
@@ -143,27 +335,38 @@ class CMakeCache(odict):
             or not os.path.exists(os.path.join(builddir, 'CMakeCache.txt'))):
             return False
         tmp = odict()
-        for _, v in self.items():
+        for _, v in self._vars.items():
             if not v.dirty:
                 continue
             tmp[v.name] = v.val
         setcachevars(builddir, tmp)
-        for _, v in self.items():
+        for _, v in self._vars.items():
             v.dirty = False
-        self.dirty = False
+        self._dirty = False
         return True
 
 
 # -------------------------------------------------------------------------
 class CMakeCacheVar:
 
+    __slots__ = ('name', 'val', 'vartype', 'dirty', 'from_input')
+
     def __init__(self, name, val, vartype=None, dirty=False, from_input=False):
-        self.name = name
+        self.name = sys.intern(name)
         self.val = val
-        self.vartype = self._guess_var_type(name, val, vartype)
+        self.vartype = sys.intern(self._guess_var_type(name, val, vartype))
         self.dirty = dirty
         self.from_input = from_input
 
+    def __getstate__(self):
+        # needed with the pickle protocols below 2, which do not handle
+        # __slots__ (the builds are serialized with protocol 0)
+        return {k: getattr(self, k) for k in __class__.__slots__}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
     def _guess_var_type(self, name, val, vartype):
         """make an informed guess of the var type
         @todo: add a test for this"""
@@ -201,9 +404,15 @@ class CMakeCacheVar:
                     break
         else:
             equal = (self.val == val)
-        if not equal or (vartype is not None and vartype != self.vartype):
+        if vartype is not None:
+            vartype = sys.intern(vartype)
+            # the type alone does not make the var dirty: only the values
+            # are committed to the cache, and cmake may store a var with
+            # a type other than the one it was given (eg, the compilers
+            # are given as FILEPATH and stored as STRING)
+            self.vartype = vartype
+        if not equal:
             self.val = val
-            self.vartype = vartype if vartype is not None else self.vartype
             self.dirty = True
             return True
         if force_dirty:
@@ -274,28 +483,42 @@ class CMakeSysInfo:
         msg = "could not find variable {} in the output of `cmake --system-information -G '{}'`"
         raise err.Error(msg, var_name, which_generator)
 
+    @staticmethod
+    def prewarm(gens, max_workers=8):
+        """get the info for several generators at once, running cmake
+        concurrently for those which were not cached yet. gens is a list of
+        generators as accepted by system_info()"""
+        todo = odict()
+        for g in gens:
+            i = _genid(g)
+            if not hasattr(__class__, '_info_' + i):
+                todo.setdefault(i, g)
+        if not todo:
+            return
+        if len(todo) == 1:
+            __class__.info(*todo.values())
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(len(todo), max_workers)) as pool:
+            list(pool.map(__class__.info, todo.values()))
+
     @staticmethod
     def system_info(gen):
-        """gen can be a string or a cmany.Generator object"""
-        from .generator import Generator
+        """gen can be a string, a cmany.Generator object, or a tuple of
+        (sysinfo name, cmake args) as returned by Generator.sysinfo_spec()"""
         logdbg("CMakeSystemInfo: asked info for", gen)
-        p = _genid(gen)
-        d = os.path.join(USER_DIR, 'cmake_info', p)
-        p = os.path.join(d, 'info')
-        logdbg("CMakeSystemInfo: path=", p)
-        # https://stackoverflow.com/questions/7015587/python-difference-of-2-datetimes-in-months
-        if os.path.exists(p) and util.time_since_modification(p).months < 1:
-            logdbg("CMakeSystemInfo: asked info for", gen, "... found", p)
-            with open(p, "r") as f:
-                i = f.readlines()
-                if i:
-                    return i
-                else:
-                    logdbg("CMakeSystemInfo: info for gen", gen, "is empty...")
-        #
+        d = os.path.join(USER_DIR, 'cmake_info', _genid(gen))
+        return __class__._load_or_run(gen, d, lambda: __class__._sysinfo_cmd(gen))
+
+    @staticmethod
+    def _sysinfo_cmd(gen):
+        from .generator import Generator
         if isinstance(gen, Generator):
             cmd = ['cmake'] + gen.configure_args() + ['--system-information']
             logdbg("CMakeSystemInfo: from generator! '{}' ---> cmd={}".format(gen, cmd))
+        elif isinstance(gen, tuple):
+            cmd = ['cmake'] + list(gen[1]) + ['--system-information']
+            logdbg("CMakeSystemInfo: from spec! '{}' ---> cmd={}".format(gen, cmd))
         else:
             if gen == "default" or gen == "":
                 logdbg("CMakeSystemInfo: default! '{}'".format(gen))
@@ -313,17 +536,36 @@ class CMakeSysInfo:
         # remove export build commands as cmake reacts badly to it,
         # generating an empty info string
         _remove_invalid_args_from_sysinfo_cmd(cmd)
+        return cmd
+
+    @staticmethod
+    def _load_or_run(gen, d, get_cmd):
+        """load the info stored in the dir d, or run the command to get it
+        and store it there. This may run concurrently for different dirs,
+        so it must not change the current dir."""
+        p = os.path.join(d, 'info')
+        logdbg("CMakeSystemInfo: path=", p)
+        # https://stackoverflow.com/questions/7015587/python-difference-of-2-datetimes-in-months
+        if os.path.exists(p) and util.time_since_modification(p).months < 1:
+            logdbg("CMakeSystemInfo: asked info for", gen, "... found", p)
+            with open(p, "r") as f:
+                i = f.readlines()
+                if i:
+                    return i
+                else:
+                    logdbg("CMakeSystemInfo: info for gen", gen, "is empty...")
+        #
+        cmd = get_cmd()
         print("\ncmany: CMake information for generator '{}' was not found. Creating and storing... cmd={}".format(gen, cmd))
         #
         if not os.path.exists(d):
-            os.makedirs(d)
-        with setcwd(d):
-            out = runsyscmd(cmd, echo_output=False, capture_output=True)
+            os.makedirs(d, exist_ok=True)
+        out = util.runcmd(cmd, cwd=d, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          universal_newlines=True).stdout
         logdbg("cmany: finished generating information for generator '{}'\n".format(gen), out, cmd)
         out = out.strip()
         if not out:
-            from err import InvalidGenerator
-            raise InvalidGenerator(gen, "for --system-information. cmd='{}'".format(cmd))
+            raise err.InvalidGenerator(gen, "for --system-information. cmd='{}'".format(cmd))
         with open(p, "w") as f:
             f.write(out)
         i = out.split("\n")
@@ -354,6 +596,8 @@ def _remove_invalid_args_from_sysinfo_cmd(cmd):
 # -----------------------------------------------------------------------------
 def _genid(gen):
     from .generator import Generator
+    if isinstance(gen, tuple):
+        gen = gen[0]
     p = gen.sysinfo_name if isinstance(gen, Generator) else gen
     if isinstance(gen, list): p = " ".join(p)
     p = re.sub(r'[() ]', '_', p)
@@ -0,0 +1,291 @@
+import os
+import re
+import json
+import shlex
+from collections import OrderedDict as odict
+
+from . import util
+from . import err
+
+
+filename = "compile_commands.json"
+index_filename = "compile_commands.index.json"
+index_version = 1
+
+# replaces the build directory in the entries of a merged index
+builddir_placeholder = "${CMANY_BUILD_DIR}"
+
+# extensions of the files which are compiled on their own. Changes to
+# other files in the project (eg headers) are found through the sources
+# which include them.
+source_exts = ('.c', '.cc', '.cpp', '.cxx', '.c++', '.C', '.m', '.mm',
+               '.cu', '.f', '.f90', '.for', '.s', '.S', '.asm')
+header_exts = ('.h', '.hh', '.hpp', '.hxx', '.h++', '.H', '.inl', '.tpp',
+               '.ipp', '.inc', '.def')
+
+_target_re = re.compile(r'CMakeFiles/([^/]+)\.dir/')
+
+
+def is_source(path):
+    return os.path.splitext(path)[1] in source_exts
+
+
+def is_header(path):
+    return os.path.splitext(path)[1] in header_exts
+
+
+def is_cmake_input(path):
+    b = os.path.basename(path)
+    return b == 'CMakeLists.txt' or b.endswith('.cmake')
+
+
+def entry_args(entry):
+    args = entry.get('arguments')
+    if args is None:
+        args = shlex.split(entry.get('command', ''), posix=not util.in_windows())
+    return args
+
+
+def entry_file(entry):
+    """the absolute path of the file compiled by an entry"""
+    f = entry['file']
+    if not os.path.isabs(f):
+        f = os.path.join(entry['directory'], f)
+    return os.path.normpath(f)
+
+
+def entry_output(entry):
+    """the object file produced by an entry, relative to the entry's
+    directory. Older cmake versions have no output field, so look for it
+    in the command"""
+    out = entry.get('output')
+    if out is not None:
+        return out
+    args = entry_args(entry)
+    for i, a in enumerate(args):
+        if a == '-o' and i + 1 < len(args):
+            return args[i + 1]
+        for pfx in ('/Fo', '-Fo'):
+            if a.startswith(pfx) and len(a) > len(pfx):
+                return a[len(pfx):]
+    return None
+
+
+def entry_target(entry):
+    """the cmake target of an entry, inferred from the CMakeFiles/<target>.dir/
+    directory where cmake places the target's object files"""
+    out = entry_output(entry)
+    if out is None:
+        return None
+    return path_target(out)
+
+
+def path_target(path):
+    """the cmake target of a path in the CMakeFiles/<target>.dir/ directory
+    of the target, eg of an object file or of a depfile"""
+    m = _target_re.search(path.replace('\\', '/'))
+    return m.group(1) if m else None
+
+
+def iter_entries(path, chunk_size=1 << 20):
+    """iterate over the entries of a compile database, reading the file
+    in chunks so that it is never loaded in whole"""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+    with open(path, encoding='utf-8') as f:
+        def _more():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,[':
+                pos += 1
+            if pos == len(buf):
+                if eof:
+                    return
+                _more()
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                entry, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise err.CompileDBInvalid(path, e)
+                _more()  # the entry may be incomplete
+                continue
+            yield entry
+
+
+def save(path, entries):
+    with open(path, 'w') as f:
+        json.dump(entries, f, indent=2)
+
+
+def from_codemodel(model):
+    """synthesize the compile commands of a build from its codemodel (see
+    fileapi.read_reply). This is for generators which cannot export the
+    compile commands. Returns None if the codemodel does not have the
+    compile flags or the compilers."""
+    toolchains = model.get('toolchains')
+    if not toolchains:
+        return None
+    entries = []
+    for t in model['targets']:
+        groups = t.get('compile_groups')
+        if groups is None:
+            return None
+        for cg in groups:
+            tc = toolchains.get(cg['language'])
+            if tc is None or not tc.get('path'):
+                continue
+            msvc = tc.get('id') == 'MSVC'
+            args = [tc['path']]
+            args += [('/D' if msvc else '-D') + d for d in cg['defines']]
+            for inc, system in cg['includes']:
+                if msvc:
+                    args.append('/I' + inc)
+                elif system:
+                    args += ['-isystem', inc]
+                else:
+                    args.append('-I' + inc)
+            if cg.get('sysroot') and not msvc:
+                args.append('--sysroot=' + cg['sysroot'])
+            for f in cg['fragments']:
+                args += shlex.split(f, posix=not msvc)
+            for src in cg['sources']:
+                entries.append(odict([
+                    ('directory', t['directory']),
+                    ('file', src),
+                    ('arguments', args + ['/c' if msvc else '-c', src]),
+                ]))
+    return entries
+
+
+# -----------------------------------------------------------------------------
+class CompileDB:
+    """the compile commands of a build, indexed by source file"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.targets_by_file = {}
+        for e in entries:
+            t = entry_target(e)
+            ts = self.targets_by_file.setdefault(entry_file(e), [])
+            if t is not None and t not in ts:
+                ts.append(t)
+
+    @staticmethod
+    def load(builddir):
+        """load the compile database of a build directory, returning None
+        if the build has none"""
+        fn = os.path.join(builddir, filename)
+        if not os.path.exists(fn):
+            return None
+        return CompileDB(list(iter_entries(fn)))
+
+    def __contains__(self, path):
+        return os.path.normpath(path) in self.targets_by_file
+
+    @property
+    def files(self):
+        return self.targets_by_file.keys()
+
+    def targets_for(self, files):
+        """the targets compiling any of the given files. Files which are
+        not in the database are ignored."""
+        out = []
+        for f in files:
+            for t in self.targets_by_file.get(os.path.normpath(f), []):
+                if t not in out:
+                    out.append(t)
+        return out
+
+
+# -----------------------------------------------------------------------------
+class CompileDBIndex:
+    """merges the compile databases of several builds. Entries compiling
+    the same file with the same flags (once the build directory is
+    replaced by a placeholder) are stored only once, and each build keeps
+    the list of its entries:
+
+        {"version": 1, "placeholder": "${CMANY_BUILD_DIR}",
+         "entries": [{"directory": ..., "file": ..., "arguments": [...]}, ...],
+         "builds": {"<name>": {"directory": <builddir>, "entries": [<idx>, ...]}}}
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.builds = odict()
+        self._ids = {}
+
+    def add_build(self, name, builddir, dbfile=None):
+        """add the compile database of a build, streaming it from the file"""
+        if dbfile is None:
+            dbfile = os.path.join(builddir, filename)
+        builddir = os.path.normpath(builddir)
+        # only whole paths: the dir of a build may be a prefix of another's
+        rx = re.compile(re.escape(builddir) + r'(?=$|[/\\])')
+        ids = []
+        for e in iter_entries(dbfile):
+            e = __class__.normalize(e, rx)
+            key = (e['file'], tuple(e['arguments']), e.get('output'))
+            i = self._ids.get(key)
+            if i is None:
+                i = len(self.entries)
+                self._ids[key] = i
+                self.entries.append(e)
+            ids.append(i)
+        self.builds[name] = odict([('directory', builddir), ('entries', ids)])
+
+    @staticmethod
+    def normalize(entry, builddir_re):
+        """replace the build dir matched by builddir_re with the placeholder"""
+        def _n(s):
+            return builddir_re.sub(lambda _: builddir_placeholder, s)
+        e = odict()
+        e['directory'] = _n(os.path.normpath(entry['directory']))
+        e['file'] = _n(entry_file(entry))
+        e['arguments'] = [_n(a) for a in entry_args(entry)]
+        if entry.get('output') is not None:
+            e['output'] = _n(entry['output'])
+        return e
+
+    def json_data(self):
+        return odict([
+            ('version', index_version),
+            ('placeholder', builddir_placeholder),
+            ('entries', self.entries),
+            ('builds', self.builds),
+        ])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.json_data(), f, separators=(',', ':'))
+
+
+def load_index(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != index_version:
+        raise err.CompileDBInvalid(path, f"unsupported index version: {data.get('version')}")
+    return data
+
+
+def expand_index(index, build_name):
+    """return the compile database of a build from a merged index"""
+    b = index['builds'][build_name]
+    ph, d = index['placeholder'], b['directory']
+    out = []
+    for i in b['entries']:
+        e = index['entries'][i]
+        x = odict()
+        x['directory'] = e['directory'].replace(ph, d)
+        x['file'] = e['file'].replace(ph, d)
+        x['arguments'] = [a.replace(ph, d) for a in e['arguments']]
+        if 'output' in e:
+            x['output'] = e['output'].replace(ph, d)
+        out.append(x)
+    return out
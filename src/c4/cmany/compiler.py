@@ -1,6 +1,7 @@
 import os
 import re
 import tempfile
+import threading
 
 from .build_item import BuildItem
 from .system import System
@@ -14,6 +15,9 @@ from . import err
 class Compiler(BuildItem):
     """Represents a compiler choice"""
 
+    # probing spawns the compilers, so probe them concurrently
+    create_concurrently = True
+
     @staticmethod
     def default():
         return Compiler(__class__.default_str())
@@ -111,16 +115,34 @@ class Compiler(BuildItem):
             cc = "cc"
         return cc
 
+    # probed (name, version, version_full), by compiler path and mtime
+    _probed = {}
+    _probed_lock = threading.Lock()
+
     def get_version(self, path):
+        # is this visual studio?
+        if hasattr(self, "vs"):
+            return self.vs.name, str(self.vs.year), self.vs.name
+        # probing spawns the compiler a few times, so reuse the results
+        # while the compiler is not changed
+        key = (path, os.path.getmtime(path))
+        with __class__._probed_lock:
+            probed = __class__._probed.get(key)
+        if probed is None:
+            # probe outside of the lock so that different compilers are
+            # probed concurrently
+            probed = self._probe_version(path)
+            with __class__._probed_lock:
+                probed = __class__._probed.setdefault(key, probed)
+        return probed
+
+    def _probe_version(self, path):
         # a function to silently run a system command
         def slntout(cmd):
             out = util.runsyscmd(cmd, echo_cmd=False,
                                  echo_output=False, capture_output=True)
             out = out.strip("\n")
             return out
-        # is this visual studio?
-        if hasattr(self, "vs"):
-            return self.vs.name, str(self.vs.year), self.vs.name
         # other compilers
         # print("cmp: found compiler:", path)
         out = slntout([path, '--version'])
@@ -0,0 +1,221 @@
+"""shell completion for cmany, served from a precomputed description of
+the subcommands and their options, so that completing does not need to
+build the argument parser (which probes the default compiler and runs
+cmake to get the system information).
+
+The description is written to the user dir by the first completion
+request which does not find it current, ie after any of cmany's modules
+changes; other commands do not touch it. Build names and
+targets are read from the build root given in the command line."""
+
+import os
+import json
+import shlex
+
+from . import conf
+
+
+cache_name = "completion.json"
+# bump this when changing the contents of the cache
+cache_version = 1
+
+# options whose values are build targets
+_target_dests = ('target',)
+# the positional arguments completed with build names or targets
+_build_positionals = ('glob',)
+_target_positionals = ('target',)
+
+
+def cache_file():
+    return os.path.join(conf.USER_DIR, cache_name)
+
+
+def stamp():
+    """identify the sources of cmany, which define its arguments"""
+    d = os.path.dirname(os.path.abspath(__file__))
+    return [cache_version] + sorted(
+        [f, os.stat(os.path.join(d, f)).st_mtime_ns]
+        for f in os.listdir(d) if f.endswith('.py'))
+
+
+# -----------------------------------------------------------------------------
+def _options(parser):
+    opts = {}
+    positionals = []
+    for a in parser._actions:
+        if a.option_strings:
+            takes_value = a.nargs != 0
+            choices = [str(c) for c in a.choices] if a.choices else None
+            for o in a.option_strings:
+                opts[o] = {'dest': a.dest, 'value': takes_value, 'choices': choices}
+        elif not hasattr(a, '_name_parser_map'):
+            positionals.append(a.dest)
+    return opts, positionals
+
+
+def describe(parser):
+    """return a json-compatible description of the subcommands, aliases and
+    options of the parser"""
+    import argparse
+    spec = {'stamp': stamp(), 'options': {}, 'commands': {}, 'aliases': {}}
+    spec['options'], _ = _options(parser)
+    for a in parser._actions:
+        if not isinstance(a, argparse._SubParsersAction):
+            continue
+        for name, sub in a.choices.items():
+            if sub.prog.split()[-1] != name:
+                spec['aliases'][name] = sub.prog.split()[-1]
+                continue
+            opts, pos = _options(sub)
+            spec['commands'][name] = {'options': opts, 'positionals': pos}
+    return spec
+
+
+def save(parser):
+    """write the description of the parser, unless it is current"""
+    fn = cache_file()
+    if load() is not None:
+        return
+    spec = describe(parser)
+    d = os.path.dirname(fn)
+    if not os.path.exists(d):
+        os.makedirs(d)
+    tmp = f"{fn}.{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(spec, f)
+    os.replace(tmp, fn)
+
+
+def load():
+    """return the saved description, or None if it is missing or stale"""
+    fn = cache_file()
+    if not os.path.exists(fn):
+        return None
+    try:
+        with open(fn) as f:
+            spec = json.load(f)
+    except ValueError:
+        return None
+    if spec.get('stamp') != stamp():
+        return None
+    return spec
+
+
+# -----------------------------------------------------------------------------
+def _split(line):
+    try:
+        return shlex.split(line)
+    except ValueError:  # eg, an unterminated quote in the current word
+        return line.split()
+
+
+def _build_dirs(words):
+    root = "build"
+    for i, w in enumerate(words):
+        if w == '--build-dir' and i + 1 < len(words):
+            root = words[i + 1]
+        elif w.startswith('--build-dir='):
+            root = w[len('--build-dir='):]
+    if not os.path.isdir(root):
+        return []
+    out = []
+    for name in sorted(os.listdir(root)):
+        d = os.path.join(root, name)
+        if os.path.exists(os.path.join(d, 'CMakeCache.txt')):
+            out.append(d)
+    return out
+
+
+def build_names(words):
+    return [os.path.basename(d) for d in _build_dirs(words)]
+
+
+def targets(words):
+    from . import fileapi
+    out = set()
+    for d in _build_dirs(words):
+        try:
+            model = fileapi.load(d)
+        except (OSError, ValueError, KeyError):
+            continue
+        if model is not None:
+            out.update(t['name'] for t in model['targets'])
+    return sorted(out)
+
+
+def candidates(spec, words, cur):
+    """the completions of the current word cur, after the given words
+    (which do not include the program name)"""
+    cmd = None
+    for i, w in enumerate(words):
+        name = spec['aliases'].get(w, w)
+        if name in spec['commands']:
+            cmd = name
+            words = words[i + 1:]
+            break
+    if cmd is None:
+        if cur.startswith('-'):
+            opts = spec['options']
+        else:
+            opts = list(spec['commands']) + list(spec['aliases'])
+        return sorted(o for o in opts if o.startswith(cur))
+    c = spec['commands'][cmd]
+    opts = c['options']
+    # the value of an option?
+    prev = words[-1] if words else None
+    if prev in opts and opts[prev]['value']:
+        o = opts[prev]
+        if o['choices']:
+            found = o['choices']
+        elif o['dest'] in _target_dests:
+            found = targets(words)
+        else:
+            found = []  # let the shell complete files
+        return [f for f in found if f.startswith(cur)]
+    if cur.startswith('-'):
+        return sorted(o for o in opts if o.startswith(cur))
+    # a positional argument: count those already given
+    npos = 0
+    skip = False
+    for w in words:
+        if skip:
+            skip = False
+        elif w in opts:
+            skip = opts[w]['value']
+        elif not w.startswith('-'):
+            npos += 1
+    pos = c['positionals']
+    dest = pos[min(npos, len(pos) - 1)] if pos else None
+    if dest in _build_positionals:
+        found = build_names(words)
+    elif dest in _target_positionals:
+        found = targets(words)
+    else:
+        found = []
+    return [f for f in found if f.startswith(cur)]
+
+
+def autocomplete():
+    """answer an argcomplete request from the saved description. Returns
+    False if there is no current description, in which case the request
+    must be answered by argcomplete."""
+    spec = load()
+    if spec is None:
+        return False
+    line = os.environ.get('COMP_LINE', '')
+    point = int(os.environ.get('COMP_POINT', len(line)))
+    line = line[:point]
+    words = _split(line)
+    cur = '' if (not line or line[-1].isspace()) else (words.pop() if words else '')
+    found = candidates(spec, words[1:], cur)
+    ifs = os.environ.get('_ARGCOMPLETE_IFS', '\013')
+    fn = os.environ.get('_ARGCOMPLETE_STDOUT_FILENAME')
+    try:
+        out = open(fn, 'w') if fn else os.fdopen(8, 'w')
+    except OSError:  # not called from the shell hook
+        import sys
+        print(ifs.join(found), file=sys.stdout, end='', flush=True)
+        return True
+    with out:
+        out.write(ifs.join(found))
+    return True
@@ -1,5 +1,4 @@
 
-from ruamel import yaml
 import os.path
 from collections import OrderedDict as odict
 
@@ -29,6 +28,7 @@ class Conan:
         settings_file = os.path.join(conandir, 'settings.yml')
         with open(settings_file) as f:
             txt = f.read()
+            from ruamel import yaml
             YAML = yaml.YAML()
             data = YAML.load(txt)
             settings = odict(data)
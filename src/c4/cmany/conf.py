@@ -1,18 +1,16 @@
+import os
 import os.path as osp
+import pickle
+import hashlib
 from collections import OrderedDict as odict
 from . import util
 
-from ruamel import yaml
-from ruamel.yaml.comments import CommentedMap as CommentedMap
-
-if yaml.version_info < (0, 15):
-    raise Exception("cmany requires ruamel.yaml>=0.15.0")
-
 
 SHARE_DIR = osp.abspath(osp.dirname(__file__))
 CONF_DIR = osp.join(SHARE_DIR, 'conf')
 DOC_DIR = osp.join(SHARE_DIR, 'doc')
-USER_DIR = osp.expanduser("~/.cmany/")
+# the user dir can be moved, eg to isolate tests from the user's settings
+USER_DIR = os.environ.get('CMANY_USER_DIR', osp.expanduser("~/.cmany/"))
 
 assert osp.exists(SHARE_DIR), f"cmany: share dir not found: {SHARE_DIR}"
 assert osp.exists(CONF_DIR), f"cmany: conf dir not found: {CONF_DIR}"
@@ -20,13 +18,99 @@ assert osp.exists(DOC_DIR), f"cmany: doc dir not found: {DOC_DIR}"
 # assert osp.exists(USER_DIR), "cmany: user dir not found: {}".format(USER_DIR)
 
 
+def _yaml():
+    """ruamel.yaml is slow to import, so it is only imported when the
+    configs are actually loaded"""
+    from ruamel import yaml
+    if yaml.version_info < (0, 15):
+        raise Exception("cmany requires ruamel.yaml>=0.15.0")
+    return yaml
+
+
+def _stat(filename):
+    """return (mtime, size) of a file, or None if it does not exist"""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 class Configs:
 
+    # when set to a dict, load_seq() reuses the configs loaded from
+    # unchanged files. The results are shared, so they must not be changed.
+    memo = None
+
+    # the merged configs are also cached in the user dir, keyed by the
+    # files of the sequence. Bump the version when changing the contents.
+    cache_dir = "configs"
+    cache_version = 1
+
     @staticmethod
     def load_seq(file_seq):
+        key = __class__._key(file_seq)
+        if __class__.memo is not None:
+            curr = __class__.memo.get(key)
+            if curr is not None:
+                return curr
+        fn = __class__._cache_file(file_seq)
+        curr = __class__._load_cached(fn, key)
+        if curr is None:
+            curr = __class__._load_seq(file_seq)
+            if curr is not None:
+                __class__._save_cached(fn, key, curr)
+        if __class__.memo is not None:
+            __class__.memo[key] = curr
+        return curr
+
+    @staticmethod
+    def _key(file_seq):
+        # the modules of the pickled classes are part of the key, as
+        # changing them may make the cached pickles stale
+        from . import flags
+        mods = (__file__, flags.__file__, util.__file__)
+        return ((__class__.cache_version,)
+                + tuple((fn, _stat(fn)) for fn in mods)
+                + tuple((fn, _stat(fn)) for fn in file_seq))
+
+    @staticmethod
+    def _cache_file(file_seq):
+        # named only after the files, so that a changed file overwrites
+        # the previous entry; the key stored in it tells if it is current
+        h = hashlib.sha1(repr(tuple(file_seq)).encode()).hexdigest()
+        return osp.join(USER_DIR, __class__.cache_dir, h + ".pickle")
+
+    @staticmethod
+    def _load_cached(fn, key):
+        if not osp.exists(fn):
+            return None
+        try:
+            with open(fn, "rb") as f:
+                cached_key, curr = pickle.load(f)
+        except Exception as e:  # a corrupt or incompatible cache is not an error
+            util.logdbg("could not load the cached configs:", fn, e)
+            return None
+        if cached_key != key:
+            return None
+        return curr
+
+    @staticmethod
+    def _save_cached(fn, key, curr):
+        tmp = f"{fn}.{os.getpid()}"
+        try:
+            os.makedirs(osp.dirname(fn), exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump((key, curr), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, fn)
+        except OSError as e:
+            util.logdbg("could not cache the configs:", fn, e)
+
+    @staticmethod
+    def _load_seq(file_seq):
         curr = None
         for fn in file_seq:
             if not osp.exists(fn):
@@ -48,6 +132,8 @@ flag_aliases: {}
 """)
 
     def _load_yml(self, yml):
+        yaml = _yaml()
+        from ruamel.yaml.comments import CommentedMap
         YAML = yaml.YAML()
         dump = YAML.load(yml)
         dump = odict(dump)
@@ -73,18 +159,17 @@ flag_aliases: {}
 
     @staticmethod
     def _merge(dict_recv, dict_send):
-        #"""http://stackoverflow.com/questions/38987/how-to-merge-two-python-dictionaries-in-a-single-expression"""
-        #z = dict_recv.copy()
-        #z.update(dict_send)
-        z = util.nested_merge(dict_recv, dict_send)
-        return z
+        # merge lazily: the maps are not copied, and their keys are
+        # merged only when accessed
+        return util.MergedView(dict_recv, dict_send)
 
     def merge_from(self, other):
+        from collections.abc import Mapping
         for k in (list(self._dump.keys()) + list(other._dump.keys())):
             dst = self._dump.get(k)
             src = other._dump.get(k)
             def is_dict(d):
-                return isinstance(d, dict) or isinstance(d, odict) or isinstance(d, CommentedMap)
+                return isinstance(d, Mapping)
             if (dst is not None and src is not None):
                 if is_dict(dst) and is_dict(src):
                     self._dump[k] = __class__._merge(dst, src)
@@ -109,6 +194,7 @@ flag_aliases: {}
         return curr
 
     def set_val(self, name_sub, value, where=None):
+        from ruamel.yaml.comments import CommentedMap
         spl = name_sub.split(".")
         child = spl[-1]
         seq = spl[:-1]
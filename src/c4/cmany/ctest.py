@@ -0,0 +1,256 @@
+import os
+import re
+import json
+import shlex
+import threading
+import subprocess
+import timeit
+from collections import OrderedDict as odict
+
+from . import util
+from .util import logdbg as dbg
+
+
+log_file = "cmany_test.log"
+json_file = "cmany_test.json"
+junit_file = "cmany_test.junit.xml"
+summary_json_file = "cmany_test_summary.json"
+summary_junit_file = "cmany_test_summary.junit.xml"
+
+# the cost assumed for tests without timing history, when no other test
+# in the build has history either
+default_cost = 1.
+
+_list_re = re.compile(r'^\s*Test\s+#(\d+): (.+?)\s*$')
+_result_re = re.compile(r'^\s*\d+/\d+\s+Test\s+#(\d+): (.+?) \.*\s*(?:\*\*\*)?(\S.*?)\s+([\d.]+) sec\s*$')
+
+
+def load_costs(builddir):
+    """return {test: average duration} from the timing history which ctest
+    keeps in the build dir"""
+    fn = os.path.join(builddir, 'Testing', 'Temporary', 'CTestCostData.txt')
+    costs = {}
+    if not os.path.exists(fn):
+        return costs
+    with open(fn) as f:
+        for line in f:
+            if line.startswith('---'):
+                break  # the failed tests follow
+            spl = line.rsplit(None, 2)
+            if len(spl) != 3:
+                continue
+            try:
+                costs[spl[0]] = float(spl[2])
+            except ValueError:
+                continue
+    return costs
+
+
+def list_tests(builddir, ctest_args=()):
+    with util.setcwd(builddir):
+        out = util.runsyscmd(['ctest', '-N'] + list(ctest_args), echo_cmd=False,
+                             echo_output=False, capture_output=True)
+    tests = []
+    for line in out.split('\n'):
+        m = _list_re.match(line)
+        if m:
+            tests.append(m.group(2))
+    return tests
+
+
+def parse_results(output):
+    """parse the results of the tests from the output of ctest"""
+    results = []
+    for line in output.split('\n'):
+        m = _result_re.match(line)
+        if m is None:
+            continue
+        status = m.group(3)
+        if status == 'Passed':
+            outcome = 'passed'
+        elif status == 'Skipped' or status.endswith('(Disabled)'):
+            outcome = 'skipped'
+        elif status.startswith('Not Run'):
+            outcome = 'error'
+        else:
+            outcome = 'failed'
+        results.append(odict([
+            ('name', m.group(2)),
+            ('status', status),
+            ('outcome', outcome),
+            ('duration', float(m.group(4))),
+        ]))
+    return results
+
+
+def allocate_cores(costs, budget, limits=None):
+    """split a budget of cores among concurrent runs of estimated costs,
+    so that they finish at about the same time. Each run gets at least one
+    core, and no more than its limit (eg, its number of tests)."""
+    n = len(costs)
+    alloc = [1] * n
+    for _ in range(budget - n):
+        cands = [i for i in range(n) if limits is None or alloc[i] < limits[i]]
+        if not cands:
+            break
+        i = max(cands, key=lambda i: costs[i] / alloc[i])
+        alloc[i] += 1
+    return alloc
+
+
+# -----------------------------------------------------------------------------
+class CTestRun:
+    """runs the tests of a build with ctest, and gathers the results"""
+
+    def __init__(self, build, ctest_args=None):
+        self.build = build
+        self.ctest_args = list(ctest_args or [])
+        if build.generator.is_msvc and '-C' not in self.ctest_args:
+            self.ctest_args = ['-C', build.build_type.name] + self.ctest_args
+        self.tests = list_tests(build.builddir, self.ctest_args)
+        self.cost = __class__.estimate_cost(self.tests, load_costs(build.builddir))
+        self.jobs = 1
+        self.returncode = None
+        self.results = []
+        self.duration = 0.
+        self.error = None
+
+    @staticmethod
+    def estimate_cost(tests, costs):
+        known = [costs[t] for t in tests if t in costs]
+        unknown = default_cost if not known else sum(known) / len(known)
+        return sum(costs.get(t, unknown) for t in tests)
+
+    @property
+    def failed(self):
+        return [r for r in self.results if r['outcome'] in ('failed', 'error')]
+
+    @property
+    def ok(self):
+        return self.error is None and self.returncode == 0 and not self.failed
+
+    def cmd(self):
+        return ['ctest', '-j', str(self.jobs)] + self.ctest_args
+
+    def run(self, jobs):
+        self.jobs = jobs
+        cmd = self.cmd()
+        dbg("running", cmd, "in", self.build.builddir)
+        logfn = os.path.join(self.build.builddir, log_file)
+        t = timeit.default_timer()
+        try:
+            with open(logfn, 'w') as log:
+                self.returncode = subprocess.call(cmd, cwd=self.build.builddir,
+                                                  stdout=log, stderr=subprocess.STDOUT)
+            with open(logfn) as log:
+                self.results = parse_results(log.read())
+        except Exception as e:
+            self.error = str(e)
+        self.duration = timeit.default_timer() - t
+        self.save()
+
+    def json_data(self):
+        return odict([
+            ('build', str(self.build)),
+            ('builddir', self.build.builddir),
+            ('cmd', ' '.join(shlex.quote(a) for a in self.cmd())),
+            ('jobs', self.jobs),
+            ('estimated_cost', self.cost),
+            ('returncode', self.returncode),
+            ('error', self.error),
+            ('duration', self.duration),
+            ('log', os.path.join(self.build.builddir, log_file)),
+            ('tests', self.results),
+        ])
+
+    def save(self):
+        d = self.build.builddir
+        with open(os.path.join(d, json_file), 'w') as f:
+            json.dump(self.json_data(), f, indent=2)
+        write_junit(os.path.join(d, junit_file), [self])
+
+
+def run_all(runs, budget, on_done=None):
+    """run the tests of several builds concurrently, using at most budget
+    cores. The runs with the most expensive tests are started first."""
+    alloc = allocate_cores([r.cost for r in runs], budget,
+                           [max(1, len(r.tests)) for r in runs])
+    pending = sorted(zip(runs, alloc), key=lambda ra: -ra[0].cost)
+    free = budget
+    cv = threading.Condition()
+    def _run(r, jobs):
+        nonlocal free
+        try:
+            r.run(jobs)
+            if on_done is not None:
+                with cv:
+                    on_done(r)
+        except Exception as e:
+            # an exception would be lost with this thread; keep it in the run
+            r.error = r.error or f"{type(e).__name__}: {e}"
+        finally:
+            # always give back the cores, or the waiters would block forever
+            with cv:
+                free += jobs
+                cv.notify()
+    threads = []
+    with cv:
+        for r, jobs in pending:
+            while free < jobs:
+                cv.wait()
+            free -= jobs
+            th = threading.Thread(target=_run, args=(r, jobs))
+            th.start()
+            threads.append(th)
+    for th in threads:
+        th.join()
+
+
+def write_junit(filename, runs):
+    """write the results of the runs in JUnit XML, with one testsuite per
+    build"""
+    import xml.etree.ElementTree as ET
+    root = ET.Element('testsuites')
+    for r in runs:
+        res = r.results
+        suite = ET.SubElement(root, 'testsuite', {
+            'name': str(r.build),
+            'tests': str(len(res)),
+            'failures': str(sum(1 for t in res if t['outcome'] == 'failed')),
+            'errors': str(sum(1 for t in res if t['outcome'] == 'error') + (1 if r.error else 0)),
+            'skipped': str(sum(1 for t in res if t['outcome'] == 'skipped')),
+            'time': f"{r.duration:.3f}",
+        })
+        for t in res:
+            case = ET.SubElement(suite, 'testcase', {
+                'name': t['name'],
+                'classname': str(r.build),
+                'time': f"{t['duration']:.3f}",
+            })
+            if t['outcome'] == 'failed':
+                ET.SubElement(case, 'failure', {'message': t['status']})
+            elif t['outcome'] == 'error':
+                ET.SubElement(case, 'error', {'message': t['status']})
+            elif t['outcome'] == 'skipped':
+                ET.SubElement(case, 'skipped', {'message': t['status']})
+        if r.error:
+            case = ET.SubElement(suite, 'testcase', {'name': 'ctest', 'classname': str(r.build)})
+            ET.SubElement(case, 'error', {'message': r.error})
+    ET.ElementTree(root).write(filename, encoding='utf-8', xml_declaration=True)
+
+
+def write_summary(dirname, runs):
+    """write the merged results of the runs to json and JUnit files in the
+    given dir, and return the merged results"""
+    summary = odict([
+        ('builds', [r.json_data() for r in runs]),
+        ('tests', sum(len(r.results) for r in runs)),
+        ('failed', sum(len(r.failed) for r in runs)),
+        ('failed_builds', [str(r.build) for r in runs if not r.ok]),
+    ])
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    with open(os.path.join(dirname, summary_json_file), 'w') as f:
+        json.dump(summary, f, indent=2)
+    write_junit(os.path.join(dirname, summary_junit_file), runs)
+    return summary
@@ -0,0 +1,200 @@
+import os
+import sys
+import socket
+import socketserver
+import subprocess
+import threading
+import time
+import traceback
+
+from . import util
+from . import conf
+from . import err
+from .util import logdbg as dbg
+
+
+# subcommands which are never forwarded to the daemon. watch runs until
+# interrupted, and would block the daemon for everyone else. batch may
+# read its commands from the caller's stdin, and already runs them in a
+# single process.
+_local_cmds = ('daemon', 'worker', 'watch', 'batch')
+
+
+def socket_path():
+    p = os.environ.get('CMANY_DAEMON_SOCKET')
+    if p:
+        return p
+    return os.path.join(conf.USER_DIR, 'daemon.sock')
+
+
+def _connect(path=None):
+    """connect to the daemon, returning None if it is not running"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    path = path if path is not None else socket_path()
+    if not os.path.exists(path):
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+    except OSError:
+        s.close()
+        return None
+    return s
+
+
+def is_local(cmds, argv):
+    """whether the subcommand in argv must run in the calling process.
+    cmds maps each subcommand to its aliases."""
+    from . import args as c4args
+    try:
+        pos = c4args.find_subcommand(cmds, argv)
+    except err.SubcommandNotFound:
+        return True  # let the caller report it
+    for c, aliases in cmds.items():
+        if argv[pos] == c or argv[pos] in aliases:
+            return c in _local_cmds
+    return True
+
+
+def forward(argv, cmds):
+    """run a cmany command in the daemon, if one is running. Returns the
+    exit code of the command, or None if the daemon was not used."""
+    if os.environ.get('CMANY_NO_DAEMON'):
+        return None
+    if is_local(cmds, argv):
+        return None
+    s = _connect()
+    if s is None:
+        return None
+    with s, s.makefile('rwb') as f:
+        util.send_msg(f, {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)})
+        while True:
+            msg = util.recv_msg(f)
+            if msg is None:
+                print("cmany: lost the connection to the daemon", file=sys.stderr)
+                return 1
+            if 'out' in msg:
+                print(msg['out'], flush=True)
+            elif 'exit' in msg:
+                return msg['exit']
+
+
+def stop(path=None):
+    """stop a running daemon. Returns False if it was not running."""
+    s = _connect(path)
+    if s is None:
+        return False
+    with s, s.makefile('rwb') as f:
+        util.send_msg(f, {'stop': True})
+        util.recv_msg(f)
+    return True
+
+
+def is_running(path=None):
+    s = _connect(path)
+    if s is None:
+        return False
+    s.close()
+    return True
+
+
+def start(path=None, timeout=10.):
+    """start a daemon in the background, and wait for it to be ready"""
+    path = path if path is not None else socket_path()
+    if is_running(path):
+        return False
+    if not os.path.exists(conf.USER_DIR):
+        os.makedirs(conf.USER_DIR)
+    logfile = os.path.join(conf.USER_DIR, 'daemon.log')
+    env = dict(os.environ)
+    env['CMANY_DAEMON_SOCKET'] = path
+    with open(logfile, 'a') as log:
+        subprocess.Popen([sys.executable, '-m', 'c4.cmany.main', 'daemon', 'run'],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                         env=env, start_new_session=True)
+    t = time.time()
+    while not is_running(path):
+        if time.time() - t > timeout:
+            raise err.Error("the daemon did not start. See {}", logfile)
+        time.sleep(0.05)
+    return True
+
+
+# -----------------------------------------------------------------------------
+class Daemon:
+    """runs cmany commands sent through a unix socket, reusing the argument
+    parser, the probed compilers and system information, the loaded configs
+    and the projects from previous commands. The commands are run one at a
+    time, each in the cwd and environment of the caller."""
+
+    def __init__(self, path=None):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise err.NoSupport("the cmany daemon requires unix sockets")
+        self.path = path if path is not None else socket_path()
+        if os.path.exists(self.path):
+            if is_running(self.path):
+                raise err.Error("a daemon is already running at {}", self.path)
+            os.remove(self.path)  # stale socket
+        d = os.path.dirname(self.path)
+        if d and not os.path.exists(d):
+            os.makedirs(d)
+        self.server = socketserver.UnixStreamServer(self.path, _DaemonHandler)
+        self.server.daemon = self
+
+    def serve_forever(self):
+        from . import main
+        main.enable_caching()
+        print(f"cmany daemon: listening on {self.path}", flush=True)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            util.remove_if(self.path)
+
+    def shutdown(self):
+        # must be called from a thread other than the serving one
+        threading.Thread(target=self.server.shutdown).start()
+
+    def run(self, req, send):
+        from . import main
+        dbg("daemon: running", req['argv'])
+        prev_env = dict(os.environ)
+        prev_cwd = os.getcwd()
+        os.environ.clear()
+        os.environ.update(req['env'])
+        code = 1
+        try:
+            os.chdir(req['cwd'])
+            with util.output_lines_redirected(lambda line: send({'out': line})):
+                try:
+                    code = main.cmany_main(req['argv'])
+                except SystemExit as e:
+                    if e.code is None or isinstance(e.code, int):
+                        code = e.code or 0
+                    else:
+                        print(e.code, file=sys.stderr)
+                except Exception:
+                    traceback.print_exc()
+        finally:
+            os.environ.clear()
+            os.environ.update(prev_env)
+            os.chdir(prev_cwd)
+        send({'exit': code})
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        lock = threading.Lock()
+        def send(msg):
+            with lock:  # the output is pumped from another thread
+                util.send_msg(self.wfile, msg)
+        req = util.recv_msg(self.rfile)
+        if req is None:
+            return
+        if req.get('stop'):
+            send({'exit': 0})
+            self.server.daemon.shutdown()
+            return
+        self.server.daemon.run(req, send)
@@ -56,6 +56,11 @@ class CMakeListsNotFound(Error):
         super().__init__("CMakeLists.txt not found at dir: {}", proj_dir)
 
 
+class CompileDBInvalid(Error):
+    def __init__(self, filename, msg):
+        super().__init__("invalid compile database {}: {}", filename, msg)
+
+
 class BuildDirNotFound(Error):
     def __init__(self, bdir, purpose=None):
         msg = "{}build dir was not found: '{}' (curr dir is '{}')"
@@ -99,12 +104,17 @@ class TooManyTargets(Error):
         msg = ("Building multiple targets with this generator is not "
                "implemented. "
                "cmake --build cannot handle multiple --target " +
-               "invokations. A generator-specific command must be "
+               "invokations before cmake 3.15. A generator-specific command must be "
                "written to handle multiple targets with this "
                "generator")
         super().__init__(msg + '("{}")', generator.name)
 
 
+class WorkerError(Error):
+    def __init__(self, worker, msg):
+        super().__init__("worker {}: {}", worker, msg)
+
+
 class BuildError(Error):
     def __init__(self, context, build, cmd, e):
         self.context = context
@@ -114,6 +124,11 @@ class BuildError(Error):
         #super().__init__("{} {}: {}. Command was {}", context, build, e, cmd)
         super().__init__("{} {}: {}", context, build, e)
 
+    @property
+    def returncode(self):
+        """the exit code of the failed command, if it ran"""
+        return getattr(self.exc, 'returncode', None)
+
 
 class ConfigureFailed(BuildError):
     def __init__(self, build, cmd, e):
@@ -133,3 +148,14 @@ class InstallFailed(BuildError):
 class RunCmdFailed(BuildError):
     def __init__(self, build, cmd, e):
         super().__init__("failed command for build", build, cmd, e)
+
+
+class RemoteStepFailed(BuildError):
+    def __init__(self, build, step, worker, e):
+        super().__init__("failed {} on worker {} for build".format(step, worker), build, None, e)
+
+
+class TestsFailed(Error):
+    def __init__(self, failed_builds, num_builds):
+        super().__init__("tests failed in {}/{} builds: {}", len(failed_builds),
+                         num_builds, ", ".join(str(b) for b in failed_builds))
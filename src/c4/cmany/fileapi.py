@@ -0,0 +1,158 @@
+import os
+import glob
+import json
+from collections import OrderedDict as odict
+
+from .util import logdbg as dbg
+
+
+# see https://cmake.org/cmake/help/latest/manual/cmake-file-api.7.html
+client = "client-cmany"
+requests = [
+    {"kind": "codemodel", "version": 2},
+    {"kind": "cmakeFiles", "version": 1},
+    {"kind": "toolchains", "version": 1},
+]
+
+# the parsed reply is cached in this file of the build dir, and reused
+# until cmake writes a new reply (ie, until the next configure). Bump the
+# version when changing the contents of the cache.
+cache_file = "cmany_codemodel.json"
+cache_version = 2
+
+
+def api_dir(builddir):
+    return os.path.join(builddir, '.cmake', 'api', 'v1')
+
+
+def write_query(builddir):
+    """ask cmake to write the codemodel in its next run. This needs to be
+    done before configuring."""
+    d = os.path.join(api_dir(builddir), 'query', client)
+    fn = os.path.join(d, 'query.json')
+    txt = json.dumps({"requests": requests}, indent=2)
+    if os.path.exists(fn):
+        with open(fn) as f:
+            if f.read() == txt:
+                return
+    if not os.path.exists(d):
+        os.makedirs(d)
+    with open(fn, "w") as f:
+        f.write(txt)
+
+
+def latest_index(builddir):
+    """the index file of the most recent reply from cmake, or None. The
+    names of the index files sort in the order they were written."""
+    li = glob.glob(os.path.join(api_dir(builddir), 'reply', 'index-*.json'))
+    return max(li) if li else None
+
+
+def _load_json(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def read_reply(builddir, config=None):
+    """parse cmake's reply to our query. For multi-config generators,
+    config selects the configuration (defaulting to the first). Returns
+    None if there is no reply."""
+    index = latest_index(builddir)
+    if index is None:
+        return None
+    replydir = os.path.dirname(index)
+    responses = _load_json(index).get('reply', {}).get(client, {})
+    responses = responses.get('query.json', {}).get('responses', [])
+    files = {r['kind']: r['jsonFile'] for r in responses if 'jsonFile' in r}
+    if 'codemodel' not in files:
+        return None
+    cm = _load_json(os.path.join(replydir, files['codemodel']))
+    srcdir = cm['paths']['source']
+    blddir = cm['paths']['build']
+    confs = cm['configurations']
+    conf = next((c for c in confs if c['name'] == config), confs[0])
+    names = {t['id']: t['name'] for t in conf['targets']}
+    def _abs(root, p):
+        return os.path.normpath(p if os.path.isabs(p) else os.path.join(root, p))
+    targets = []
+    for t in conf['targets']:
+        tj = _load_json(os.path.join(replydir, t['jsonFile']))
+        sources = [_abs(srcdir, s['path']) for s in tj.get('sources', [])]
+        targets.append(odict([
+            ('name', tj['name']),
+            ('type', tj['type']),
+            ('directory', _abs(blddir, tj.get('paths', {}).get('build', '.'))),
+            ('sources', sources),
+            ('dependencies', [names[d['id']] for d in tj.get('dependencies', [])
+                              if d['id'] in names]),
+            ('artifacts', [_abs(blddir, a['path']) for a in tj.get('artifacts', [])]),
+            ('compile_groups', [_compile_group(cg, sources, srcdir)
+                                for cg in tj.get('compileGroups', [])]),
+        ]))
+    inputs = []
+    if 'cmakeFiles' in files:
+        cf = _load_json(os.path.join(replydir, files['cmakeFiles']))
+        # only the project's files: the others are either from cmake or
+        # generated by the configure step. The project's files may be out
+        # of the source tree (isExternal), eg when include()d from elsewhere
+        inputs = [_abs(srcdir, i['path']) for i in cf.get('inputs', [])
+                  if not (i.get('isGenerated') or i.get('isCMake'))]
+    toolchains = odict()
+    if 'toolchains' in files:
+        tc = _load_json(os.path.join(replydir, files['toolchains']))
+        for t in tc.get('toolchains', []):
+            c = t.get('compiler', {})
+            toolchains[t['language']] = odict([('id', c.get('id')), ('path', c.get('path'))])
+    return odict([
+        ('version', cache_version),
+        ('index', os.path.basename(index)),
+        ('config', conf['name']),
+        ('source', srcdir),
+        ('build', blddir),
+        ('targets', targets),
+        ('cmake_inputs', inputs),
+        ('toolchains', toolchains),
+    ])
+
+
+def _compile_group(cg, sources, srcdir):
+    """the flags used to compile a group of sources of a target"""
+    includes = []
+    for i in cg.get('includes', []):
+        p = i['path']
+        p = os.path.normpath(p if os.path.isabs(p) else os.path.join(srcdir, p))
+        includes.append([p, bool(i.get('isSystem'))])
+    return odict([
+        ('language', cg.get('language')),
+        ('fragments', [f['fragment'] for f in cg.get('compileCommandFragments', [])]),
+        ('defines', [d['define'] for d in cg.get('defines', [])]),
+        ('includes', includes),
+        ('sysroot', cg.get('sysroot', {}).get('path')),
+        ('sources', [sources[i] for i in cg.get('sourceIndexes', [])]),
+    ])
+
+
+def load(builddir, config=None):
+    """return the codemodel of a build, from the cache if cmake did not
+    write a newer reply. Returns None if there is no reply."""
+    index = latest_index(builddir)
+    if index is None:
+        return None
+    cf = os.path.join(builddir, cache_file)
+    if os.path.exists(cf):
+        try:
+            model = _load_json(cf)
+            if (model.get('version') == cache_version
+                    and model.get('index') == os.path.basename(index)
+                    and model.get('query') == config):
+                return model
+        except ValueError:
+            pass
+    dbg("reading the cmake file api reply:", index)
+    model = read_reply(builddir, config)
+    if model is not None:
+        model['query'] = config
+        with open(cf, "w") as f:
+            json.dump(model, f, indent=1)
+    return model
+
@@ -1,5 +1,4 @@
 from collections import OrderedDict as odict
-from ruamel import yaml
 import copy
 
 from .named_item import NamedItem
@@ -33,10 +32,57 @@ class FlagAliases:
         else:
             self.flags = odict(**kwargs)
             self.compilers = get_all_compilers(self.flags)
+        self._clear()
+
+    def _clear(self):
+        # the lookup tables, by name for flags, and the resolved flag
+        # lists, by spec and name for flags. Must be cleared whenever
+        # the flags change.
+        self._tables = {}
+        self._resolved = {}
 
     def merge_from(self, other):
-        self.flags = merge(self.flags, other.flags)
-        self.compilers = get_all_compilers(self.flags)
+        """merge the flags of other into these, which take precedence;
+        same as merge(self.flags, other.flags), but copying only the
+        flags which have to be changed"""
+        comps = list(self.compilers)
+        comps += [c for c in other.compilers if c not in comps]
+        flags = odict()
+        copied = set()
+        for k, f in other.flags.items():
+            mine = self.flags.get(k)
+            if mine is not None:
+                f = _copy_flag(f)
+                f.merge_from(mine)
+                copied.add(k)
+            flags[k] = f
+        for k, f in self.flags.items():
+            if k not in flags:
+                flags[k] = f
+        for k, f in flags.items():
+            missing = [c for c in comps if c not in f.compilers]
+            if not missing:
+                continue
+            if k not in copied:
+                f = _copy_flag(f)
+                flags[k] = f
+            for c in missing:
+                f.add_compiler(c)
+        self.flags = flags
+        # every flag now has all the compilers
+        self.compilers = list(next(iter(flags.values())).compilers) if flags else []
+        self._clear()
+
+    def table(self, compiler):
+        """the flat alias->flag table for the given compiler, computed
+        once per name for flags. Aliases with no flag for the compiler
+        map to None."""
+        sn = get_name_for_flags(compiler)
+        t = self._tables.get(sn)
+        if t is None:
+            t = {n: f.lookup(sn) for n, f in self.flags.items()}
+            self._tables[sn] = t
+        return t
 
     def get(self, name, compiler=None):
         opt = self.flags.get(name)
@@ -47,6 +93,30 @@ class FlagAliases:
         return opt
 
     def as_flags(self, spec, compiler=None):
+        if compiler is not None and all(isinstance(s, str) for s in spec):
+            key = (tuple(spec), get_name_for_flags(compiler))
+            out = self._resolved.get(key)
+            if out is None:
+                out = self._as_flags(spec, compiler)
+                self._resolved[key] = out
+            return list(out)
+        return self._as_flags_slow(spec, compiler)
+
+    def _as_flags(self, spec, compiler):
+        table = self.table(compiler)
+        out = []
+        for s in spec:
+            if s not in table:
+                out.append(s)
+                continue
+            f = table[s]
+            if f is None:
+                util.logwarn('compiler not found: ', compiler, self.flags[s].__dict__)
+                f = ''
+            out.append(f)
+        return out
+
+    def _as_flags_slow(self, spec, compiler=None):
         out = []
         for s in spec:
             if isinstance(s, CFlag):
@@ -88,19 +158,21 @@ class CFlag(NamedItem):
             self.set(k, v)
 
     def get(self, compiler):
-        compseq = (compiler, 'gcc', 'g++', 'vs')  # not really sure about this
-        s = None
-        for c in compseq:
-            sn = get_name_for_flags(c)
-            if hasattr(self, sn):
-                s = getattr(self, sn)
-                break
+        s = self.lookup(compiler)
         if s is None:
             util.logwarn('compiler not found: ', compiler, self.__dict__)
             s = ''
-        # print(self, sn, s)
         return s
 
+    def lookup(self, compiler):
+        """the flag for the compiler, or None if there is none"""
+        compseq = (compiler, 'gcc', 'g++', 'vs')  # not really sure about this
+        for c in compseq:
+            sn = get_name_for_flags(c)
+            if hasattr(self, sn):
+                return getattr(self, sn)
+        return None
+
     def set(self, compiler, val=''):
         sn = get_name_for_flags(compiler)
         setattr(self, sn, val)
@@ -169,6 +241,7 @@ def dump_yml(comps, flags):
 
 def load_txt(yml_txt):
     """load a yml txt into a compilers, flags pair"""
+    from ruamel import yaml
     YAML = yaml.YAML()
     dump = YAML.load(yml_txt)
     fa = dump.get('flag_aliases', dump)
@@ -219,6 +292,12 @@ def merge(flags, into_flags=None):
     return result_flags
 
 
+def _copy_flag(f):
+    c = copy.copy(f)
+    c.compilers = list(f.compilers)
+    return c
+
+
 def get_all_compilers(*flag_dicts):
     comps = []
     for f in flag_dicts:
@@ -20,6 +20,25 @@ class Generator(BuildItem):
         s = cmake.CMakeSysInfo.generator()
         return s
 
+    @staticmethod
+    def sysinfo_spec(system, compiler, fallback_generator="Unix Makefiles"):
+        """the sysinfo name and the cmake args of the generator which
+        Build.create_generator() will select for a build with this system
+        and compiler, to be given to CMakeSysInfo before the build exists"""
+        if compiler.is_msvc:
+            vs = compiler.vs
+            gen = vs.gen if isinstance(vs.gen, list) else [vs.gen]
+            name = gen[0]
+            if name.startswith('vs'):
+                name = vsinfo.to_gen(name)
+            args = ['-G'] + gen
+            if vs.toolset is not None:
+                name += ' ' + vs.toolset
+                args += ['-T', vs.toolset]
+            return (name, args)
+        name = fallback_generator if system.name == "windows" else __class__.default_str()
+        return (name, ['-G', name])
+
     def __init__(self, name, build, num_jobs):
         if isinstance(name, list):
             #more_args = name[1:]
@@ -67,6 +86,24 @@ class Generator(BuildItem):
             pass
         return args
 
+    @property
+    def builds_multiple_targets(self):
+        """whether several targets can be built with a single command.
+        cmake --build accepts multiple targets only since cmake 3.15"""
+        if self.is_makefile or self.is_ninja:
+            return True
+        return cmake.version() >= (3, 15)
+
+    @property
+    def build_file(self):
+        """the file written by cmake in the build dir, from which the
+        build is run; None when it is not known for this generator"""
+        if self.is_makefile:
+            return "Makefile"
+        elif self.is_ninja:
+            return "build.ninja"
+        return None
+
     def cmd(self, targets, override_build_type=None, override_num_jobs=None):
         if self.is_makefile:
             return ['make', '-j', str(self.num_jobs)] + targets
@@ -74,10 +111,10 @@ class Generator(BuildItem):
             return ['ninja', '-j', str(self.num_jobs)] + targets
         else:
             bt = str(self.build.build_type)
-            if len(targets) > 1:
+            if len(targets) > 1 and not self.builds_multiple_targets:
                 raise TooManyTargets(self)
             if not self.is_msvc:
-                cmd = ['cmake', '--build', '.', '--target', targets[0], '--config', bt]
+                cmd = ['cmake', '--build', '.', '--target'] + targets + ['--config', bt]
             else:
                 # # if a target has a . in the name, it must be substituted for _
                 # targets_safe = [re.sub(r'\.', r'_', t) for t in targets]
@@ -96,7 +133,7 @@ class Generator(BuildItem):
                 # cmd = [self.build.compiler.vs.msbuild, proj,
                 #        '/property:Configuration='+bt,
                 #        '/maxcpucount:' + str(self.num_jobs)]
-                cmd = ['cmake', '--build', '.', '--target', targets[0], '--config', bt,
+                cmd = ['cmake', '--build', '.', '--target'] + targets + ['--config', bt,
                        '--',
                        #'/property:Configuration='+bt,
                        '/maxcpucount:' + str(self.num_jobs)]
@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 
+import os
 import sys
-import argcomplete
 
 from collections import OrderedDict as odict
 
-from c4.cmany.project import Project as Project
+# WATCHOUT: keep the imports here light, as they are paid by every
+# invocation of cmany. The project (and with it the builds, the yaml and
+# the serialization libraries) is imported only by commands which use it.
 from c4.cmany import args as c4args
 from c4.cmany import help as c4help
+from c4.cmany import conf
+from c4.cmany import complete as c4complete
+from c4.cmany import daemon as c4daemon
 from c4.cmany import err
 
 
@@ -19,15 +24,22 @@ cmds = odict([
     ('rebuild', ['rb']),
     ('install', ['i']),
     ('reinstall', ['ri']),
+    ('test', ['t']),
     ('run', ['r']),
     ('show_vars', ['sv']),
     ('show_builds', ['sb']),
     ('show_build_names', ['sn']),
     ('show_build_dirs', ['sd']),
     ('show_targets', ['st']),
+    ('plan', ['p']),
     ('create_proj', ['cp']),
     ('export_compile_commands', ['xc']),
+    ('export_compile_db_index', ['xci']),
     ('export_vs', []),
+    ('watch', ['w']),
+    ('worker', []),
+    ('daemon', []),
+    ('batch', []),
 ])
 
 
@@ -39,16 +51,107 @@ def cmd_abbrevs():
             yield k
 
 
+# when caching is enabled (see enable_caching()), the parser and the
+# projects are reused across calls to cmany_main()
+_parser = None
+_proj_cache = None
+# whether to run the commands in the daemon, when it is running
+_use_daemon = True
+
+
+def enable_caching():
+    global _proj_cache, _use_daemon
+    if _proj_cache is not None:
+        return
+    from c4.cmany.project import ProjectCache
+    _proj_cache = ProjectCache()
+    conf.Configs.memo = {}
+    _use_daemon = False
+
+
+def get_parser():
+    global _parser
+    if _parser is None or _proj_cache is None:
+        _parser = c4args.setup(cmds, sys.modules[__name__])
+    return _parser
+
+
+def run_batch(filename, keep_going=False):
+    """run the cmany commands in a file (or stdin, when filename is -), one
+    per line, sharing the parser, projects and configs among them"""
+    import shlex
+    from c4.cmany import util
+    if filename == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(filename) as f:
+            lines = f.read().splitlines()
+    cmdlines = []
+    for lineno, line in enumerate(lines, 1):
+        argv = shlex.split(line, comments=True)
+        if argv and argv[0] == 'cmany':
+            argv = argv[1:]
+        if not argv:
+            continue
+        if argv[0] == 'batch':
+            raise err.Error("{}:{}: batch commands cannot be nested", filename, lineno)
+        cmdlines.append((lineno, argv))
+    enable_caching()
+    failed = []
+    for lineno, argv in cmdlines:
+        util.lognotice(f"cmany batch: {filename}:{lineno}: cmany", " ".join(argv))
+        try:
+            code = cmany_main(argv)
+        except SystemExit as e:  # eg, from argparse
+            code = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print(e, file=sys.stderr)
+            code = 1
+        if code:
+            failed.append(lineno)
+            if not keep_going:
+                break
+    if failed:
+        raise err.Error("batch {}: commands failed at lines {}", filename,
+                        ", ".join(str(l) for l in failed))
+
+
+def make_proj(args):
+    from c4.cmany.project import Project
+    if _proj_cache is not None:
+        return _proj_cache.get(**vars(args))
+    return Project(**vars(args))
+
+
 def cmany_main(in_args=None):
     if in_args is None:
         in_args = sys.argv[1:]
-    in_args = c4args.merge_envargs(cmds, in_args)
-    mymod = sys.modules[__name__]
-    parser = c4args.setup(cmds, mymod)
     # to enable autocomplete:
     # eval "$(register-python-argcomplete cmany)"
     # see https://stackoverflow.com/questions/14597466/custom-tab-completion-in-python-argparse
-    argcomplete.autocomplete(parser)
+    # The completions are served from a description of the parser saved
+    # in the user dir, so that the parser is not built on every TAB press.
+    if '_ARGCOMPLETE' in os.environ:
+        if c4complete.autocomplete():
+            return 0
+        # the description is missing or stale: save it from the parser,
+        # for this request and the next ones
+        try:
+            c4complete.save(get_parser())
+        except OSError:
+            pass  # eg, the user dir is not writeable
+        else:
+            if c4complete.autocomplete():
+                return 0
+    if _use_daemon:
+        code = c4daemon.forward(in_args, cmds)
+        if code is not None:
+            return code
+    in_args = c4args.merge_envargs(cmds, in_args)
+    parser = get_parser()
+    if '_ARGCOMPLETE' in os.environ:
+        import argcomplete
+        argcomplete.autocomplete(parser)
     try:
         args = c4args.parse(parser, in_args)
         if args:
@@ -127,7 +230,7 @@ class help(cmdbase):
 class globcmd(cmdbase):
     """a command applying to a python glob pattern matching build directory names"""
     def proj(self, args):
-        return Project(**vars(args))
+        return make_proj(args)
     def add_args(self, parser):
         super().add_args(parser)
         c4args.add_glob(parser)
@@ -137,7 +240,7 @@ class globcmd(cmdbase):
 class projcmd(cmdbase):
     """a command which refers to a project"""
     def proj(self, args):
-        return Project(**vars(args))
+        return make_proj(args)
     def add_args(self, parser):
         c4args.add_proj(parser)
         c4args.add_bundle_flags(parser)
@@ -168,6 +271,14 @@ class build(selectcmd):
         super().add_args(parser)
         parser.add_argument('target', default=[], nargs='*',
                             help="""specify a subset of targets to build""")
+        parser.add_argument('--changed-files', default=None, type=c4args.cslist,
+                            help="""build only the targets affected by these
+                            files: the targets compiling them or including
+                            them (as of their last build), and the targets
+                            depending on those. Builds not affected are
+                            skipped. Give a comma-separated list of files, or
+                            git-diff[:<rev>] for the files changed since the
+                            git revision (HEAD by default).""")
     def _exec(self, proj, args):
         proj.build()
 
@@ -194,6 +305,24 @@ class reinstall(globcmd):
         proj.reinstall()
 
 
+class test(selectcmd):
+    """run the tests of the selected builds with ctest, building them first
+    if necessary. The builds are tested concurrently, sharing the given
+    number of jobs according to the duration of their tests in previous
+    runs. The results are written to cmany_test.json and
+    cmany_test.junit.xml in each build dir, and merged into
+    cmany_test_summary.json and cmany_test_summary.junit.xml in the build
+    root."""
+    def add_args(self, parser):
+        super().add_args(parser)
+        parser.add_argument('--ctest-args', default="",
+                            help="""additional arguments to ctest, as a
+                            single string. Eg, --ctest-args='-R foo -V'.""")
+    def _exec(self, proj, args):
+        import shlex
+        proj.test(shlex.split(args.ctest_args))
+
+
 class run(selectcmd):
     """run a command in each build directory"""
     def add_args(self, parser):
@@ -246,6 +375,32 @@ class show_targets(selectcmd):
 
 
 # -----------------------------------------------------------------------------
+class plan(selectcmd):
+    """show what a command would do for each of the selected builds: the
+    steps it would run (deps, configure, build, install), with each step's
+    duration estimated from previous runs, and the predicted wall time when
+    running the builds in parallel. Nothing is configured or built."""
+    def add_args(self, parser):
+        super().add_args(parser)
+        parser.add_argument('--command', default='build',
+                            choices=('configure', 'reconfigure', 'build',
+                                     'rebuild', 'install', 'reinstall'),
+                            help="""the command to plan (defaults to %(default)s)""")
+        parser.add_argument('-P', '--parallel', default=None, type=int,
+                            help="""the number of builds running in parallel.
+                            Defaults to the number of workers given with
+                            --workers, or 1.""")
+        parser.add_argument('--json', default=False, action='store_true',
+                            help="""print the plan as JSON""")
+    def _exec(self, proj, args):
+        p = proj.plan(args.command, args.parallel)
+        if args.json:
+            import json
+            print(json.dumps(p.json_data(), indent=2))
+        else:
+            print(p.table())
+
+
 class create_proj(selectcmd):
     """[EXPERIMENTAL] create cmany.yml alongside CMakeLists.txt to hold project-settings"""
     hidden = True
@@ -261,13 +416,30 @@ class create_proj(selectcmd):
 
 class export_compile_commands(selectcmd):
     """[EXPERIMENTAL] create a compile_commands.json in each build dir, for cases (such as VS)
-    _even if_ the build's generator is unable to export one. This requires
-    creating a dummy build dir using the Ninja generator, from where
-    compile_commands.json is copied to the build's dir."""
+    _even if_ the build's generator is unable to export one. The compile
+    commands are obtained from ninja or from the cmake file API. As a last
+    resort, a dummy build dir is created using the Ninja generator, from
+    where compile_commands.json is copied to the build's dir."""
     def _exec(self, proj, args):
         proj.export_compile_commands()
 
 
+class export_compile_db_index(selectcmd):
+    """[EXPERIMENTAL] merge the compile_commands.json of the selected builds
+    into a single index, where the entries which are equal in several builds
+    (once the build directory is replaced by a placeholder) are stored only
+    once. Each build keeps the list of its entries. The databases are read
+    incrementally, so that they are never loaded in whole."""
+    def add_args(self, parser):
+        super().add_args(parser)
+        parser.add_argument('-o', '--output', default=None,
+                            help="""file where the index should be written.
+                            Defaults to compile_commands.index.json in the
+                            build root.""")
+    def _exec(self, proj, args):
+        proj.export_compile_db_index(args.output)
+
+
 class export_vs(selectcmd):
     """[EXPERIMENTAL] create CMakeSettings.json, a VisualStudio 2015+ compatible file
     outlining the project builds
@@ -276,7 +448,81 @@ class export_vs(selectcmd):
         proj.export_vs()
 
 
+class watch(selectcmd):
+    """build the selected builds, and then watch the project files for
+    changes, rebuilding only the builds and targets affected by each
+    change (see build --changed-files). Changes to cmake files rebuild the
+    default targets."""
+    def add_args(self, parser):
+        super().add_args(parser)
+        c4args.add_watch(parser)
+    def _exec(self, proj, args):
+        try:
+            proj.watch(debounce=args.debounce, polling=args.poll,
+                       interval=args.poll_interval)
+        except KeyboardInterrupt:
+            pass
+
+
+class worker(cmdbase):
+    """[EXPERIMENTAL] serve build steps to other cmany invokations, which
+    can dispatch their builds to this worker with --workers host:port.
+    When a build root is given to the worker, the builds are placed there
+    instead of in their original build root."""
+    def add_args(self, parser):
+        c4args.add_worker(parser)
+    def _exec(self, proj, args):
+        from c4.cmany.worker import Worker
+        w = Worker(host=args.host, port=args.port,
+                   build_root=args.build_dir, install_root=args.install_dir,
+                   allow_remote=args.allow_remote)
+        w.serve_forever()
+
+
+class daemon(cmdbase):
+    """[EXPERIMENTAL] start, stop or query a background cmany process which
+    keeps the probed compilers, system information, configs and projects in
+    memory. While the daemon is running, cmany commands are forwarded to it,
+    saving the startup overhead. Set CMANY_NO_DAEMON to prevent this."""
+    def add_args(self, parser):
+        parser.add_argument('action', nargs='?', default='run',
+                            choices=('run', 'start', 'stop', 'status'),
+                            help="""run the daemon in the foreground (the
+                            default), start it in the background, stop it or
+                            query whether it is running""")
+    def _exec(self, proj, args):
+        path = c4daemon.socket_path()
+        if args.action == 'run':
+            c4daemon.Daemon(path).serve_forever()
+        elif args.action == 'start':
+            if not c4daemon.start(path):
+                print("cmany daemon: already running at", path)
+        elif args.action == 'stop':
+            if not c4daemon.stop(path):
+                print("cmany daemon: not running")
+        elif args.action == 'status':
+            running = c4daemon.is_running(path)
+            print("cmany daemon:", "running at" if running else "not running", path)
+
+
+class batch(cmdbase):
+    """run the cmany commands in a file, one per line, in a single process.
+    The argument parser, the probed compilers and system information, the
+    configs and the projects are shared by all the commands. Empty lines
+    and comments (starting with #) are skipped, and each line may start
+    with cmany. CMANY_ARGS and CMANY_PFX_ARGS apply to each command."""
+    def add_args(self, parser):
+        parser.add_argument('file',
+                            help="""the file with the commands, or - to read
+                            them from stdin""")
+        parser.add_argument('-k', '--keep-going', default=False, action='store_true',
+                            help="""run the remaining commands after a command
+                            fails""")
+    def _exec(self, proj, args):
+        run_batch(args.file, args.keep_going)
+
+
 # -----------------------------------------------------------------------------
 
 if __name__ == "__main__":
-    cmany_main(sys.argv[1:])
+    sys.exit(cmany_main(sys.argv[1:]))
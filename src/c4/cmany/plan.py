@@ -0,0 +1,156 @@
+import os
+import json
+import heapq
+import timeit
+from contextlib import contextmanager
+from collections import OrderedDict as odict
+
+from . import util
+
+
+# the durations of the steps of a build are kept in this file of the build
+# dir, and used to estimate the duration of the next runs
+timings_file = "cmany_timings.json"
+# the number of durations kept for each step
+timings_history = 5
+
+# the steps run by each command, in the order they run
+command_steps = odict([
+    ('configure', ('deps', 'configure')),
+    ('reconfigure', ('configure',)),
+    ('build', ('configure', 'deps', 'build')),
+    ('rebuild', ('build',)),
+    ('install', ('configure', 'deps', 'build', 'install')),
+    ('reinstall', ('build', 'install')),
+])
+
+
+def load_timings(builddir):
+    """return {step: [durations]} for the previous runs of a build"""
+    fn = os.path.join(builddir, timings_file)
+    if not os.path.exists(fn):
+        return {}
+    try:
+        with open(fn) as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def record_timing(builddir, step, duration):
+    timings = load_timings(builddir)
+    durations = timings.get(step, []) + [duration]
+    timings[step] = durations[-timings_history:]
+    with open(os.path.join(builddir, timings_file), "w") as f:
+        json.dump(timings, f, indent=1, sort_keys=True)
+
+
+@contextmanager
+def timed(builddir, step):
+    """record the duration of a step of a build, when it succeeds"""
+    t = timeit.default_timer()
+    yield
+    record_timing(builddir, step, timeit.default_timer() - t)
+
+
+def pending_steps(build, command):
+    """the steps which the command would run for the build, as decided
+    by the build's state. This neither runs nor configures anything."""
+    steps = []
+    for s in command_steps[command]:
+        if s == 'deps':
+            if build.deps and not build.deps_done:
+                steps.append(s)
+        elif s == 'configure' and command in ('build', 'install'):
+            if build.needs_configure():
+                steps.append(s)
+        elif s == 'build' and command in ('install', 'reinstall'):
+            if build.needs_build():
+                steps.append(s)
+        else:
+            steps.append(s)
+    return steps
+
+
+def schedule(durations, parallel):
+    """predict the wall time of running jobs with the given durations in
+    the given number of parallel slots, by assigning the longest jobs
+    first to the least loaded slot"""
+    slots = [0.] * max(1, parallel)
+    for d in sorted(durations, reverse=True):
+        heapq.heappush(slots, heapq.heappop(slots) + d)
+    return max(slots)
+
+
+# -----------------------------------------------------------------------------
+class Plan:
+    """what a command would do for each build, with the duration of each
+    step estimated from previous runs. A step without history of its own
+    is estimated with the average of the other builds for that step; when
+    no build has history for a step, its estimate is None."""
+
+    def __init__(self, command, builds, parallel=1):
+        self.command = command
+        self.parallel = max(1, parallel)
+        history = [(b, load_timings(b.builddir)) for b in builds]
+        averages = {}
+        for s in command_steps[command]:
+            means = [sum(h[s]) / len(h[s]) for _, h in history if h.get(s)]
+            averages[s] = sum(means) / len(means) if means else None
+        self.builds = []
+        for b, h in history:
+            steps = odict()
+            for s in pending_steps(b, command):
+                steps[s] = sum(h[s]) / len(h[s]) if h.get(s) else averages[s]
+            self.builds.append((b, steps))
+
+    def duration(self, steps):
+        return sum(d for d in steps.values() if d is not None)
+
+    @property
+    def unknown(self):
+        """the steps with no estimate"""
+        return [(b, s) for b, steps in self.builds for s, d in steps.items() if d is None]
+
+    @property
+    def total(self):
+        return sum(self.duration(steps) for _, steps in self.builds)
+
+    @property
+    def wall(self):
+        return schedule([self.duration(steps) for _, steps in self.builds], self.parallel)
+
+    def json_data(self):
+        return odict([
+            ('command', self.command),
+            ('parallel', self.parallel),
+            ('total', self.total),
+            ('wall', self.wall),
+            ('unknown', len(self.unknown)),
+            ('builds', [odict([
+                ('name', str(b)),
+                ('builddir', b.builddir),
+                ('steps', steps),
+                ('duration', self.duration(steps)),
+            ]) for b, steps in self.builds]),
+        ])
+
+    def table(self):
+        def fmt(d):
+            return "?" if d is None else util.human_readable_time(d)
+        rows = [("build",) + command_steps[self.command] + ("total",)]
+        for b, steps in self.builds:
+            row = [str(b)]
+            for s in command_steps[self.command]:
+                row.append(fmt(steps[s]) if s in steps else "-")
+            row.append(fmt(self.duration(steps)))
+            rows.append(row)
+        widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+        lines = ["  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip() for r in rows]
+        lines.insert(1, "  ".join("-" * w for w in widths))
+        lines.append("")
+        lines.append(f"{self.command}: {len(self.builds)} builds, total {fmt(self.total)}, "
+                     f"predicted wall time {fmt(self.wall)} with {self.parallel} in parallel")
+        if self.unknown:
+            lines.append(f"{len(self.unknown)} steps without history are not counted (shown as ?)")
+        return "\n".join(lines)
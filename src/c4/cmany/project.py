@@ -5,11 +5,9 @@ import glob
 import json
 import copy
 import timeit
+import threading
 from collections import OrderedDict as odict
 
-from ruamel import yaml as yaml
-from ruamel.yaml.comments import CommentedMap as CommentedMap
-
 from . import util
 from . import conf
 
@@ -21,6 +19,7 @@ from .architecture import Architecture
 from .compiler import Compiler
 from .variant import Variant
 from .build import Build
+from .generator import Generator
 
 from .combination_rules import CombinationRules
 from .cmake import getcachevars
@@ -42,6 +41,45 @@ def _getdir(attr_name, default, kwargs, cwd):
     return d
 
 
+# the builds use the process' current directory, so only one run of
+# steps in this process can happen at any time
+_run_lock = threading.Lock()
+
+
+# -----------------------------------------------------------------------------
+class ProjectCache:
+    """keeps projects for reuse by later invokations with equal arguments,
+    for as long as the files they depend on are not changed"""
+
+    # the arguments of the subcommands which play no role in the project,
+    # so that eg `configure` and `build <target>` share the project
+    command_args = ('func', 'target', 'changed_files', 'ctest_args',
+                    'command', 'not_posix', 'no_check', 'var_names',
+                    'output', 'output_file', 'parallel', 'json',
+                    'debounce', 'poll', 'poll_interval')
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self.projects = odict()
+
+    def get(self, **kwargs):
+        key = repr(sorted((k, v) for k, v in kwargs.items()
+                          if k not in __class__.command_args))
+        key = (util.abspath(os.getcwd()), key)
+        entry = self.projects.pop(key, None)
+        if entry is not None and entry[1] == entry[0].stamp():
+            dbg("reusing project:", key)
+            proj = entry[0]
+            proj.kwargs = kwargs
+            proj.targets = kwargs.get('target')
+        else:
+            proj = Project(**kwargs)
+        self.projects[key] = (proj, proj.stamp())
+        while len(self.projects) > self.max_size:
+            self.projects.popitem(last=False)
+        return proj
+
+
 # -----------------------------------------------------------------------------
 class Project:
 
@@ -51,6 +89,7 @@ class Project:
         self.num_jobs = kwargs.get('jobs')
         self.targets = kwargs.get('target')
         self.continue_on_fail = kwargs.get('continue')
+        self.workers = kwargs.get('workers')
         #
         cwd = util.abspath(os.getcwd())
         pdir = kwargs.get('proj_dir')
@@ -105,6 +144,31 @@ class Project:
             self.load_configs()
             self._init_with_build_items(**kwargs)
 
+    @classmethod
+    def from_spec(cls, proj_dir=".", **kwargs):
+        """create a project from keyword arguments named as the command
+        line arguments (eg, build_types, compilers, cmake_vars, build_dir),
+        using the command line defaults for the arguments not given. Item
+        lists may be given as lists or as comma-separated strings."""
+        import argparse
+        from . import args as c4args
+        parser = argparse.ArgumentParser()
+        c4args.add_proj(parser)
+        c4args.add_select(parser)
+        c4args.add_bundle_flags(parser)
+        spec = vars(parser.parse_args([proj_dir]))
+        # the arguments of the build command which the project uses
+        spec['target'] = []
+        spec['changed_files'] = None
+        unknown = sorted(k for k in kwargs if k not in spec)
+        if unknown:
+            raise err.Error("unknown project arguments: {}", unknown)
+        for k, v in kwargs.items():
+            if isinstance(spec[k], list) and isinstance(v, str):
+                v = util.cslist(v)
+            spec[k] = v
+        return cls(**spec)
+
     def _init_with_build_dir(self, pdir, **kwargs):
         build = Build.deserialize(pdir)
         self.builds = [build]
@@ -126,6 +190,7 @@ class Project:
         combs = cr.valid_combinations(s, a, c, t, v)
         dbg("combinations:", combs)
         self.combination_rules = cr
+        self._prewarm_sysinfo(combs)
         #
         self.builds = []
         for comb in combs:
@@ -153,6 +218,24 @@ class Project:
             _addnew(b, 'compiler')
             _addnew(b, 'variant')
 
+    def _prewarm_sysinfo(self, combs):
+        """get the cmake system information for the generators of all the
+        builds at once. Otherwise, each new generator would block the
+        creation of its builds on a run of cmake --system-information."""
+        seen = set()
+        vs, others = [], []
+        for s, _, c, _, _ in combs:
+            if (s.name, c.name) in seen:
+                continue
+            seen.add((s.name, c.name))
+            if c.is_msvc:
+                vs.append(Generator.sysinfo_spec(s, c))
+            else:
+                others.append((s, c))
+        # the other generators need the default generator to be known
+        cmake.CMakeSysInfo.prewarm(vs + (['default'] if others else []))
+        cmake.CMakeSysInfo.prewarm([Generator.sysinfo_spec(s, c) for s, c in others])
+
     @staticmethod
     def get_build_items(**kwargs):
         d = odict()
@@ -183,6 +266,7 @@ class Project:
             if not os.path.exists(ff):
                 raise err.ConfigFileNotFound(ff)
             seq.append(f)
+        self.config_files = seq
         self.configs = conf.Configs.load_seq(seq)
 
     def save_configs(self):
@@ -190,6 +274,8 @@ class Project:
         pass
 
     def create_proj(self):
+        from ruamel import yaml
+        from ruamel.yaml.comments import CommentedMap
         yml = CommentedMap()
         yml['project'] = CommentedMap()
         #
@@ -256,6 +342,19 @@ class Project:
         self.builds.append(b)
         return True  # build successfully added
 
+    def stamp(self):
+        """return the modification times of the files this project depends
+        on. The project should be recreated when any of these changes."""
+        files = [self.cmakelists] + getattr(self, 'config_files', [])
+        files += [b.cachefile for b in self.builds]
+        stamp = []
+        for f in files:
+            try:
+                stamp.append(os.path.getmtime(f))
+            except OSError:
+                stamp.append(None)
+        return stamp
+
     def exists(self, build):
         for b in self.builds:
             if str(b.tag) == str(build.tag):
@@ -290,36 +389,98 @@ class Project:
     def configure(self, **restrict_to):
         if not os.path.exists(self.build_dir):
             os.makedirs(self.build_dir)
-        self._execute(Build.configure, "Configure", silent=False, **restrict_to)
+        self._execute(Build.configure, "Configure", silent=False, step='configure', **restrict_to)
 
     def reconfigure(self, **restrict_to):
         if not os.path.exists(self.build_dir):
             os.makedirs(self.build_dir)
-        self._execute(Build.reconfigure, "Reconfigure", silent=False, **restrict_to)
+        self._execute(Build.reconfigure, "Reconfigure", silent=False, step='reconfigure', **restrict_to)
 
     def export_compile_commands(self, **restrict_to):
         if not os.path.exists(self.build_dir):
             os.makedirs(self.build_dir)
-        self._execute(Build.export_compile_commands, "Export compile commands", silent=False, **restrict_to)
+        self._execute(Build.export_compile_commands, "Export compile commands", silent=False,
+                      step='export_compile_commands', **restrict_to)
+
+    def export_compile_db_index(self, output=None):
+        """merge the compile databases of the builds into a single index,
+        where the entries shared by several builds are stored only once"""
+        from . import compdb
+        if output is None:
+            output = os.path.join(self.build_dir, compdb.index_filename)
+        output = util.abspath(output)
+        idx = compdb.CompileDBIndex()
+        for b in self.builds:
+            fn = os.path.join(b.builddir, compdb.filename)
+            if not os.path.exists(fn):
+                util.logwarn(f"{b}: {compdb.filename} not found, skipping. "
+                             "Configure the build or use export_compile_commands to create it.")
+                continue
+            idx.add_build(str(b), b.builddir, fn)
+        if not os.path.exists(os.path.dirname(output)):
+            os.makedirs(os.path.dirname(output))
+        idx.save(output)
+        num = sum(len(b['entries']) for b in idx.builds.values())
+        util.loginfo(f"exported {len(idx.entries)} unique entries (of {num}) "
+                     f"from {len(idx.builds)} builds:", output)
+        return output
 
     def build(self, **restrict_to):
+        changed = self.kwargs.get('changed_files')
+        if changed:
+            from . import affected
+            files = affected.changed_files(changed, self.root_dir)
+            dbg("changed files:", files)
+            self._build_affected(files, self.select(**restrict_to))
+            return
         def do_build(build):
             build.build(self.targets)
-        self._execute(do_build, "Build", silent=False, **restrict_to)
+        self._execute(do_build, "Build", silent=False, step='build', **restrict_to)
 
     def rebuild(self, **restrict_to):
         def do_rebuild(build):
             build.rebuild(self.targets)
-        self._execute(do_rebuild, "Rebuild", silent=False, **restrict_to)
+        self._execute(do_rebuild, "Rebuild", silent=False, step='rebuild', **restrict_to)
 
     def clean(self, **restrict_to):
-        self._execute(Build.clean, "Clean", silent=False, **restrict_to)
+        self._execute(Build.clean, "Clean", silent=False, step='clean', **restrict_to)
 
     def install(self, **restrict_to):
-        self._execute(Build.install, "Install", silent=False, **restrict_to)
+        self._execute(Build.install, "Install", silent=False, step='install', **restrict_to)
 
     def reinstall(self, **restrict_to):
-        self._execute(Build.reinstall, "Reinstall", silent=False, **restrict_to)
+        self._execute(Build.reinstall, "Reinstall", silent=False, step='reinstall', **restrict_to)
+
+    def test(self, ctest_args=None, **restrict_to):
+        """run the tests of the builds with ctest, building them first if
+        needed. The builds are tested concurrently, splitting the jobs among
+        them according to the duration of their tests in previous runs."""
+        from . import ctest
+        builds = self.select(**restrict_to)
+        if not builds:
+            print("no builds selected")
+            return
+        tobuild = [b for b in builds if b.needs_build()]
+        if tobuild:
+            self._execute(lambda b: b.build([]), "Build", silent=False, builds=tobuild)
+        runs = [ctest.CTestRun(b, ctest_args) for b in builds]
+        def on_done(r):
+            hrt = util.human_readable_time(r.duration)
+            npass = sum(1 for t in r.results if t['outcome'] == 'passed')
+            msg = f"{r.build}: {npass}/{len(r.results)} tests passed, -j{r.jobs} ({hrt})"
+            if r.ok:
+                util.logdone(msg)
+            else:
+                failed = ", ".join(t['name'] for t in r.failed)
+                util.logerr(msg, "[FAIL]!!!", r.error or failed, "See", r.json_data()['log'])
+        util.lognotice(f"Test: running the tests of {len(runs)} builds with {self.num_jobs} jobs")
+        ctest.run_all(runs, max(1, int(self.num_jobs)), on_done)
+        ctest.write_summary(self.build_dir, runs)
+        failed = [r.build for r in runs if not r.ok]
+        if failed:
+            raise err.TestsFailed(failed, len(runs))
+        util.logdone(f"Test: all {len(runs)} builds succeeded! Results at",
+                     os.path.join(self.build_dir, ctest.summary_json_file))
 
     def run_cmd(self, cmd, **subprocess_args):
         def run_it(build):
@@ -357,6 +518,116 @@ class Project:
             for s, v in sysvalues.items():
                 print(fmt.format(var, s, v))
 
+    def plan(self, command='build', parallel=None, **restrict_to):
+        """return what the command would do for the selected builds, with
+        the duration of each step estimated from previous runs. Nothing is
+        configured or built."""
+        from .plan import Plan
+        if parallel is None:
+            parallel = self._num_workers()
+        return Plan(command, self.select(**restrict_to), parallel)
+
+    def run(self, steps, parallel=1, targets=None, **restrict_to):
+        """run the given steps (eg "build" or ["configure", "install"]) for
+        each of the selected builds, returning a RunResult with the
+        duration, exit code and log file of each step. Failures do not
+        raise; instead, the remaining steps of the failed build are
+        skipped. With parallel > 1, the builds are dispatched to that many
+        local worker processes (or to the project's workers, if it has
+        them); otherwise, they run in this process, one at a time."""
+        from . import results
+        if isinstance(steps, str):
+            steps = [steps]
+        for s in steps:
+            if s not in results.steps:
+                raise err.Error("unknown step: {}. Must be one of {}", s, results.steps)
+        if targets is None:
+            targets = self.targets or []
+        run = results.RunResult(list(steps), self.select(**restrict_to))
+        workers = self.workers or ([f"local:{parallel}"] if parallel > 1 else [])
+        t = timeit.default_timer()
+        if workers:
+            self._run_on_workers(run, workers, targets)
+        else:
+            with _run_lock:
+                self._run_locally(run, targets)
+        run.duration = timeit.default_timer() - t
+        return run
+
+    def _run_locally(self, run, targets):
+        from .results import StepResult, log_path
+        for b in run.builds:
+            b.create_dir()
+            for step in run.steps:
+                fn = getattr(b, step)
+                args = [targets] if step in ('build', 'rebuild') else []
+                log = log_path(b.builddir, step)
+                ok, error, returncode = True, None, 0
+                t = timeit.default_timer()
+                with open(log, "w") as f, util.log_sink(f):
+                    try:
+                        fn(*args)
+                    except Exception as e:
+                        ok, error = False, str(e)
+                        returncode = getattr(e, 'returncode', None)
+                t = timeit.default_timer() - t
+                run.results.append(StepResult(b, step, ok, t, returncode, error, log))
+                if not ok:
+                    break
+
+    def _run_on_workers(self, run, workers, targets):
+        from .results import StepResult, log_path
+        from .worker import WorkerPool
+        active = list(run.builds)
+        with WorkerPool(workers) as pool:
+            for step in run.steps:
+                if not active:
+                    break
+                logs = {}
+                for b in active:
+                    b.create_dir()
+                    logs[id(b)] = open(log_path(b.builddir, step), "w")
+                def on_log(b, line):
+                    logs[id(b)].write(line + "\n")
+                try:
+                    replies = pool.run(active, step, targets, on_log=on_log, stop_on_fail=False)
+                finally:
+                    for f in logs.values():
+                        f.close()
+                for b, reply in replies:
+                    ok = reply['status'] == 'ok'
+                    run.results.append(StepResult(
+                        b, step, ok, reply.get('duration', 0.),
+                        reply.get('returncode', 0 if ok else None),
+                        reply.get('error'), log_path(b.builddir, step)))
+                active = [b for b, reply in replies if reply['status'] == 'ok']
+        # order the results by build, as when running locally
+        order = {id(b): i for i, b in enumerate(run.builds)}
+        run.results.sort(key=lambda r: order[id(r.build)])
+
+    async def arun(self, steps, parallel=1, targets=None, **restrict_to):
+        """the asyncio version of run()"""
+        import asyncio
+        import functools
+        fn = functools.partial(self.run, steps, parallel, targets, **restrict_to)
+        return await asyncio.get_running_loop().run_in_executor(None, fn)
+
+    async def aplan(self, command='build', parallel=None, **restrict_to):
+        """the asyncio version of plan()"""
+        import asyncio
+        import functools
+        fn = functools.partial(self.plan, command, parallel, **restrict_to)
+        return await asyncio.get_running_loop().run_in_executor(None, fn)
+
+    def _num_workers(self):
+        num = 0
+        for spec in self.workers or []:
+            if spec.startswith('local:'):
+                num += int(spec[6:])
+            else:
+                num += 1
+        return max(1, num)
+
     def show_build_names(self):
         for b in self.builds:
             print(b)
@@ -373,8 +644,60 @@ class Project:
         for t in self.builds[0].get_targets():
             print(t)
 
-    def _execute(self, fn, msg, silent, **restrict_to):
-        builds = self.select(**restrict_to)
+    def watch(self, debounce=0.3, polling=False, interval=0.5, rounds=None):
+        """build the selected builds, and then watch the project files,
+        rebuilding only the builds and targets affected by each change.
+        When rounds is given, stop after that many rebuilds."""
+        from . import watch as c4watch
+        ignore = [self.build_dir, self.install_dir]
+        watcher = c4watch.create_watcher(self.root_dir, ignore, polling, interval)
+        try:
+            self._watch_round(None)
+            while rounds is None or rounds > 0:
+                util.lognotice("watching for changes:", self.root_dir)
+                changed = c4watch.wait_for_changes(watcher, debounce)
+                dbg("changed files:", changed)
+                self._watch_round(changed)
+                if rounds is not None:
+                    rounds -= 1
+        finally:
+            watcher.close()
+
+    def _watch_round(self, changed):
+        try:
+            self._build_affected(changed)
+        except Exception as e:  # keep watching
+            util.logerr("build failed:", e)
+
+    def _build_affected(self, changed, builds=None):
+        """build only the targets affected by the changed files, skipping
+        the builds which are not affected"""
+        from . import affected
+        targets = odict()
+        for b in (self.builds if builds is None else builds):
+            t = affected.affected_targets(b, changed)
+            if t is None:
+                continue
+            if self.targets:  # restrict to the targets given by the user
+                t = [n for n in t if n in self.targets] if t else list(self.targets)
+                if not t:
+                    continue
+            targets[b] = t
+        if not targets:
+            util.loginfo("no builds are affected by the changes")
+            return
+        def do_build(build):
+            build.build(targets[build])
+        try:
+            self._execute(do_build, "Build", silent=False, step='build',
+                          builds=list(targets.keys()), targets=targets.get)
+        finally:
+            for b in targets.keys():
+                affected.forget_depfiles(b.builddir)
+
+    def _execute(self, fn, msg, silent, step=None, builds=None, targets=None, **restrict_to):
+        if builds is None:
+            builds = self.select(**restrict_to)
         failed = odict()
         durations = odict()
         num = len(builds)
@@ -401,6 +724,67 @@ class Project:
                 nt(b)
             nt("===============================================")
         #
+        if self.workers and step is not None:
+            self._execute_on_workers(step, msg, builds, failed, durations, nt, dn, er,
+                                     targets)
+        else:
+            self._execute_locally(fn, msg, builds, failed, durations, nt, dn, er)
+        #
+        nt("-----------------------------------------------")
+        if num > 1:
+            if failed:
+                dn(msg + ": processed", num, "builds: (with failures)")
+            else:
+                dn(msg + ": finished", num, "builds:")
+            tot = 0.
+            for _, (d, _) in durations.items():
+                tot += d
+            for b in builds:
+                dur, hrt = durations[b]
+                times = "({}, {:.3f}%, {:.3f}x avg)".format(
+                    hrt, dur / tot * 100., dur / (tot / float(num))
+                )
+                fail = failed.get(b)
+                if fail:
+                    er(b, times, "[FAIL]!!!", fail)
+                else:
+                    dn(b, times)
+            if failed:
+                msg = "{}/{} builds failed ({:.1f}%)!"
+                er(msg.format(len(failed), num, float(len(failed)) / num * 100.0))
+            else:
+                dn(f"all {num} builds succeeded!")
+            dn("total time:", util.human_readable_time(tot))
+            nt("===============================================")
+        if failed:
+            raise Exception(failed)
+
+    def _execute_on_workers(self, step, msg, builds, failed, durations, nt, dn, er,
+                            targets=None):
+        from .worker import WorkerPool
+        num = len(builds)
+        def on_log(b, line):
+            print(f"[{b}]", line, flush=True)
+        def on_result(b, reply):
+            t = reply.get('duration', 0.)
+            hrt = util.human_readable_time(t)
+            durations[b] = (t, hrt)
+            if reply['status'] == 'ok':
+                dn(f"{msg}: finished on worker {reply['worker']} ({hrt}):", b)
+            else:
+                e = err.RemoteStepFailed(b, step, reply['worker'], reply.get('error'))
+                util.logerr(f"{b} failed! {e}")
+                failed[b] = e
+        nt(f"{msg}: dispatching {num} builds to workers:", ",".join(self.workers))
+        with WorkerPool(self.workers) as pool:
+            pool.run(builds, step, self.targets if targets is None else targets,
+                     on_log=on_log, on_result=on_result,
+                     stop_on_fail=not self.continue_on_fail)
+        if failed and not self.continue_on_fail:
+            raise next(iter(failed.values()))
+
+    def _execute_locally(self, fn, msg, builds, failed, durations, nt, dn, er):
+        num = len(builds)
         for i, b in enumerate(builds):
             if i > 0:
                 nt("\n")
@@ -432,32 +816,3 @@ class Project:
             else:
                 info = f"{word} building ({hrt})"
             logger(msg + ": " + info + ":",  b)
-        #
-        nt("-----------------------------------------------")
-        if num > 1:
-            if failed:
-                dn(msg + ": processed", num, "builds: (with failures)")
-            else:
-                dn(msg + ": finished", num, "builds:")
-            tot = 0.
-            for _, (d, _) in durations.items():
-                tot += d
-            for b in builds:
-                dur, hrt = durations[b]
-                times = "({}, {:.3f}%, {:.3f}x avg)".format(
-                    hrt, dur / tot * 100., dur / (tot / float(num))
-                )
-                fail = failed.get(b)
-                if fail:
-                    er(b, times, "[FAIL]!!!", fail)
-                else:
-                    dn(b, times)
-            if failed:
-                msg = "{}/{} builds failed ({:.1f}%)!"
-                er(msg.format(len(failed), num, float(len(failed)) / num * 100.0))
-            else:
-                dn(f"all {num} builds succeeded!")
-            dn("total time:", util.human_readable_time(tot))
-            nt("===============================================")
-        if failed:
-            raise Exception(failed)
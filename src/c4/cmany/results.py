@@ -0,0 +1,90 @@
+import os
+from collections import OrderedDict as odict
+
+
+# the steps which can be run with Project.run()
+steps = ('configure', 'reconfigure', 'build', 'rebuild',
+         'install', 'reinstall', 'clean', 'export_compile_commands')
+
+
+def log_path(builddir, step):
+    """the file where the output of a step of a build is written"""
+    return os.path.join(builddir, f"cmany_{step}.log")
+
+
+# -----------------------------------------------------------------------------
+class StepResult:
+    """the outcome of running a step for a build"""
+
+    def __init__(self, build, step, ok, duration, returncode=0, error=None, log=None):
+        self.build = build
+        self.step = step
+        self.ok = ok
+        self.duration = duration
+        # the exit code of the failed command, or None if the step
+        # failed before running any command
+        self.returncode = returncode
+        self.error = error
+        self.log = log
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"failed ({self.returncode})"
+        return f"<StepResult {self.build}: {self.step} {status} {self.duration:.3f}s>"
+
+    def json_data(self):
+        return odict([
+            ('build', str(self.build)),
+            ('builddir', self.build.builddir),
+            ('step', self.step),
+            ('ok', self.ok),
+            ('duration', self.duration),
+            ('returncode', self.returncode),
+            ('error', self.error),
+            ('log', self.log),
+        ])
+
+
+class RunResult:
+    """the outcome of Project.run(): a StepResult for each step which was
+    run for each build. A build's remaining steps are not run after one
+    of them fails."""
+
+    def __init__(self, steps, builds, duration=0., results=None):
+        self.steps = steps
+        self.builds = builds
+        self.duration = duration
+        self.results = [] if results is None else results
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return (f"<RunResult {','.join(self.steps)}: {len(self.builds)} builds, "
+                f"{len(self.failed)} failed, {self.duration:.3f}s>")
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    @property
+    def failed(self):
+        """the failed steps"""
+        return [r for r in self.results if not r.ok]
+
+    def of(self, build):
+        """the results of a build, given either by the build or its name"""
+        return [r for r in self.results if r.build is build or str(r.build) == build]
+
+    def json_data(self):
+        return odict([
+            ('steps', list(self.steps)),
+            ('ok', self.ok),
+            ('duration', self.duration),
+            ('results', [r.json_data() for r in self.results]),
+        ])
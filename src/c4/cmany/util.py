@@ -6,8 +6,10 @@ import subprocess
 import platform
 import copy
 import datetime
-from dateutil.relativedelta import relativedelta
 import shlex
+import threading
+from contextlib import contextmanager
+from collections.abc import Mapping, MutableMapping
 
 import colorama #from colorama import Fore, Back, Style, init
 colorama.init()
@@ -40,12 +42,34 @@ def suppress_colors():
 cmany_colored_output = (not _suppress_colors) and supports_color()
 
 
+# the file where the log functions and runsyscmd() send their messages and
+# the (echoed) commands and their output in the current thread, instead of
+# the terminal. See log_sink()
+_log_sink = threading.local()
+
+
+@contextmanager
+def log_sink(f):
+    """send the messages of the log functions, and the echoed commands and
+    output of runsyscmd() in this thread to the given file object"""
+    prev = getattr(_log_sink, 'file', None)
+    _log_sink.file = f
+    try:
+        yield f
+    finally:
+        _log_sink.file = prev
+
+
 def log(*args, **kwargs):
+    if 'file' not in kwargs:
+        sink = getattr(_log_sink, 'file', None)
+        if sink is not None:
+            kwargs['file'] = sink
     print(*args, **kwargs, flush=True)
 
 
 def color_log(style, *args, **kwargs):
-    if cmany_colored_output:
+    if cmany_colored_output and getattr(_log_sink, 'file', None) is None:
         print(style, sep='', end='')
         print(*args, **kwargs)
         print(colorama.Style.RESET_ALL, sep='', end='', flush=True)
@@ -80,11 +104,11 @@ def logerr(*args, **kwargs):
 
 def logcmd(*args, **kwargs):
     # print(*args, **kwargs)
-    print("--------")
+    log("--------")
     color_log(colorama.Fore.WHITE + colorama.Style.BRIGHT, *args, **kwargs)
     # this print here is needed to prevent the command output
     # from being colored. Need to address this somehow.
-    print("--------")
+    log("--------")
 
 
 # -----------------------------------------------------------------------------
@@ -449,6 +473,10 @@ def nested_lookup(dictionary, *entry):
 
 def nested_merge(into_dct, from_dct, into_dct_is_const=True):
     """ adapted from Copied from https://gist.github.com/angstwad/bf22d1822c38a92ec0a9
+
+    cmany now merges its configs with MergedView; this eager version is
+    kept as the reference for the semantics MergedView must follow (see
+    its tests), and for the users of this module.
     """
     out = copy.deepcopy(into_dct) if into_dct_is_const else into_dct
     for k, v in from_dct.items():
@@ -460,6 +488,98 @@ def nested_merge(into_dct, from_dct, into_dct_is_const=True):
     return out
 
 
+class MergedView(MutableMapping):
+    """a lazily merged view of several mappings, where the later ones
+    take precedence; like a ChainMap, but merging the nested mappings
+    as nested_merge() does. The layers are not copied nor changed: the
+    values set in the view are kept in the view, and the nested views
+    are created only for the keys which are accessed."""
+
+    def __init__(self, *layers):
+        self._layers = list(layers)
+        # the values set in the view, and the nested views
+        self._own = {}
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        if key in self._own:
+            return self._own[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        maps = []
+        for l in reversed(self._layers):
+            if key not in l:
+                continue
+            v = l[key]
+            if not isinstance(v, Mapping):
+                if not maps:
+                    return v
+                break
+            maps.append(v)
+        if not maps:
+            raise KeyError(key)
+        v = MergedView(*reversed(maps))
+        self._own[key] = v
+        return v
+
+    def __setitem__(self, key, val):
+        self._deleted.discard(key)
+        self._own[key] = val
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._own.pop(key, None)
+        self._deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self._own:
+            return True
+        if key in self._deleted:
+            return False
+        return any(key in l for l in self._layers)
+
+    def __iter__(self):
+        seen = set(self._deleted)
+        for l in self._layers + [self._own]:
+            for k in l:
+                if k not in seen:
+                    seen.add(k)
+                    yield k
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "MergedView({})".format(dict(self.items()))
+
+    def materialize(self, cls=dict):
+        """return a copy of the merged contents, with the nested views
+        also materialized"""
+        out = cls()
+        for k, v in self.items():
+            out[k] = v.materialize(cls) if isinstance(v, MergedView) else v
+        return out
+
+
+# -----------------------------------------------------------------------------
+def send_msg(f, msg):
+    """write a message as a line of JSON to a binary file object (eg a
+    socket file)"""
+    import json
+    f.write((json.dumps(msg) + '\n').encode('utf-8'))
+    f.flush()
+
+
+def recv_msg(f):
+    """read a message sent with send_msg(). Returns None at EOF."""
+    import json
+    line = f.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
 # -----------------------------------------------------------------------------
 class setcwd:
     """temporarily change into a directory inside a with block"""
@@ -491,6 +611,7 @@ class setcwd:
 def time_since_modification(path):
     """return the time elapsed since a path has been last modified, as a
     dateutil.relativedelta"""
+    from dateutil.relativedelta import relativedelta
     mtime = os.path.getmtime(path)
     mtime = datetime.datetime.fromtimestamp(mtime)
     currt = datetime.datetime.now()
@@ -561,6 +682,14 @@ def runsyscmd(cmd, echo_cmd=True, echo_output=True, capture_output=False, as_byt
     run a system command. Note that stderr is interspersed with stdout"""
     if not isinstance(cmd, list):
         raise Exception("the command must be a list with each argument a different element in the list")
+    sink = getattr(_log_sink, 'file', None)
+    if sink is not None and echo_output and not capture_output and not as_bytes_string:
+        if echo_cmd:
+            sink.write(f"$ cd {os.path.realpath(os.getcwd())} && {shlex.join(cmd)}\n")
+            sink.flush()
+        result = sprun(cmd, stdout=sink, stderr=subprocess.STDOUT, universal_newlines=True)
+        result.check_returncode()
+        return
     if echo_cmd:
         scmd = cmd
         if not isinstance(cmd, str):
@@ -631,8 +760,6 @@ def runcmd(cmd, *cmd_args, **run_args):
 # -----------------------------------------------------------------------------
 # https://stackoverflow.com/questions/4675728/redirect-stdout-to-a-file-in-python/22434262#22434262
 
-from contextlib import contextmanager
-
 
 def fileno(file_or_fd):
     fd = getattr(file_or_fd, 'fileno', lambda: file_or_fd)()
@@ -666,3 +793,34 @@ def stdout_redirected(to=os.devnull, stdout=None):
             #NOTE: dup2 makes stdout_fd inheritable unconditionally
             stdout.flush()
             os.dup2(copied.fileno(), stdout_fd)  # $ exec >&copied
+
+
+@contextmanager
+def output_lines_redirected(on_line):
+    """redirect stdout and stderr at the file-descriptor level (thus
+    catching also the output of child processes), calling on_line()
+    for each line which is received"""
+    import threading
+    rd, wr = os.pipe()
+    def _pump():
+        with os.fdopen(rd, 'r', errors='replace') as f:
+            for line in f:
+                on_line(line.rstrip('\n'))
+    pump = threading.Thread(target=_pump, daemon=True)
+    pump.start()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = (os.dup(1), os.dup(2))
+    try:
+        os.dup2(wr, 1)
+        os.dup2(wr, 2)
+        os.close(wr)
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+        pump.join()
@@ -0,0 +1,195 @@
+import os
+import sys
+import time
+import select
+import struct
+
+from .util import logdbg as dbg
+
+
+def _ignored_name(name):
+    # hidden files and directories (eg .git), and editor backups
+    return name.startswith('.') or name.endswith('~')
+
+
+# -----------------------------------------------------------------------------
+class PollingWatcher:
+    """watches a directory tree by periodically comparing the modification
+    times of its files. Works everywhere, but the cost of each poll is
+    proportional to the size of the tree."""
+
+    def __init__(self, root, ignore=(), interval=0.5):
+        self.root = os.path.normpath(root)
+        self.ignore = set(os.path.normpath(d) for d in ignore)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snap = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not _ignored_name(d)
+                           and os.path.join(dirpath, d) not in self.ignore]
+            for f in filenames:
+                if _ignored_name(f):
+                    continue
+                p = os.path.join(dirpath, f)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                snap[p] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    def poll(self, timeout=None):
+        """wait up to timeout seconds (forever if None) for changes, and
+        return the set of changed files (empty if there were none)"""
+        t = time.time()
+        while True:
+            curr = self._scan()
+            prev, self.snapshot = self.snapshot, curr
+            changed = set(p for p, s in curr.items() if prev.get(p) != s)
+            changed.update(p for p in prev if p not in curr)
+            if changed:
+                return changed
+            if timeout is not None:
+                left = timeout - (time.time() - t)
+                if left <= 0:
+                    return changed
+                time.sleep(min(self.interval, left))
+            else:
+                time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+# -----------------------------------------------------------------------------
+class InotifyWatcher:
+    """watches a directory tree with linux' inotify, through ctypes"""
+
+    # from sys/inotify.h
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    _mask = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+             IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+    _evt = struct.Struct('iIII')
+
+    def __init__(self, root, ignore=()):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is available only in linux")
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1() failed")
+        self.root = os.path.normpath(root)
+        self.ignore = set(os.path.normpath(d) for d in ignore)
+        self.dirs = {}  # watch descriptor -> directory
+        self._add_tree(self.root)
+
+    def _add_dir(self, d):
+        import ctypes
+        wd = self._add(self.fd, os.fsencode(d), __class__._mask)
+        if wd < 0:
+            e = ctypes.get_errno()
+            dbg("inotify: could not watch", d, os.strerror(e))
+            return
+        self.dirs[wd] = d
+
+    def _add_tree(self, top):
+        """add watches for a directory and its subdirectories. Returns the
+        files in them, which may have been created before the watch."""
+        found = []
+        if top in self.ignore:
+            return found
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not _ignored_name(d)
+                           and os.path.join(dirpath, d) not in self.ignore]
+            self._add_dir(dirpath)
+            found += [os.path.join(dirpath, f) for f in filenames if not _ignored_name(f)]
+        return found
+
+    def poll(self, timeout=None):
+        """wait up to timeout seconds (forever if None) for changes, and
+        return the set of changed files (empty if there were none), or
+        None when the kernel dropped events and the changes are unknown"""
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r:
+            return set()
+        changed = set()
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        pos, sz = 0, __class__._evt.size
+        while pos + sz <= len(buf):
+            wd, mask, _, namelen = __class__._evt.unpack_from(buf, pos)
+            name = buf[pos + sz:pos + sz + namelen].rstrip(b'\0')
+            pos += sz + namelen
+            if mask & __class__.IN_Q_OVERFLOW:
+                return None
+            d = self.dirs.get(wd)
+            if mask & __class__.IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            if d is None or not name:
+                continue
+            name = os.fsdecode(name)
+            if _ignored_name(name):
+                continue
+            p = os.path.join(d, name)
+            if mask & __class__.IN_ISDIR:
+                if mask & (__class__.IN_CREATE | __class__.IN_MOVED_TO):
+                    changed.update(self._add_tree(p))
+                continue
+            changed.add(p)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+# -----------------------------------------------------------------------------
+def create_watcher(root, ignore=(), polling=False, interval=0.5):
+    """create an inotify watcher, falling back to polling where inotify is
+    not available"""
+    if not polling:
+        try:
+            return InotifyWatcher(root, ignore)
+        except (OSError, AttributeError) as e:
+            dbg("inotify is not available, falling back to polling:", e)
+    return PollingWatcher(root, ignore, interval)
+
+
+def wait_for_changes(watcher, debounce=0.3):
+    """block until there are changes, and then until no more changes happen
+    for the debounce time, so that saving several files (or an editor
+    saving through temporary files) triggers a single rebuild. Returns the
+    changed files, or None if they are unknown."""
+    changed = set()
+    while not changed:
+        changed = watcher.poll(None)
+        if changed is None:
+            break
+    while True:
+        more = watcher.poll(debounce)
+        if not more and more is not None:
+            return changed
+        if more is None or changed is None:
+            changed = None
+        else:
+            changed |= more
+
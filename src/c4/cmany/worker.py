@@ -0,0 +1,319 @@
+import os
+import sys
+import json
+import hmac
+import base64
+import queue
+import hashlib
+import secrets
+import ipaddress
+import socket
+import socketserver
+import subprocess
+import threading
+import timeit
+
+import dill
+
+from . import util
+from . import conf
+from . import err
+from .util import logdbg as dbg
+
+
+# the build steps which can be requested from a worker
+steps = ('configure', 'reconfigure', 'build', 'rebuild',
+         'install', 'reinstall', 'clean', 'export_compile_commands')
+
+# the steps which accept a list of targets
+_steps_with_targets = ('build', 'rebuild')
+
+
+def dumps_build(build):
+    return base64.b64encode(dill.dumps(build)).decode('ascii')
+
+
+def loads_build(txt):
+    return dill.loads(base64.b64decode(txt.encode('ascii')))
+
+
+# -----------------------------------------------------------------------------
+# the requests carry a pickled build, so the worker must run only the
+# requests signed with the secret it shares with its clients
+token_name = "worker.token"
+
+
+def token_file():
+    return os.path.join(conf.USER_DIR, token_name)
+
+
+def load_token():
+    """return the secret shared by the workers and their clients, creating
+    it if needed. It is kept in the user dir, readable only by the user;
+    to use remote workers, copy it to the user dir in their hosts."""
+    fn = token_file()
+    if not os.path.exists(fn):
+        d = os.path.dirname(fn)
+        if not os.path.exists(d):
+            os.makedirs(d)
+        tmp = f"{fn}.{os.getpid()}"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32) + '\n')
+        try:
+            os.link(tmp, fn)  # fails if another process created it meanwhile
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+    if os.name == 'posix' and os.stat(fn).st_mode & 0o077:
+        raise err.Error("the worker token must be accessible only by its owner "
+                        "(chmod 600 {})", fn)
+    with open(fn) as f:
+        return f.read().strip().encode('ascii')
+
+
+def sign(token, nonce, msg):
+    payload = json.dumps([nonce, msg], sort_keys=True).encode('utf-8')
+    return hmac.new(token, payload, hashlib.sha256).hexdigest()
+
+
+def is_loopback(host):
+    if not host:
+        return False  # all the interfaces
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(i[4][0]).is_loopback for i in infos)
+
+
+# -----------------------------------------------------------------------------
+class Worker:
+    """serves build steps requested through a socket. The protocol is
+    line-based, with a JSON object per line, and a request per connection.
+    Each request is of the form
+    {"step": <step>, "build": <serialized build>, "targets": [...]}; the worker
+    replies with any number of {"log": <line>} messages, followed by a
+    final {"status": "ok"|"failed", ...} message.
+
+    Each connection starts with a {"nonce": <nonce>} message from the
+    worker, and each request must carry in "auth" its signature with the
+    nonce and the shared token (see sign()). Requests with a wrong
+    signature are refused before their build is unpickled."""
+
+    def __init__(self, host='127.0.0.1', port=0, build_root=None, install_root=None,
+                 allow_remote=False):
+        if not allow_remote and not is_loopback(host):
+            raise err.Error("refusing to listen on the non-loopback address '{}': "
+                            "anyone reaching it could run code as this user. "
+                            "Use --allow-remote to do it anyway", host)
+        self.token = load_token()
+        self.build_root = util.abspath(build_root) if build_root else None
+        self.install_root = util.abspath(install_root) if install_root else None
+        self.server = socketserver.TCPServer((host, port), _WorkerHandler)
+        self.server.worker = self
+        self.host, self.port = self.server.server_address[:2]
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def serve_forever(self):
+        # WATCHOUT: this line is parsed by WorkerPool.spawn_local()
+        print(f"cmany worker: listening on {self.address}", flush=True)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+
+    def shutdown(self):
+        self.server.shutdown()
+
+    def serve_request(self, req, send):
+        step = req.get('step')
+        if step == 'ping':
+            send({'status': 'ok', 'build_root': self.build_root})
+            return
+        if step not in steps:
+            send({'status': 'failed', 'error': f"unknown step: {step}"})
+            return
+        build = loads_build(req['build'])
+        if self.build_root or self.install_root:
+            build.relocate(self.build_root, self.install_root)
+        dbg("worker: running", step, "for", build)
+        fn = getattr(build, step)
+        args = [req.get('targets') or []] if step in _steps_with_targets else []
+        status, error, returncode = 'ok', None, 0
+        t = timeit.default_timer()
+        with util.output_lines_redirected(lambda line: send({'log': line})):
+            try:
+                fn(*args)
+            except Exception as e:
+                status, error = 'failed', str(e)
+                returncode = getattr(e, 'returncode', None)
+        t = timeit.default_timer() - t
+        send({'status': status, 'error': error, 'duration': t, 'returncode': returncode,
+              'builddir': build.builddir, 'installdir': build.installdir})
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        lock = threading.Lock()
+        def send(msg):
+            with lock:  # the output is pumped from another thread
+                util.send_msg(self.wfile, msg)
+        worker = self.server.worker
+        # one request per connection, each with its own nonce
+        nonce = secrets.token_hex(16)
+        send({'nonce': nonce})
+        req = util.recv_msg(self.rfile)
+        if req is None:
+            return
+        auth = req.pop('auth', None)
+        if not isinstance(auth, str) or not hmac.compare_digest(
+                auth, sign(worker.token, nonce, req)):
+            dbg("worker: refused a request from", self.client_address)
+            send({'status': 'failed', 'error': "authentication failed: "
+                  f"the worker token differs from the client's ({token_file()})"})
+            return
+        worker.serve_request(req, send)
+
+
+# -----------------------------------------------------------------------------
+class WorkerClient:
+    """connects to a worker and requests build steps from it"""
+
+    def __init__(self, address):
+        self.address = address
+        host, port = address.rsplit(':', 1)
+        self.host = host
+        self.port = int(port)
+        self.token = load_token()
+
+    def request(self, msg, on_log=None):
+        try:
+            with socket.create_connection((self.host, self.port)) as s:
+                with s.makefile('rwb') as f:
+                    hello = util.recv_msg(f)
+                    if hello is None or 'nonce' not in hello:
+                        raise err.WorkerError(self.address, "unexpected handshake")
+                    msg = dict(msg, auth=sign(self.token, hello['nonce'], msg))
+                    util.send_msg(f, msg)
+                    while True:
+                        reply = util.recv_msg(f)
+                        if reply is None:
+                            break
+                        if 'log' in reply:
+                            if on_log is not None:
+                                on_log(reply['log'])
+                            continue
+                        return reply
+        except OSError as e:
+            raise err.WorkerError(self.address, e)
+        raise err.WorkerError(self.address, "connection closed before finishing")
+
+    def ping(self):
+        return self.request({'step': 'ping'})
+
+    def run(self, build, step, targets=None, on_log=None):
+        msg = {'step': step, 'build': dumps_build(build), 'targets': targets or []}
+        return self.request(msg, on_log)
+
+
+# -----------------------------------------------------------------------------
+class WorkerPool:
+    """dispatches build steps to a set of workers. Each worker spec is
+    either host:port of a running worker, or local[:N] to spawn N local
+    worker processes (which use the build's own build and install roots)"""
+
+    def __init__(self, specs):
+        self.addresses = []
+        self.procs = []
+        for spec in specs:
+            if spec == 'local' or spec.startswith('local:'):
+                num = int(spec[6:]) if spec.startswith('local:') else 1
+                for _ in range(num):
+                    proc, address = self.spawn_local()
+                    self.procs.append(proc)
+                    self.addresses.append(address)
+            else:
+                self.addresses.append(spec)
+        if not self.addresses:
+            raise err.Error("no workers were given")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for p in self.procs:
+            p.terminate()
+            p.wait()
+        self.procs = []
+
+    @staticmethod
+    def spawn_local(*worker_args):
+        cmd = [sys.executable, '-m', 'c4.cmany.main', 'worker'] + list(worker_args)
+        # share the user dir, and so the token
+        env = dict(os.environ, CMANY_USER_DIR=conf.USER_DIR)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                universal_newlines=True, env=env)
+        for line in proc.stdout:
+            dbg("local worker:", line.rstrip())
+            if line.startswith("cmany worker: listening on "):
+                address = line.strip().split(" ")[-1]
+                break
+        else:
+            proc.wait()
+            raise err.WorkerError(" ".join(cmd), "could not start local worker")
+        # keep draining the output so that the worker never blocks on it
+        def _drain():
+            for line in proc.stdout:
+                dbg("local worker:", line.rstrip())
+        threading.Thread(target=_drain, daemon=True).start()
+        return proc, address
+
+    def run(self, builds, step, targets=None, on_log=None, on_result=None, stop_on_fail=True):
+        """run the step for every build, concurrently on the workers.
+        targets is either the list of targets of every build, or a
+        function returning the targets of each build.
+        on_log(build, line) is called for every line of output, and
+        on_result(build, reply) is called as each build finishes.
+        Returns an ordered list of (build, reply) pairs."""
+        todo = queue.Queue()
+        for b in builds:
+            todo.put(b)
+        results = {}
+        lock = threading.Lock()
+        stop = threading.Event()
+        def _serve(address):
+            client = WorkerClient(address)
+            while not stop.is_set():
+                try:
+                    b = todo.get_nowait()
+                except queue.Empty:
+                    return
+                log = None if on_log is None else (lambda line, b=b: on_log(b, line))
+                try:
+                    ts = targets(b) if callable(targets) else targets
+                    reply = client.run(b, step, ts, log)
+                except err.WorkerError as e:
+                    reply = {'status': 'failed', 'error': str(e), 'duration': 0.}
+                reply['worker'] = address
+                with lock:
+                    results[id(b)] = reply
+                    if on_result is not None:
+                        on_result(b, reply)
+                if reply['status'] != 'ok' and stop_on_fail:
+                    stop.set()
+        threads = [threading.Thread(target=_serve, args=(a,)) for a in self.addresses]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        return [(b, results[id(b)]) for b in builds if id(b) in results]
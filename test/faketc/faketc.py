@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""a fake toolchain (cmake, make, ninja and gcc/g++) to measure and test
+cmany's own overhead without running real builds. The tools do just
+enough for cmany to work: configuring writes a CMakeCache.txt from the
+preload file, building writes a stamp for each target and installing
+copies the stamps to the install prefix.
+
+To use it, put faketc/bin first in the PATH (see env()). These
+environment variables control the behaviour of the tools:
+
+    FAKETC_LATENCY: seconds each invocation sleeps (default: 0). Override
+        it for a tool with FAKETC_<TOOL>_LATENCY, where <TOOL> is one of
+        CMAKE, MAKE, NINJA or CC (for the compilers)
+    FAKETC_OUTPUT: lines of output written by each invocation (default:
+        1). Override it for a tool with FAKETC_<TOOL>_OUTPUT
+    FAKETC_FAIL: comma-separated steps which fail: configure, build,
+        install, compile
+    FAKETC_GENERATOR: the default generator (default: Unix Makefiles)
+
+The compilers can be linked with a version suffix (eg g++-9 -> bin/g++),
+and then report that version.
+    FAKETC_LOG: a file where each invocation appends a json line with
+        the tool, the arguments, the return code and the time spent in
+        the tool
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+from collections import OrderedDict as odict
+
+
+bindir = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'bin')
+srcdir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(bindir))), 'src')
+tools = ('cmake', 'make', 'ninja', 'gcc', 'g++', 'cc', 'c++')
+compilers = ('gcc', 'g++', 'cc', 'c++')
+version = "12.1.0"
+
+# the file written by configure with the targets of the project
+targets_file = "faketc_targets.txt"
+
+
+def env(base=None, **settings):
+    """return a copy of the environment (os.environ by default) with the
+    fake tools first in the PATH, and the given FAKETC_ settings:
+    eg env(latency=0.1, cmake_output=100)"""
+    e = dict(os.environ if base is None else base)
+    e['PATH'] = bindir + os.pathsep + e.get('PATH', '')
+    for k, v in settings.items():
+        e['FAKETC_' + k.upper()] = str(v)
+    return e
+
+
+def read_log(filename):
+    """return the invocations recorded in a FAKETC_LOG file"""
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+
+class FakeTcTestCase:
+    """a mixin for unittest.TestCase, to run cmany with the fake toolchain
+    in a temporary dir, either in a subprocess (cmany()) or in this process
+    (patch_environ()). Use it as eg: class Test(FakeTcTestCase, ut.TestCase).
+    The tools import this module on each invocation, so it imports nothing
+    more for the tests."""
+
+    # the prefix of the temporary dir
+    tmp_prefix = 'cmany.faketc.'
+    # the FAKETC_ settings of the tools, as in env()
+    faketc_settings = {}
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp(prefix=self.tmp_prefix)
+        self.log = os.path.join(self.tmpdir, 'faketc.jsonl')
+        self.userdir = os.path.join(self.tmpdir, 'user')
+        self.env = env(log=self.log, **self.faketc_settings)
+        self.env['CMANY_USER_DIR'] = self.userdir
+        self.env['CMANY_NO_DAEMON'] = '1'
+        self.env['PYTHONPATH'] = os.pathsep.join([srcdir, self.env.get('PYTHONPATH', '')])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def cmany(self, *args, input=None, extra_env=None, **settings):
+        """run cmany in a subprocess with the given FAKETC_ settings and
+        extra environment vars, and return the completed process, with
+        stderr in its stdout"""
+        import subprocess
+        e = env(dict(self.env, **(extra_env or {})), **settings)
+        cmd = [sys.executable, '-m', 'c4.cmany.main'] + list(args)
+        return subprocess.run(cmd, env=e, cwd=self.tmpdir, input=input,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True)
+
+    def patch_environ(self):
+        """use the environment of the test in this process, until the
+        end of the test"""
+        from unittest import mock
+        from c4.cmany import cmake
+        for p in (mock.patch.dict(os.environ, self.env),
+                  mock.patch.object(cmake, 'USER_DIR', self.userdir)):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def calls(self, tool=None, *args):
+        """the logged invocations of a tool (of all if None) having all the
+        given args"""
+        return [c for c in read_log(self.log)
+                if (tool is None or c['tool'] == tool) and all(a in c['args'] for a in args)]
+
+
+# -----------------------------------------------------------------------------
+def _setting(tool, name, default, conv):
+    group = 'CC' if _versioned_re.match(tool).group(1) in compilers else tool.upper()
+    v = os.environ.get(f'FAKETC_{group}_{name}', os.environ.get(f'FAKETC_{name}'))
+    return default if v is None else conv(v)
+
+
+def _fails(step):
+    return step in os.environ.get('FAKETC_FAIL', '').split(',')
+
+
+def _write(path, txt):
+    d = os.path.dirname(path)
+    if d and not os.path.exists(d):
+        os.makedirs(d)
+    with open(path, 'w') as f:
+        f.write(txt)
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _work(tool, step, args):
+    """simulate the work of a tool: sleep and write output"""
+    time.sleep(_setting(tool, 'LATENCY', 0., float))
+    lines = _setting(tool, 'OUTPUT', 1, int)
+    out = sys.stdout
+    for i in range(lines):
+        out.write(f"[{100 * (i + 1) // lines:3d}%] faketc {tool}: {step} ({i + 1}/{lines})\n")
+    out.flush()
+
+
+# -----------------------------------------------------------------------------
+_set_re = re.compile(r'^\s*_cmany_set\((\S+) "(.*)" (\w+)\)\s*$')
+_project_re = re.compile(r'project\s*\(\s*(\w+)', re.I)
+_target_re = re.compile(r'add_(?:executable|library)\s*\(\s*([\w.+-]+)', re.I)
+_source_exts = ('.c', '.cc', '.cpp', '.cxx')
+_versioned_re = re.compile(r'^(.*?)(?:-(\d+(?:\.\d+)*))?$')
+
+
+def sysinfo(args):
+    gen = args[args.index('-G') + 1] if '-G' in args else \
+        os.environ.get('FAKETC_GENERATOR', 'Unix Makefiles')
+    lines = [
+        ('CMAKE_GENERATOR', gen),
+        ('CMAKE_SYSTEM_NAME', 'Linux'),
+        ('CMAKE_SYSTEM_PROCESSOR', 'x86_64'),
+        ('CMAKE_C_COMPILER', os.path.join(bindir, 'gcc')),
+        ('CMAKE_CXX_COMPILER', os.path.join(bindir, 'g++')),
+        ('CMAKE_C_FLAGS_INIT', ''),
+        ('CMAKE_CXX_FLAGS_INIT', ''),
+    ]
+    print("\n".join(f'{k} "{v}"' for k, v in lines))
+
+
+def project_sources(projdir):
+    """the sources of a project, skipping build dirs"""
+    for root, dirs, files in os.walk(projdir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.')
+                         and not os.path.exists(os.path.join(root, d, 'CMakeCache.txt')))
+        for f in sorted(files):
+            if os.path.splitext(f)[1] in _source_exts:
+                yield os.path.join(root, f)
+
+
+def configure(args):
+    """cmake [-C preload] [-G gen] [-Dvar=val...] projdir"""
+    gen = os.environ.get('FAKETC_GENERATOR', 'Unix Makefiles')
+    preload, defs, projdir = None, [], None
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a in ('-C', '-G', '-T', '-A'):
+            if a == '-C':
+                preload = args[i + 1]
+            elif a == '-G':
+                gen = args[i + 1]
+            i += 2
+            continue
+        if a.startswith('-D'):
+            k, _, v = a[2:].partition('=')
+            k, _, t = k.partition(':')
+            defs.append((k, t or 'STRING', v))
+        elif not a.startswith('-'):
+            projdir = os.path.abspath(a)
+        i += 1
+    builddir = os.getcwd()
+    cachefile = os.path.join(builddir, 'CMakeCache.txt')
+    if projdir is None or not os.path.exists(os.path.join(projdir, 'CMakeLists.txt')):
+        if not os.path.exists(cachefile):
+            print(f"CMake Error: no CMakeLists.txt in {projdir}", file=sys.stderr)
+            return 1
+    if _fails('configure'):
+        print("CMake Error: faketc: configure failed", file=sys.stderr)
+        return 1
+    cache = load_cache(cachefile)
+    if projdir is None:
+        projdir = cache['CMAKE_HOME_DIRECTORY'][1]
+    if preload is not None:
+        for l in _read(preload).split('\n'):
+            m = _set_re.match(l)
+            if m:
+                cache[m.group(1)] = (m.group(3), m.group(2))
+    for k, t, v in defs:
+        cache[k] = (t, v)
+    cache.setdefault('CMAKE_GENERATOR', ('INTERNAL', gen))
+    cache['CMAKE_HOME_DIRECTORY'] = ('INTERNAL', projdir)
+    cache['CMAKE_CACHEFILE_DIR'] = ('INTERNAL', builddir)
+    cache.setdefault('CMAKE_INSTALL_PREFIX', ('PATH', '/usr/local'))
+    cache.setdefault('CMAKE_CXX_COMPILER', ('FILEPATH', os.path.join(bindir, 'g++')))
+    cache.setdefault('CMAKE_C_COMPILER', ('FILEPATH', os.path.join(bindir, 'gcc')))
+    _write(cachefile, "".join(f"{k}:{t}={v}\n" for k, (t, v) in cache.items()))
+    # the targets and the compile commands
+    cml = _read(os.path.join(projdir, 'CMakeLists.txt'))
+    m = _project_re.search(cml)
+    proj = m.group(1) if m else 'project'
+    targets = _target_re.findall(cml) or [proj]
+    _write(os.path.join(builddir, targets_file), "\n".join(targets) + "\n")
+    gen = cache['CMAKE_GENERATOR'][1]
+    _write(os.path.join(builddir, 'build.ninja' if gen.endswith('Ninja') else 'Makefile'),
+           "# faketc\n")
+    if cache.get('CMAKE_EXPORT_COMPILE_COMMANDS', ('', ''))[1] == 'ON':
+        cxx = cache['CMAKE_CXX_COMPILER'][1]
+        flags = cache.get('CMAKE_CXX_FLAGS', ('', ''))[1]
+        entries = []
+        for src in project_sources(projdir):
+            rel = os.path.relpath(src, projdir)
+            out = f"CMakeFiles/{targets[0]}.dir/{rel}.o"
+            entries.append({
+                "directory": builddir,
+                "command": f"{cxx} {flags} -o {out} -c {src}".replace('  ', ' '),
+                "file": src,
+                "output": out,
+            })
+        _write(os.path.join(builddir, 'compile_commands.json'), json.dumps(entries, indent=2))
+    _work('cmake', 'configure', args)
+    print("-- Build files have been written to:", builddir)
+    return 0
+
+
+def load_cache(cachefile):
+    cache = odict()
+    if os.path.exists(cachefile):
+        for l in _read(cachefile).split('\n'):
+            if not l or l.startswith('#') or l.startswith('//'):
+                continue
+            k, _, v = l.partition('=')
+            k, _, t = k.partition(':')
+            cache[k] = (t, v)
+    return cache
+
+
+def project_targets():
+    fn = targets_file
+    if not os.path.exists(fn):
+        return None
+    return [t for t in _read(fn).split('\n') if t]
+
+
+def build(tool, targets):
+    all_targets = project_targets()
+    if all_targets is None:
+        print(f"{tool}: *** No rule to make target. Stop. (not configured)", file=sys.stderr)
+        return 2
+    if _fails('build'):
+        print(f"{tool}: *** faketc: build failed", file=sys.stderr)
+        return 2
+    if not targets or targets == ['all'] or targets == ['ALL_BUILD']:
+        targets = all_targets
+    for t in targets:
+        if t == 'clean':
+            for s in all_targets:
+                if os.path.exists(s + '.faketc'):
+                    os.remove(s + '.faketc')
+            continue
+        if t not in all_targets:
+            print(f"{tool}: *** No rule to make target '{t}'. Stop.", file=sys.stderr)
+            return 2
+        _write(t + '.faketc', f"{t}\n")
+    _work(tool, 'build', targets)
+    for t in targets:
+        print(f"[100%] Built target {t}")
+    return 0
+
+
+def install(tool):
+    if project_targets() is None:
+        print("Error: could not load cache", file=sys.stderr)
+        return 1
+    if _fails('install'):
+        print("CMake Error: faketc: install failed", file=sys.stderr)
+        return 1
+    ret = build(tool, [])
+    if ret != 0:
+        return ret
+    prefix = load_cache('CMakeCache.txt')['CMAKE_INSTALL_PREFIX'][1]
+    bin_ = os.path.join(prefix, 'bin')
+    if not os.path.exists(bin_):
+        os.makedirs(bin_)
+    manifest = []
+    for t in project_targets():
+        dst = os.path.join(bin_, t)
+        shutil.copyfile(t + '.faketc', dst)
+        print("-- Installing:", dst)
+        manifest.append(dst)
+    _write('install_manifest.txt', "\n".join(manifest))
+    _work(tool, 'install', [])
+    return 0
+
+
+def _split_targets(args):
+    """the targets from a make/ninja command line, skipping the options"""
+    targets = []
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a in ('-j', '-C', '-f', '-l', '-k', '-t'):
+            i += 2
+            continue
+        if not a.startswith('-'):
+            targets.append(a)
+        i += 1
+    return targets
+
+
+# -----------------------------------------------------------------------------
+def cmake(args):
+    if '--system-information' in args:
+        sysinfo(args)
+        return 0
+    if '--version' in args:
+        print(f"cmake version {version}\n\nfaketc")
+        return 0
+    if '--build' in args:
+        d = args[args.index('--build') + 1]
+        os.chdir(d)
+        targets = []
+        i = 0
+        while i < len(args):
+            if args[i] == '--':
+                break
+            if args[i] in ('--target', '-t'):
+                i += 1
+                while i < len(args) and not args[i].startswith('-'):
+                    targets.append(args[i])
+                    i += 1
+                continue
+            i += 1
+        if targets == ['install']:
+            return install('cmake')
+        return build('cmake', targets)
+    return configure(args)
+
+
+def make(tool, args):
+    if '-C' in args:
+        os.chdir(args[args.index('-C') + 1])
+    if tool == 'ninja' and '-t' in args:
+        sub = args[args.index('-t') + 1]
+        if sub == 'compdb':
+            fn = 'compile_commands.json'
+            print(_read(fn) if os.path.exists(fn) else "[]")
+        return 0  # other subtools have empty output
+    if tool == 'make' and args[:1] == ['help']:
+        ts = project_targets() or []
+        print("The following are some of the valid targets for this Makefile:")
+        print("... all (the default if no target is provided)")
+        print("... clean")
+        for t in ts:
+            print("...", t)
+        return 0
+    targets = _split_targets(args)
+    if targets == ['install']:
+        return install(tool)
+    return build(tool, targets)
+
+
+def compiler_version(tool):
+    """the version of a compiler: named with a version suffix (eg g++-9),
+    the compiler reports that version"""
+    v = _versioned_re.match(tool).group(2)
+    if v is None:
+        return version
+    return v if '.' in v else v + '.1.0'
+
+
+def compiler(tool, args):
+    v = compiler_version(tool)
+    if '--version' in args or '-dumpversion' in args or '-dM' in args:
+        # probing a real compiler also takes a while
+        time.sleep(_setting(tool, 'LATENCY', 0., float))
+    if '--version' in args:
+        print(f"{tool} (faketc) {v}")
+        return 0
+    if '-dumpversion' in args:
+        print(v)
+        return 0
+    if '-dM' in args and '-E' in args:
+        print(f"#define __GNUC__ {v.split('.')[0]}")
+        return 0
+    if _fails('compile'):
+        print(f"{tool}: error: faketc: compile failed", file=sys.stderr)
+        return 1
+    if '-o' in args:
+        _write(args[args.index('-o') + 1], "")
+    _work(tool, 'compile', args)
+    return 0
+
+
+def main(tool, args):
+    t = time.perf_counter()
+    if tool == 'cmake':
+        ret = cmake(args)
+    elif tool in ('make', 'ninja'):
+        ret = make(tool, args)
+    elif _versioned_re.match(tool).group(1) in compilers:
+        ret = compiler(tool, args)
+    else:
+        print("faketc: unknown tool:", tool, file=sys.stderr)
+        ret = 1
+    log = os.environ.get('FAKETC_LOG')
+    if log:
+        entry = json.dumps({
+            'tool': tool,
+            'args': args,
+            'cwd': os.getcwd(),
+            'returncode': ret,
+            'duration': time.perf_counter() - t,
+        })
+        # a single write in append mode, so that concurrent tools do not
+        # mix their lines
+        fd = os.open(log, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, (entry + "\n").encode())
+        finally:
+            os.close(fd)
+    return ret
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1], sys.argv[2:]))
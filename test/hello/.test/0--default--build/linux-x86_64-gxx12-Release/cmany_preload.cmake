@@ -0,0 +1,30 @@
+# Do not edit. Will be overwritten.
+# Generated by cmany
+
+if(NOT _cmany_set_def)
+    set(_cmany_set_def ON)
+    function(_cmany_set var value type)
+        set(${var} "${value}" CACHE ${type} "")
+        message(STATUS "cmany: ${var}=${value}")
+    endfunction(_cmany_set)
+endif(NOT _cmany_set_def)
+
+message(STATUS "cmany:preload----------------------")
+_cmany_set(CMAKE_BUILD_TYPE "Release" STRING)
+_cmany_set(CMAKE_CXX_COMPILER "/usr/bin/c++" FILEPATH)
+_cmany_set(CMAKE_CXX_FLAGS "   -m64" STRING)
+_cmany_set(CMAKE_C_COMPILER "/usr/bin/cc" FILEPATH)
+_cmany_set(CMAKE_C_FLAGS "   -m64" STRING)
+_cmany_set(CMAKE_INSTALL_PREFIX "/root/package/test/hello/.test/0--default--install/linux-x86_64-gxx12-Release" PATH)
+message(STATUS "cmany:preload----------------------")
+
+# if(CMANY_INCLUDE_DIRECTORIES)
+#     include_directories(${CMANY_INCLUDE_DIRECTORIES})
+# endif()
+#
+# if(CMANY_LINK_DIRECTORIES)
+#     link_directories(${CMANY_LINK_DIRECTORIES})
+# endif()
+
+# Do not edit. Will be overwritten.
+# Generated by cmany
@@ -0,0 +1,11 @@
+file(REMOVE_RECURSE
+  "CMakeFiles/test_hello.dir/main.cpp.o"
+  "CMakeFiles/test_hello.dir/main.cpp.o.d"
+  "test_hello"
+  "test_hello.pdb"
+)
+
+# Per-language clean rules from dependency scanning.
+foreach(lang CXX)
+  include(CMakeFiles/test_hello.dir/cmake_clean_${lang}.cmake OPTIONAL)
+endforeach()
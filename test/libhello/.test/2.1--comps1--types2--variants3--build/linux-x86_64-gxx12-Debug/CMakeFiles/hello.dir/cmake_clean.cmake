@@ -0,0 +1,11 @@
+file(REMOVE_RECURSE
+  "CMakeFiles/hello.dir/hello.cpp.o"
+  "CMakeFiles/hello.dir/hello.cpp.o.d"
+  "libhello.pdb"
+  "libhello.so"
+)
+
+# Per-language clean rules from dependency scanning.
+foreach(lang CXX)
+  include(CMakeFiles/hello.dir/cmake_clean_${lang}.cmake OPTIONAL)
+endforeach()
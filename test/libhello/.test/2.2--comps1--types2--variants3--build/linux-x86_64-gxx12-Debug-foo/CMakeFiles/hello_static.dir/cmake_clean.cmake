@@ -0,0 +1,11 @@
+file(REMOVE_RECURSE
+  "CMakeFiles/hello_static.dir/hello.cpp.o"
+  "CMakeFiles/hello_static.dir/hello.cpp.o.d"
+  "libhello.a"
+  "libhello.pdb"
+)
+
+# Per-language clean rules from dependency scanning.
+foreach(lang CXX)
+  include(CMakeFiles/hello_static.dir/cmake_clean_${lang}.cmake OPTIONAL)
+endforeach()
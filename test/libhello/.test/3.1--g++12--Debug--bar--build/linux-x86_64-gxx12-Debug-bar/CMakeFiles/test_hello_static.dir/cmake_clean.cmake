@@ -0,0 +1,11 @@
+file(REMOVE_RECURSE
+  "CMakeFiles/test_hello_static.dir/main.cpp.o"
+  "CMakeFiles/test_hello_static.dir/main.cpp.o.d"
+  "test_hello_static"
+  "test_hello_static.pdb"
+)
+
+# Per-language clean rules from dependency scanning.
+foreach(lang CXX)
+  include(CMakeFiles/test_hello_static.dir/cmake_clean_${lang}.cmake OPTIONAL)
+endforeach()
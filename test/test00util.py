@@ -327,6 +327,42 @@ class Test10runsyscmd(ut.TestCase):
         invoke_and_compare(self, ['"arg1 and more"', '"arg2 and more"'])
 
 
+# -----------------------------------------------------------------------------
+class Test11MergedView(ut.TestCase):
+
+    def layers(self):
+        a = odict([('x', 1), ('n', odict([('p', 1), ('q', odict([('r', 1)]))])), ('l', [1])])
+        b = odict([('y', 2), ('n', odict([('q', odict([('s', 2)])), ('t', 2)])), ('x', 3)])
+        return a, b
+
+    def test00same_as_merging(self):
+        a, b = self.layers()
+        for x, y in ((a, b), (b, a)):
+            ref = util.nested_merge(x, y)
+            v = util.MergedView(x, y)
+            self.assertEqual(list(v.keys()), list(ref.keys()))
+            self.assertEqual(v, ref)
+            self.assertEqual(v.materialize(odict), ref)
+        # a value which is not a mapping hides the ones below
+        v = util.MergedView(a, b, odict([('n', 5)]))
+        self.assertEqual(v['n'], 5)
+
+    def test01copy_on_write(self):
+        a, b = self.layers()
+        ca, cb = copy.deepcopy(a), copy.deepcopy(b)
+        v = util.MergedView(a, b)
+        v['n']['q']['r'] = 10
+        v['z'] = 11
+        del v['x']
+        self.assertEqual(v['n']['q'], {'r': 10, 's': 2})
+        self.assertEqual(v['z'], 11)
+        self.assertNotIn('x', v)
+        self.assertEqual((a, b), (ca, cb))
+        # views can be layers
+        w = util.MergedView(v, odict([('n', odict([('t', 3)]))]))
+        self.assertEqual(w['n'], {'p': 1, 'q': {'r': 10, 's': 2}, 't': 3})
+
+
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
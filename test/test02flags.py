@@ -151,6 +151,38 @@ class Test04FlagsIO(ut.TestCase):
                 os.remove(fn_out)
 
 
+# -----------------------------------------------------------------------------
+class Test05Aliases(ut.TestCase):
+
+    yml = """c++14:
+    gcc,clang: -std=c++14
+    vs: /std:c++14
+nortti:
+    gcc,clang: -fno-rtti
+    vs: /GR-
+"""
+
+    def test00as_flags(self):
+        comps, cflags = flags.load_txt(self.yml)
+        fa = flags.FlagAliases(**cflags)
+        spec = ['c++14', '-Wall', 'nortti']
+        self.assertEqual(fa.as_flags(spec, 'gcc'), ['-std=c++14', '-Wall', '-fno-rtti'])
+        self.assertEqual(fa.as_flags(spec, 'vs'), ['/std:c++14', '-Wall', '/GR-'])
+        # an unknown compiler falls back to gcc
+        self.assertEqual(fa.as_flags(spec, 'icc'), ['-std=c++14', '-Wall', '-fno-rtti'])
+        self.assertEqual(sorted(fa._tables.keys()), ['gcc', 'icc', 'vs'])
+        # the resolved lists are memoized, but not shared
+        out = fa.as_flags(spec, 'gcc')
+        out.append('-O3')
+        self.assertEqual(fa.as_flags(spec, 'gcc'), ['-std=c++14', '-Wall', '-fno-rtti'])
+        # merging invalidates the tables
+        comps2, cflags2 = flags.load_txt("""-Wall:
+    gcc: -Wall -Wextra
+""")
+        fa.merge_from(flags.FlagAliases(**cflags2))
+        self.assertEqual(fa.as_flags(spec, 'gcc'), ['-std=c++14', '-Wall -Wextra', '-fno-rtti'])
+
+
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
@@ -104,6 +104,27 @@ class Test00VariantSpec(ut.TestCase):
             self.c('var4', out[4], cmake_vars=[], defines=['VAR1', 'VAR_TYPE=1', 'VAR2', 'VAR_TYPE=2', 'VAR3', 'VAR_TYPE=3'], cflags=[], cxxflags=['-fPIC', '-Wall', '-g3'])
 
 
+    def test03_shared_parser(self):
+        from unittest import mock
+        specs = ["'var{}: -X \"-fPIC\" -D VAR_TYPE={} -xs linux'".format(i, i % 2)
+                 for i in range(20)]
+        build_item._flags_parser = None
+        build_item._parsed_specs.clear()
+        with mock.patch.object(c4args, 'add_bundle_flags', wraps=c4args.add_bundle_flags) as add:
+            out = variant.Variant.create_variants(specs)
+        # the parser is created once, and each distinct spec parsed once
+        self.assertEqual(add.call_count, 1)
+        self.assertEqual(len(build_item._parsed_specs), 2)
+        self.assertEqual(len(out), 20)
+        for i, v in enumerate(out):
+            self.c('var{}'.format(i), v, defines=['VAR_TYPE={}'.format(i % 2)], cxxflags=['-fPIC'])
+            self.assertEqual([(r.x_or_i, r.what, r.patterns) for r in v.combination_rules.rules],
+                             [('x', 'systems', ['linux'])])
+        # the items do not share the parsed lists
+        out[0].flags.cxxflags.append('-g')
+        self.assertEqual(out[2].flags.cxxflags, ['-fPIC'])
+
+
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
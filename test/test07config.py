@@ -117,6 +117,36 @@ class Test01ConfigsFile(ut.TestCase):
         self.assertEqual(c.get_val("foo.bar.baz"), 10)
         self.assertEqual(c.get_val("foo.bar.askdjaksjd"), 11)
 
+    def test04Cached(self):
+        import os
+        import shutil
+        from unittest import mock
+        tmpdir = tempfile.mkdtemp(prefix='cmany.configs.')
+        try:
+            proj = osp.join(tmpdir, "cmany.yml")
+            with open(proj, "w") as f:
+                f.write("config:\n  foo: 1\n")
+            seq = (osp.join(conf.CONF_DIR, "cmany.yml"), proj)
+            with mock.patch.object(conf, 'USER_DIR', osp.join(tmpdir, 'user')):
+                c = Configs.load_seq(seq)
+                self.assertEqual(c.get_val('config.foo'), 1)
+                self.assertEqual(len(os.listdir(osp.join(tmpdir, 'user', Configs.cache_dir))), 1)
+                # unchanged files are not parsed again
+                with mock.patch.object(Configs, '_load_seq') as load:
+                    c2 = Configs.load_seq(seq)
+                    load.assert_not_called()
+                self.assertIsNot(c2, c)
+                self.assertEqual(c2.get_val('config.foo'), 1)
+                self.assertIn('c++11', c2.flag_aliases.flags)
+                # changing a file invalidates the cache, replacing the entry
+                for val in (22, 333, 4444):  # the sizes differ, even if the mtimes don't
+                    with open(proj, "w") as f:
+                        f.write("config:\n  foo: {}\n".format(val))
+                    self.assertEqual(Configs.load_seq(seq).get_val('config.foo'), val)
+                self.assertEqual(len(os.listdir(osp.join(tmpdir, 'user', Configs.cache_dir))), 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
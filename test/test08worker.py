@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import glob
+import shutil
+import socket
+
+import c4.cmany as cmany
+from c4.cmany import util
+from c4.cmany import worker
+from c4.cmany.worker import WorkerPool, WorkerClient
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+projdir = os.path.join(mydir, 'hello')
+testdir = os.path.join(projdir, '.test', 'worker')
+
+
+def make_proj(**kwargs):
+    return cmany.Project.from_spec(projdir,
+                                   build_dir=os.path.join(testdir, 'build'),
+                                   install_dir=os.path.join(testdir, 'install'),
+                                   **kwargs)
+
+
+# -----------------------------------------------------------------------------
+class Test00Worker(ut.TestCase):
+
+    def setUp(self):
+        if os.path.exists(testdir):
+            shutil.rmtree(testdir)
+        self.roots = [os.path.join(testdir, 'worker' + str(i)) for i in range(2)]
+        self.procs = []
+        self.addresses = []
+        for r in self.roots:
+            proc, address = WorkerPool.spawn_local('--build-dir', os.path.join(r, 'build'),
+                                                   '--install-dir', os.path.join(r, 'install'))
+            self.procs.append(proc)
+            self.addresses.append(address)
+
+    def tearDown(self):
+        for p in self.procs:
+            p.terminate()
+            p.wait()
+        shutil.rmtree(testdir, ignore_errors=True)
+
+    def test00ping(self):
+        for r, a in zip(self.roots, self.addresses):
+            reply = WorkerClient(a).ping()
+            self.assertEqual(reply['status'], 'ok')
+            self.assertEqual(reply['build_root'], util.abspath(os.path.join(r, 'build')))
+
+    def test01build_on_workers(self):
+        proj = make_proj(build_types='Debug,Release', workers=self.addresses)
+        proj.build()
+        built = []
+        for r in self.roots:
+            built += [os.path.basename(os.path.dirname(f)) for f in
+                      glob.glob(os.path.join(r, 'build', '*', 'cmany_build.done'))]
+        self.assertEqual(sorted(built), sorted([b.tag for b in proj.builds]))
+        # nothing was built in the project's own build root
+        self.assertFalse(os.path.exists(os.path.join(testdir, 'build')))
+
+    def test02failures_are_reported(self):
+        proj = make_proj(cmake_vars=['CMAKE_MAKE_PROGRAM=/does/not/exist'],
+                         workers=self.addresses[:1])
+        with self.assertRaises(cmany.err.RemoteStepFailed):
+            proj.build()
+
+    def test03unsigned_requests_are_refused(self):
+        host, port = self.addresses[0].rsplit(':', 1)
+        for auth in (None, 'x' * 64, worker.sign(b'not the token', 'nonce', {'step': 'ping'})):
+            with socket.create_connection((host, int(port))) as s, s.makefile('rwb') as f:
+                self.assertIn('nonce', util.recv_msg(f))
+                msg = {'step': 'build', 'build': 'not a pickle'}
+                if auth is not None:
+                    msg['auth'] = auth
+                util.send_msg(f, msg)
+                reply = util.recv_msg(f)
+                self.assertEqual(reply['status'], 'failed')
+                self.assertIn('authentication failed', reply['error'])
+                self.assertIsNone(util.recv_msg(f))  # the connection was closed
+
+    def test04loopback_only(self):
+        self.assertTrue(worker.is_loopback('127.0.0.1'))
+        self.assertTrue(worker.is_loopback('localhost'))
+        self.assertFalse(worker.is_loopback('0.0.0.0'))
+        self.assertFalse(worker.is_loopback(''))
+        with self.assertRaises(cmany.err.Error):
+            worker.Worker(host='0.0.0.0')
+        w = worker.Worker(host='0.0.0.0', allow_remote=True)
+        w.server.server_close()
+        mode = os.stat(worker.token_file()).st_mode
+        self.assertEqual(mode & 0o077, 0)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+import time
+import tempfile
+
+import subprocess
+
+from c4.cmany import util, main
+from c4.cmany import daemon as c4daemon
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+projdir = os.path.join(mydir, 'hello')
+
+
+def run_cmany(*args):
+    with util.setcwd(projdir):
+        out = util.runsyscmd([sys.executable, '-m', 'c4.cmany.main'] + list(args),
+                             echo_cmd=False, echo_output=False, capture_output=True)
+    return out
+
+
+# -----------------------------------------------------------------------------
+@ut.skipIf(util.in_windows(), "the daemon requires unix sockets")
+class Test00Daemon(ut.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.daemon.')
+        self.path = os.path.join(self.tmpdir, 'daemon.sock')
+        self.prev_env = dict(os.environ)
+        os.environ['CMANY_DAEMON_SOCKET'] = self.path
+        os.environ.pop('CMANY_NO_DAEMON', None)
+        c4daemon.start(self.path)
+
+    def tearDown(self):
+        c4daemon.stop(self.path)
+        os.environ.clear()
+        os.environ.update(self.prev_env)
+
+    def test00forwarded_output_is_the_same(self):
+        self.assertTrue(c4daemon.is_running(self.path))
+        args = ['show_build_names', '-t', 'Debug,Release', '-v', "'foo: -D FOO'"]
+        os.environ['CMANY_NO_DAEMON'] = '1'
+        expected = run_cmany(*args)
+        del os.environ['CMANY_NO_DAEMON']
+        # run twice, the second time with the cached project
+        for i in range(2):
+            with self.subTest(run=i):
+                self.assertEqual(run_cmany(*args), expected)
+
+    def test01cwd_and_env_are_forwarded(self):
+        os.environ['CMANY_ARGS'] = '-t Debug'
+        out = run_cmany('show_build_names')
+        self.assertTrue(out.strip().endswith('-Debug'), out)
+        os.environ['CMANY_ARGS'] = ''
+        out = run_cmany('show_build_names')
+        self.assertTrue(out.strip().endswith('-Release'), out)
+
+    def test02stop(self):
+        self.assertTrue(c4daemon.stop(self.path))
+        for _ in range(100):
+            if not c4daemon.is_running(self.path):
+                break
+            time.sleep(0.05)
+        self.assertFalse(c4daemon.is_running(self.path))
+
+    def test03batch_reads_the_callers_stdin(self):
+        cmd = [sys.executable, '-m', 'c4.cmany.main', 'batch', '-']
+        r = subprocess.run(cmd, cwd=projdir, input="show_build_names -t Debug\n",
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                           universal_newlines=True)
+        self.assertEqual(r.returncode, 0, r.stdout)
+        self.assertTrue(r.stdout.strip().endswith('-Debug'), r.stdout)
+
+
+# -----------------------------------------------------------------------------
+class Test01LocalCommands(ut.TestCase):
+
+    def test00only_the_subcommand_counts(self):
+        def l(*argv): return c4daemon.is_local(main.cmds, list(argv))
+        self.assertTrue(l('watch', '.'))
+        self.assertTrue(l('batch', '-'))
+        self.assertTrue(l('--show-args', 'worker'))
+        self.assertFalse(l('build', '.', 'watch'))
+        self.assertFalse(l('b', '.', 'w'))
+        self.assertFalse(l('show_build_names', '-v', 'batch'))
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import sys
+import json
+import subprocess
+
+# modules which are slow to import, and which should be imported only by
+# the commands which use them
+heavy = ('pkg_resources', 'ruamel.yaml', 'dill', 'argcomplete', 'dateutil',
+         'multiprocessing', 'c4.cmany.project', 'c4.cmany.build')
+# modules which are needed only to build the parser
+parser_only = ('c4.cmany.compiler', 'c4.cmany.vsinfo', 'c4.cmany.cmake',
+               'c4.cmany.system', 'c4.cmany.build_item')
+
+
+def loaded_after(code):
+    code += "\nimport sys, json\nprint(json.dumps(sorted(sys.modules.keys())))"
+    out = subprocess.run([sys.executable, '-c', code], check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return set(json.loads(out.strip().splitlines()[-1]))
+
+
+# -----------------------------------------------------------------------------
+class Test00ImportTime(ut.TestCase):
+
+    def _check(self, code, modules=heavy):
+        loaded = loaded_after(code)
+        for m in modules:
+            with self.subTest(module=m):
+                self.assertNotIn(m, loaded)
+
+    def test00import_main(self):
+        self._check("import c4.cmany.main", heavy + parser_only)
+
+    def test01parse_help(self):
+        # the parser defaults need the cmake system info, which uses dateutil
+        self._check("from c4.cmany import main\n"
+                    "main.get_parser().format_help()",
+                    [m for m in heavy if m != 'dateutil'])
+
+    def test02lazy_exports(self):
+        loaded = loaded_after("import c4.cmany as cmany\nassert cmany.Compiler is not None")
+        self.assertIn('c4.cmany.compiler', loaded)
+        self.assertNotIn('c4.cmany.project', loaded)
+        loaded = loaded_after("import c4.cmany as cmany\nassert cmany.Project is not None")
+        self.assertIn('c4.cmany.project', loaded)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
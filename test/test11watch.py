@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+import c4.cmany as cmany
+from c4.cmany import util, compdb
+from c4.cmany import watch as c4watch, affected
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+
+
+def touch_later(path, delay=0.2):
+    def _touch():
+        time.sleep(delay)
+        with open(path, 'a') as f:
+            f.write("\n")
+    th = threading.Thread(target=_touch)
+    th.start()
+    return th
+
+
+# -----------------------------------------------------------------------------
+class Test00CompileDB(ut.TestCase):
+
+    def test00target_from_command(self):
+        e = {"directory": "/b", "file": "/p/src/foo.cpp",
+             "command": "/usr/bin/c++ -I/p -o src/CMakeFiles/foo_lib.dir/foo.cpp.o -c /p/src/foo.cpp"}
+        self.assertEqual(compdb.entry_target(e), "foo_lib")
+        e = {"directory": "/b", "file": "foo.cpp",
+             "arguments": ["cl.exe", "/nologo", "/FoCMakeFiles\\bar.dir\\foo.cpp.obj", "foo.cpp"]}
+        self.assertEqual(compdb.entry_target(e), "bar")
+        self.assertEqual(compdb.entry_file(e), os.path.normpath("/b/foo.cpp"))
+
+    def test01target_from_output(self):
+        e = {"directory": "/b", "file": "/p/foo.cpp", "command": "c++ -c /p/foo.cpp",
+             "output": "CMakeFiles/foo.dir/foo.cpp.o"}
+        self.assertEqual(compdb.entry_target(e), "foo")
+        e = {"directory": "/b", "file": "/p/foo.cpp", "command": "c++ -c /p/foo.cpp"}
+        self.assertEqual(compdb.entry_target(e), None)
+
+    def test02targets_for(self):
+        db = compdb.CompileDB([
+            {"directory": "/b", "file": "/p/a.cpp", "command": "c++ -o CMakeFiles/a.dir/a.cpp.o -c /p/a.cpp"},
+            {"directory": "/b", "file": "/p/a.cpp", "command": "c++ -o CMakeFiles/a_static.dir/a.cpp.o -c /p/a.cpp"},
+            {"directory": "/b", "file": "/p/b.cpp", "command": "c++ -o CMakeFiles/b.dir/b.cpp.o -c /p/b.cpp"},
+        ])
+        self.assertIn("/p/a.cpp", db)
+        self.assertNotIn("/p/c.cpp", db)
+        self.assertEqual(db.targets_for(["/p/a.cpp"]), ["a", "a_static"])
+        self.assertEqual(db.targets_for(["/p/b.cpp", "/p/c.cpp"]), ["b"])
+
+
+# -----------------------------------------------------------------------------
+class _WatcherCase:
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='cmany.watch.')
+        self.ignored = os.path.join(self.root, 'build')
+        os.makedirs(os.path.join(self.root, 'src'))
+        os.makedirs(self.ignored)
+        self.w = self.create()
+
+    def tearDown(self):
+        self.w.close()
+        shutil.rmtree(self.root)
+
+    def test00changes_are_seen(self):
+        f = os.path.join(self.root, 'src', 'foo.cpp')
+        th = touch_later(f)
+        changed = c4watch.wait_for_changes(self.w, debounce=0.3)
+        th.join()
+        self.assertEqual(changed, {f})
+
+    def test01ignored_dirs(self):
+        th = touch_later(os.path.join(self.ignored, 'foo.o'))
+        th.join()
+        time.sleep(0.2)
+        self.assertEqual(self.w.poll(0.3), set())
+
+    def test02debounce(self):
+        files = [os.path.join(self.root, 'src', f'f{i}.cpp') for i in range(3)]
+        ths = [touch_later(f, 0.1 * (i + 1)) for i, f in enumerate(files)]
+        changed = c4watch.wait_for_changes(self.w, debounce=0.5)
+        for th in ths:
+            th.join()
+        self.assertEqual(changed, set(files))
+
+    def test03new_dirs(self):
+        d = os.path.join(self.root, 'src', 'sub')
+        os.makedirs(d)
+        self.assertEqual(self.w.poll(0.2), set())  # the new dir is now watched
+        f = os.path.join(d, 'bar.cpp')
+        th = touch_later(f)
+        changed = c4watch.wait_for_changes(self.w, debounce=0.3)
+        th.join()
+        self.assertIn(f, changed)
+
+
+class Test01PollingWatcher(_WatcherCase, ut.TestCase):
+    def create(self):
+        return c4watch.PollingWatcher(self.root, [self.ignored], interval=0.05)
+
+
+@ut.skipIf(not util.in_unix() or util.in_windows(), "inotify requires linux")
+class Test02InotifyWatcher(_WatcherCase, ut.TestCase):
+    def create(self):
+        try:
+            return c4watch.InotifyWatcher(self.root, [self.ignored])
+        except OSError as e:
+            self.skipTest(f"inotify is not available: {e}")
+
+
+# -----------------------------------------------------------------------------
+class Test03AffectedBuilds(ut.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp(prefix='cmany.watch.')
+        cls.projdir = os.path.join(cls.tmpdir, 'libhello')
+        shutil.copytree(os.path.join(mydir, 'libhello'), cls.projdir)
+        cls.proj = cmany.Project.from_spec(cls.projdir, build_types='Release',
+                                           build_dir=os.path.join(cls.tmpdir, 'build'),
+                                           install_dir=os.path.join(cls.tmpdir, 'install'))
+        cls.proj.configure()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def _affected(self, *files):
+        files = [os.path.join(self.projdir, f) for f in files]
+        return affected.affected_targets(self.proj.builds[0], set(files))
+
+    def test00sources(self):
+        # the targets depending on the library are affected as well
+        self.assertEqual(sorted(self._affected('hello.cpp')),
+                         ['hello', 'hello_static', 'test_hello', 'test_hello_static'])
+        self.assertEqual(sorted(self._affected('main.cpp')), ['test_hello', 'test_hello_static'])
+
+    def test01unbuilt_headers_and_cmake_build_everything(self):
+        # hello.hpp is listed in the sources of the library
+        self.assertEqual(sorted(self._affected('hello.hpp')),
+                         ['hello', 'hello_static', 'test_hello', 'test_hello_static'])
+        self.assertEqual(self._affected('other.hpp'), [])
+        self.assertEqual(self._affected('main.cpp', 'CMakeLists.txt'), [])
+        self.assertEqual(affected.affected_targets(self.proj.builds[0], None), [])
+
+    def test02unrelated_files(self):
+        self.assertEqual(self._affected('README.md'), None)
+        self.assertEqual(self._affected('other.cpp'), None)
+
+    def test03watch(self):
+        b = self.proj.builds[0]
+        th = touch_later(os.path.join(self.projdir, 'main.cpp'), 0.5)
+        self.proj.watch(debounce=0.3, rounds=1)
+        th.join()
+        with open(os.path.join(b.builddir, 'cmany_build.done')) as f:
+            last = f.read().split()
+        self.assertIn('test_hello_static', last)
+        self.assertNotIn('all', last)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+import c4.cmany as cmany
+from c4.cmany import compdb, err
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+
+
+def entry(builddir, src, target, *flags):
+    return {"directory": builddir, "file": "/p/" + src,
+            "command": " ".join(["c++"] + list(flags) + [
+                "-I" + builddir + "/gen", "-o", f"CMakeFiles/{target}.dir/{src}.o", "-c", "/p/" + src])}
+
+
+def write_db(builddir, entries, indent=2):
+    os.makedirs(builddir)
+    fn = os.path.join(builddir, compdb.filename)
+    with open(fn, 'w') as f:
+        json.dump(entries, f, indent=indent)
+    return fn
+
+
+# -----------------------------------------------------------------------------
+class Test00IterEntries(ut.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.compdb.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test00chunks(self):
+        entries = [entry("/b", f"f{i}.cpp", "t", "-DI={}".format("x" * i)) for i in range(50)]
+        for indent in (None, 2):
+            fn = write_db(os.path.join(self.tmpdir, str(indent)), entries, indent)
+            for chunk_size in (1, 7, 100, 1 << 20):
+                with self.subTest(indent=indent, chunk_size=chunk_size):
+                    self.assertEqual(list(compdb.iter_entries(fn, chunk_size)), entries)
+
+    def test01empty(self):
+        fn = write_db(self.tmpdir + '/b', [])
+        self.assertEqual(list(compdb.iter_entries(fn, 1)), [])
+
+    def test02invalid(self):
+        fn = os.path.join(self.tmpdir, compdb.filename)
+        with open(fn, 'w') as f:
+            f.write('[{"directory": "/b", "file": ')
+        with self.assertRaises(err.CompileDBInvalid):
+            list(compdb.iter_entries(fn, 4))
+
+
+# -----------------------------------------------------------------------------
+class Test01Index(ut.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.compdb.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test00dedupe_and_expand(self):
+        bd = [os.path.join(self.tmpdir, n) for n in ('b-Debug', 'b-Debug-foo', 'b-Release')]
+        dbs = [
+            [entry(bd[0], "a.cpp", "a", "-g"), entry(bd[0], "b.cpp", "b", "-g")],
+            [entry(bd[1], "a.cpp", "a", "-g"), entry(bd[1], "b.cpp", "b", "-g", "-DFOO")],
+            [entry(bd[2], "a.cpp", "a", "-O3"), entry(bd[2], "b.cpp", "b", "-O3")],
+        ]
+        idx = compdb.CompileDBIndex()
+        for d, db in zip(bd, dbs):
+            idx.add_build(os.path.basename(d), d, write_db(d, db))
+        self.assertEqual(len(idx.entries), 5)
+        self.assertEqual(idx.builds['b-Debug']['entries'], [0, 1])
+        self.assertEqual(idx.builds['b-Debug-foo']['entries'], [0, 2])
+        fn = os.path.join(self.tmpdir, compdb.index_filename)
+        idx.save(fn)
+        loaded = compdb.load_index(fn)
+        for d, db in zip(bd, dbs):
+            with self.subTest(build=d):
+                expanded = compdb.expand_index(loaded, os.path.basename(d))
+                self.assertEqual([e['file'] for e in expanded], [e['file'] for e in db])
+                self.assertEqual([e['arguments'] for e in expanded],
+                                 [compdb.entry_args(e) for e in db])
+                self.assertEqual([e['directory'] for e in expanded], [d, d])
+
+    def test01project(self):
+        projdir = os.path.join(mydir, 'libhello')
+        proj = cmany.Project.from_spec(projdir, build_types='Debug,Release',
+                                       build_dir=os.path.join(self.tmpdir, 'build'),
+                                       install_dir=os.path.join(self.tmpdir, 'install'))
+        proj.configure()
+        fn = proj.export_compile_db_index()
+        self.assertEqual(fn, os.path.join(proj.build_dir, compdb.index_filename))
+        index = compdb.load_index(fn)
+        self.assertEqual(sorted(index['builds'].keys()), sorted(str(b) for b in proj.builds))
+        for b in proj.builds:
+            with self.subTest(build=str(b)):
+                orig = list(compdb.iter_entries(os.path.join(b.builddir, compdb.filename)))
+                expanded = compdb.expand_index(index, str(b))
+                self.assertEqual([compdb.entry_args(e) for e in orig],
+                                 [e['arguments'] for e in expanded])
+
+
+# -----------------------------------------------------------------------------
+class Test02Export(ut.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.compdb.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test00from_fileapi(self):
+        proj = cmany.Project.from_spec(os.path.join(mydir, 'libhello'), build_types='Debug',
+                                       variants=['foo: -D FOO=1 -X "-Wall"'],
+                                       build_dir=os.path.join(self.tmpdir, 'build'),
+                                       install_dir=os.path.join(self.tmpdir, 'install'))
+        proj.configure()
+        b = proj.builds[0]
+        fn = os.path.join(b.builddir, compdb.filename)
+        exported = list(compdb.iter_entries(fn))
+        os.remove(fn)
+        # as if the generator could not export the compile commands
+        with mock.patch.object(b, 'needs_configure', return_value=False):
+            b.export_compile_commands()
+        self.assertFalse(os.path.exists(os.path.join(b.builddir, '.export_compile_commands')))
+        synthesized = list(compdb.iter_entries(fn))
+        def _key(e):
+            args = compdb.entry_args(e)
+            if '-o' in args:  # the synthesized entries have no output
+                i = args.index('-o')
+                args = args[:i] + args[i + 2:]
+            return compdb.entry_file(e), args
+        self.assertEqual(sorted(_key(e) for e in exported),
+                         sorted(_key(e) for e in synthesized))
+        self.assertTrue(all('FOO=1' in e['arguments'] for e in synthesized))
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
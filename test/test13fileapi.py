@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import json
+import shutil
+import tempfile
+
+import c4.cmany as cmany
+from c4.cmany import util, fileapi
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+projdir = os.path.join(mydir, 'libhello')
+
+
+# -----------------------------------------------------------------------------
+class Test00FileAPI(ut.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.fileapi.')
+        self.proj = cmany.Project.from_spec(projdir, build_types='Release',
+                                            build_dir=os.path.join(self.tmpdir, 'build'),
+                                            install_dir=os.path.join(self.tmpdir, 'install'))
+        self.build = self.proj.builds[0]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test00codemodel(self):
+        self.assertIsNone(self.build.codemodel())
+        self.proj.configure()
+        model = self.build.codemodel()
+        self.assertIsNotNone(model)
+        targets = {t['name']: t for t in model['targets']}
+        self.assertEqual(sorted(targets.keys()),
+                         ['hello', 'hello_static', 'test_hello', 'test_hello_static'])
+        self.assertEqual(targets['hello']['type'], 'SHARED_LIBRARY')
+        self.assertEqual(targets['hello_static']['type'], 'STATIC_LIBRARY')
+        self.assertEqual(targets['test_hello']['type'], 'EXECUTABLE')
+        self.assertEqual(targets['test_hello']['dependencies'], ['hello'])
+        self.assertEqual(targets['test_hello']['sources'], [os.path.join(projdir, 'main.cpp')])
+        self.assertEqual(model['cmake_inputs'], [os.path.join(projdir, 'CMakeLists.txt')])
+
+    def test01targets_do_not_need_the_build_tool(self):
+        self.proj.configure()
+        prev = util.runsyscmd
+        def fail(*args, **kwargs):
+            raise Exception("the build tool should not be called")
+        util.runsyscmd = fail
+        try:
+            self.assertEqual(self.build.get_targets(),
+                             ['hello', 'hello_static', 'test_hello', 'test_hello_static'])
+        finally:
+            util.runsyscmd = prev
+
+    def test02cached_until_configure(self):
+        self.proj.configure()
+        model = self.build.codemodel()
+        cf = os.path.join(self.build.builddir, fileapi.cache_file)
+        self.assertTrue(os.path.exists(cf))
+        # change the cache to verify that it is used
+        model['targets'] = model['targets'][:1]
+        with open(cf, 'w') as f:
+            json.dump(model, f)
+        self.assertEqual(len(self.build.codemodel()['targets']), 1)
+        # a new configure writes a new reply, which invalidates the cache
+        self.build.reconfigure()
+        self.assertEqual(len(self.build.codemodel()['targets']), 4)
+
+    def test03external_inputs(self):
+        # a cmake file include()d from out of the source tree
+        src = os.path.join(self.tmpdir, 'src')
+        ext = os.path.join(self.tmpdir, 'ext', 'extra.cmake')
+        shutil.copytree(projdir, src, ignore=shutil.ignore_patterns('.test'))
+        os.makedirs(os.path.dirname(ext))
+        with open(ext, 'w') as f:
+            f.write("set(EXTRA 1)\n")
+        with open(os.path.join(src, 'CMakeLists.txt'), 'a') as f:
+            f.write("include(${CMAKE_CURRENT_LIST_DIR}/../ext/extra.cmake)\n")
+        proj = cmany.Project.from_spec(src, build_types='Release',
+                                       build_dir=os.path.join(self.tmpdir, 'build2'),
+                                       install_dir=os.path.join(self.tmpdir, 'install2'))
+        build = proj.builds[0]
+        proj.configure()
+        inputs = build.codemodel()['cmake_inputs']
+        self.assertEqual(inputs, [os.path.join(src, 'CMakeLists.txt'), ext])
+        self.assertTrue(build.configure_is_current())
+        with open(ext, 'a') as f:
+            f.write("set(EXTRA 2)\n")
+        self.assertFalse(build.configure_is_current())
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import c4.cmany as cmany
+from c4.cmany import util, affected
+from c4.cmany.project import Project
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+
+
+def git(projdir, *args):
+    return util.runsyscmd(['git', '-C', projdir, '-c', 'user.name=cmany',
+                           '-c', 'user.email=cmany@example.com'] + list(args),
+                          echo_cmd=False, echo_output=False, capture_output=True)
+
+
+# -----------------------------------------------------------------------------
+class Test00Depfiles(ut.TestCase):
+
+    def test00parse(self):
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, 'foo.cpp.o.d')
+            with open(fn, 'w') as f:
+                f.write("CMakeFiles/foo.dir/foo.cpp.o: \\\n /p/foo.cpp /p/foo.hpp \\\n"
+                        " /p/with\\ space.hpp\n")
+            self.assertEqual(affected._parse_depfile(fn),
+                             ['/p/foo.cpp', '/p/foo.hpp', '/p/with space.hpp'])
+
+    def test01closure(self):
+        model = {'targets': [
+            {'name': 'a', 'dependencies': []},
+            {'name': 'b', 'dependencies': ['a']},
+            {'name': 'c', 'dependencies': ['b']},
+            {'name': 'd', 'dependencies': []},
+        ]}
+        self.assertEqual(affected.reverse_deps_closure(model, ['a']), ['a', 'b', 'c'])
+        self.assertEqual(affected.reverse_deps_closure(model, ['b', 'd']), ['b', 'd', 'c'])
+
+    def test02depfiles_are_cached(self):
+        with tempfile.TemporaryDirectory() as d:
+            def _write(name, txt):
+                fn = os.path.join(d, name)
+                os.makedirs(os.path.dirname(fn), exist_ok=True)
+                with open(fn, 'w') as f:
+                    f.write(txt)
+            _write('cmany_build.done', "make\n")
+            _write('CMakeFiles/foo.dir/foo.cpp.o.d', "foo.cpp.o: /p/foo.cpp\n")
+            with mock.patch.object(affected.glob, 'glob', wraps=affected.glob.glob) as g:
+                self.assertEqual(affected.depfile_deps(d), {'foo': {'/p/foo.cpp'}})
+                self.assertEqual(affected.depfile_deps(d), {'foo': {'/p/foo.cpp'}})
+                self.assertEqual(g.call_count, 1)
+                # a new build
+                _write('CMakeFiles/bar.dir/bar.cpp.o.d', "bar.cpp.o: /p/bar.cpp\n")
+                t = os.path.getmtime(os.path.join(d, 'cmany_build.done'))
+                os.utime(os.path.join(d, 'cmany_build.done'), (t + 1, t + 1))
+                self.assertEqual(sorted(affected.depfile_deps(d)), ['bar', 'foo'])
+                self.assertEqual(g.call_count, 2)
+                # a failed build leaves no stamp
+                _write('CMakeFiles/baz.dir/baz.cpp.o.d', "baz.cpp.o: /p/baz.cpp\n")
+                self.assertEqual(sorted(affected.depfile_deps(d)), ['bar', 'foo'])
+                affected.forget_depfiles(d)
+                self.assertEqual(sorted(affected.depfile_deps(d)), ['bar', 'baz', 'foo'])
+                self.assertEqual(g.call_count, 3)
+
+    def test03changed_files_list(self):
+        with util.setcwd(mydir):
+            self.assertEqual(affected.changed_files(['libhello/main.cpp', '/p/x.cpp'], '/p'),
+                             [os.path.join(mydir, 'libhello', 'main.cpp'), '/p/x.cpp'])
+
+
+# -----------------------------------------------------------------------------
+class Test01ChangedFiles(ut.TestCase):
+
+    @classmethod
+    def make_proj(cls, **kwargs):
+        return cmany.Project.from_spec(cls.projdir, build_types='Release,Debug',
+                                       build_dir=os.path.join(cls.tmpdir, 'build'),
+                                       install_dir=os.path.join(cls.tmpdir, 'install'),
+                                       **kwargs)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp(prefix='cmany.affected.')
+        cls.projdir = os.path.join(cls.tmpdir, 'libhello')
+        shutil.copytree(os.path.join(mydir, 'libhello'), cls.projdir)
+        cls.proj = cls.make_proj()
+        cls.proj.build()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def _affected(self, *files):
+        files = [os.path.join(self.projdir, f) for f in files]
+        return affected.affected_targets(self.proj.builds[0], files)
+
+    def _done_file(self, build):
+        return os.path.join(build.builddir, 'cmany_build.done')
+
+    def _last_build_cmd(self, build):
+        with open(self._done_file(build)) as f:
+            return f.read().split()
+
+    def test00headers(self):
+        self.assertEqual(sorted(self._affected('hello.hpp')),
+                         ['hello', 'hello_static', 'test_hello', 'test_hello_static'])
+        deps = affected.depfile_deps(self.proj.builds[0].builddir)
+        self.assertIn(os.path.join(self.projdir, 'hello.hpp'), deps['test_hello'])
+        # included by no source
+        self.assertEqual(self._affected('unused.hpp'), None)
+
+    def test01build_changed_files(self):
+        proj = self.make_proj(changed_files=[os.path.join(self.projdir, 'main.cpp')])
+        proj.build()
+        for b in proj.builds:
+            with self.subTest(build=str(b)):
+                last = self._last_build_cmd(b)
+                self.assertIn('test_hello_static', last)
+                self.assertNotIn('all', last)
+
+    def test02unaffected_builds_are_skipped(self):
+        proj = self.make_proj(changed_files=[os.path.join(self.projdir, 'README.md')])
+        mtimes = [os.path.getmtime(self._done_file(b)) for b in proj.builds]
+        proj.build()
+        self.assertEqual(mtimes, [os.path.getmtime(self._done_file(b)) for b in proj.builds])
+
+    @ut.skipIf(util.which('git') is None, "git is not available")
+    def test03git_diff(self):
+        git(self.projdir, 'init', '-q')
+        git(self.projdir, 'add', '-A')
+        git(self.projdir, 'commit', '-q', '-m', 'initial')
+        self.assertEqual(affected.changed_files('git-diff', self.projdir), [])
+        with open(os.path.join(self.projdir, 'main.cpp'), 'a') as f:
+            f.write("\n")
+        with open(os.path.join(self.projdir, 'new.cpp'), 'w') as f:
+            f.write("\n")
+        self.assertEqual(sorted(affected.changed_files(['git-diff'], self.projdir)),
+                         [os.path.join(self.projdir, 'main.cpp'),
+                          os.path.join(self.projdir, 'new.cpp')])
+        git(self.projdir, 'add', '-A')
+        git(self.projdir, 'commit', '-q', '-m', 'second')
+        self.assertEqual(sorted(affected.changed_files(['git-diff:HEAD~1'], self.projdir)),
+                         [os.path.join(self.projdir, 'main.cpp'),
+                          os.path.join(self.projdir, 'new.cpp')])
+
+    def test04build_changed_files_on_workers(self):
+        proj = self.make_proj(changed_files=[os.path.join(self.projdir, 'main.cpp')],
+                              workers=['local'])
+        with mock.patch.object(Project, '_execute_locally') as local:
+            proj.build()
+        local.assert_not_called()
+        for b in proj.builds:
+            with self.subTest(build=str(b)):
+                last = self._last_build_cmd(b)
+                self.assertIn('test_hello_static', last)
+                self.assertNotIn('all', last)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import json
+import shutil
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+
+import c4.cmany as cmany
+from c4.cmany import ctest, err
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+
+cmakelists = """cmake_minimum_required(VERSION 3.5)
+project(tests NONE)
+enable_testing()
+add_test(NAME pass COMMAND ${CMAKE_COMMAND} -E echo ok)
+add_test(NAME slow COMMAND ${CMAKE_COMMAND} -E sleep 0.3)
+add_test(NAME fail COMMAND ${CMAKE_COMMAND} -E false)
+"""
+
+ctest_output = """Test project /b
+    Start 1: pass
+1/5 Test #1: pass ....................................................   Passed    0.01 sec
+2/5 Test #2: a_very_long_test_name_that_does_not_fit_in_the_column ...   Passed    0.02 sec
+3/5 Test #3: dis .....................................................***Not Run (Disabled)   0.00 sec
+4/5 Test #4: to ......................................................***Timeout   1.00 sec
+5/5 Test #5: missing .................................................***Not Run   0.00 sec
+"""
+
+
+# -----------------------------------------------------------------------------
+class Test00Scheduling(ut.TestCase):
+
+    def test00allocate_cores(self):
+        self.assertEqual(ctest.allocate_cores([10., 1., 1.], 8), [6, 1, 1])
+        self.assertEqual(ctest.allocate_cores([10., 1., 1.], 8, [3, 10, 10]), [3, 3, 2])
+        self.assertEqual(ctest.allocate_cores([4., 4.], 4), [2, 2])
+        self.assertEqual(ctest.allocate_cores([1., 1., 1.], 2), [1, 1, 1])
+
+    def test01estimate_cost(self):
+        est = ctest.CTestRun.estimate_cost
+        self.assertEqual(est(['a', 'b'], {}), 2 * ctest.default_cost)
+        # tests without history are assumed to take the average
+        self.assertEqual(est(['a', 'b', 'c'], {'a': 1., 'b': 3.}), 6.)
+
+    def test02parse_results(self):
+        res = ctest.parse_results(ctest_output)
+        self.assertEqual([r['name'] for r in res], [
+            'pass', 'a_very_long_test_name_that_does_not_fit_in_the_column',
+            'dis', 'to', 'missing'])
+        self.assertEqual([r['outcome'] for r in res],
+                         ['passed', 'passed', 'skipped', 'failed', 'error'])
+        self.assertEqual(res[3]['status'], 'Timeout')
+        self.assertEqual(res[3]['duration'], 1.)
+
+    def test03load_costs(self):
+        with tempfile.TemporaryDirectory() as d:
+            os.makedirs(os.path.join(d, 'Testing', 'Temporary'))
+            with open(os.path.join(d, 'Testing', 'Temporary', 'CTestCostData.txt'), 'w') as f:
+                f.write("pass 3 0.5\nwith space 1 2\n---\nfail\n")
+            self.assertEqual(ctest.load_costs(d), {'pass': 0.5, 'with space': 2.})
+
+    def test04run_all_survives_exceptions(self):
+        class FakeRun:
+            def __init__(self, name, cost, fail_in=None):
+                self.name, self.cost, self.tests = name, cost, ['t']
+                self.fail_in, self.error, self.ran = fail_in, None, False
+            def run(self, jobs):
+                if self.fail_in == 'run':
+                    raise RuntimeError("run " + self.name)
+                self.ran = True
+        def on_done(r):
+            if r.fail_in == 'on_done':
+                raise RuntimeError("on_done " + r.name)
+        runs = [FakeRun('a', 3., 'run'), FakeRun('b', 2., 'on_done'), FakeRun('c', 1.)]
+        # with a single core, each run waits for the previous one to free it
+        th = threading.Thread(target=ctest.run_all, args=(runs, 1, on_done))
+        th.start()
+        th.join(10)
+        self.assertFalse(th.is_alive())
+        self.assertEqual(runs[0].error, "RuntimeError: run a")
+        self.assertEqual(runs[1].error, "RuntimeError: on_done b")
+        self.assertIsNone(runs[2].error)
+        self.assertTrue(runs[2].ran)
+
+
+# -----------------------------------------------------------------------------
+class Test01Test(ut.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.ctest.')
+        self.projdir = os.path.join(self.tmpdir, 'proj')
+        os.makedirs(self.projdir)
+        with open(os.path.join(self.projdir, 'CMakeLists.txt'), 'w') as f:
+            f.write(cmakelists)
+        self.proj = cmany.Project.from_spec(self.projdir, build_types='Debug,Release', jobs=3,
+                                            build_dir=os.path.join(self.tmpdir, 'build'),
+                                            install_dir=os.path.join(self.tmpdir, 'install'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _load(self, *path):
+        with open(os.path.join(*path)) as f:
+            return json.load(f)
+
+    def test00results(self):
+        with self.assertRaises(err.TestsFailed):
+            self.proj.test()
+        for b in self.proj.builds:
+            with self.subTest(build=str(b)):
+                res = self._load(b.builddir, ctest.json_file)
+                self.assertEqual(res['build'], str(b))
+                self.assertEqual({t['name']: t['outcome'] for t in res['tests']},
+                                 {'pass': 'passed', 'slow': 'passed', 'fail': 'failed'})
+                self.assertTrue(os.path.exists(res['log']))
+                suite = ET.parse(os.path.join(b.builddir, ctest.junit_file)).getroot()[0]
+                self.assertEqual(suite.get('tests'), '3')
+                self.assertEqual(suite.get('failures'), '1')
+        summary = self._load(self.proj.build_dir, ctest.summary_json_file)
+        self.assertEqual(summary['tests'], 6)
+        self.assertEqual(summary['failed'], 2)
+        self.assertEqual(sorted(summary['failed_builds']), sorted(str(b) for b in self.proj.builds))
+        suites = ET.parse(os.path.join(self.proj.build_dir, ctest.summary_junit_file)).getroot()
+        self.assertEqual(len(suites), 2)
+
+    def test01history_and_args(self):
+        self.proj.test(['-E', 'fail'])
+        # the second run uses the durations from the first
+        runs = [ctest.CTestRun(b, ['-E', 'fail']) for b in self.proj.builds]
+        for r in runs:
+            with self.subTest(build=str(r.build)):
+                self.assertEqual(r.tests, ['pass', 'slow'])
+                self.assertLess(r.cost, 2 * ctest.default_cost)
+                self.assertGreater(r.cost, 0.2)
+        summary = self._load(self.proj.build_dir, ctest.summary_json_file)
+        self.assertEqual(summary['failed'], 0)
+        self.assertEqual(sum(b['jobs'] for b in summary['builds']), 3)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
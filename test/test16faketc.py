@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+# -----------------------------------------------------------------------------
+class Test00FakeToolchain(faketc.FakeTcTestCase, ut.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.builddir = os.path.join(self.tmpdir, 'build')
+        self.installdir = os.path.join(self.tmpdir, 'install')
+
+    def cmany(self, *args, **settings):
+        return super().cmany(*args, '-t', 'Debug,Release', '-v', "none,'foo: -D FOO=1'",
+                             '--build-dir', self.builddir, '--install-dir', self.installdir,
+                             os.path.join(mydir, 'libhello'), **settings)
+
+    def test00install(self):
+        r = self.cmany('install')
+        self.assertEqual(r.returncode, 0, r.stdout)
+        self.assertEqual(len(os.listdir(self.builddir)), 4)
+        self.assertEqual(len(self.calls('cmake', '-C')), 4)
+        for d in os.listdir(self.installdir):
+            self.assertEqual(sorted(os.listdir(os.path.join(self.installdir, d, 'bin'))),
+                             ['hello', 'hello_static', 'test_hello', 'test_hello_static'])
+        for d in os.listdir(self.builddir):
+            with open(os.path.join(self.builddir, d, 'CMakeCache.txt')) as f:
+                cache = f.read()
+            self.assertIn('CMAKE_INSTALL_PREFIX:PATH=' + os.path.join(self.installdir, d), cache)
+            self.assertTrue(os.path.exists(os.path.join(self.builddir, d, 'compile_commands.json')))
+        # the configured builds are not configured again
+        os.remove(self.log)
+        r = self.cmany('build')
+        self.assertEqual(r.returncode, 0, r.stdout)
+        self.assertEqual(self.calls('cmake', '-C'), [])
+        self.assertEqual(len(self.calls('make')), 4)
+
+    def test01failure(self):
+        r = self.cmany('build', fail='build')
+        self.assertNotEqual(r.returncode, 0)
+        self.assertIn('faketc: build failed', r.stdout)
+        r = self.cmany('configure', fail='configure')
+        self.assertNotEqual(r.returncode, 0)
+
+    def test02latency_and_output(self):
+        r = self.cmany('configure', cmake_latency=0.1, cmake_output=50)
+        self.assertEqual(r.returncode, 0, r.stdout)
+        configures = self.calls('cmake', '-C')
+        self.assertEqual(len(configures), 4)
+        for c in configures:
+            self.assertGreaterEqual(c['duration'], 0.1)
+        self.assertEqual(r.stdout.count('faketc cmake: configure'), 4 * 50)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
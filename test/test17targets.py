@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+from types import SimpleNamespace
+from unittest import mock
+
+from c4.cmany import cmake, err
+from c4.cmany.generator import Generator
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+def make_gen(name):
+    build = SimpleNamespace(build_type='Release', compiler=None)
+    return Generator(name, build, 4)
+
+
+# -----------------------------------------------------------------------------
+class Test00GeneratorCmd(ut.TestCase):
+
+    def test00makefiles_and_ninja(self):
+        self.assertEqual(make_gen("Unix Makefiles").cmd(['a', 'b']),
+                         ['make', '-j', '4', 'a', 'b'])
+        self.assertEqual(make_gen("Ninja").cmd(['a', 'b']),
+                         ['ninja', '-j', '4', 'a', 'b'])
+
+    def test01cmake_build(self):
+        g = make_gen("Xcode")
+        with mock.patch.object(cmake, 'version', return_value=(3, 15, 0)):
+            self.assertTrue(g.builds_multiple_targets)
+            self.assertEqual(g.cmd(['a', 'b']),
+                             ['cmake', '--build', '.', '--target', 'a', 'b', '--config', 'Release'])
+        with mock.patch.object(cmake, 'version', return_value=(3, 14, 7)):
+            self.assertFalse(g.builds_multiple_targets)
+            self.assertEqual(g.cmd(['a']),
+                             ['cmake', '--build', '.', '--target', 'a', '--config', 'Release'])
+            with self.assertRaises(err.TooManyTargets):
+                g.cmd(['a', 'b'])
+
+    def test02version(self):
+        v = cmake.version()
+        self.assertGreaterEqual(len(v), 2)
+        self.assertTrue(all(isinstance(i, int) for i in v))
+        self.assertIs(cmake.version(), v)
+
+
+# -----------------------------------------------------------------------------
+class Test01BuildTargets(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.targets.'
+
+    def test00single_invocation(self):
+        builddir = os.path.join(self.tmpdir, 'build')
+        r = self.cmany('build', '--build-dir', builddir,
+                       '--install-dir', os.path.join(self.tmpdir, 'install'),
+                       os.path.join(mydir, 'libhello'), 'hello', 'test_hello')
+        self.assertEqual(r.returncode, 0, r.stdout)
+        makes = [c['args'] for c in self.calls('make')]
+        self.assertEqual(makes, [['-j', '1', 'hello', 'test_hello']])
+        done = os.path.join(builddir, os.listdir(builddir)[0], 'cmany_build.done')
+        with open(done) as f:
+            self.assertEqual(f.read(), "make -j 1 hello test_hello\n")
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
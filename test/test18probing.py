@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+import time
+import shutil
+import tempfile
+from unittest import mock
+
+from c4.cmany import err, cmake
+from c4.cmany.build_item import BuildItem
+from c4.cmany.compiler import Compiler
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+# -----------------------------------------------------------------------------
+class Test00CompilerProbing(ut.TestCase):
+
+    versions = ('7', '8', '9', '10', '11', '12', '13', '14')
+    latency = 0.2
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.probing.')
+        self.compilers = []
+        for v in self.versions:
+            c = os.path.join(self.tmpdir, 'g++-' + v)
+            os.symlink(os.path.join(faketc.bindir, 'g++'), c)
+            self.compilers.append(c)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def create(self, specs):
+        with mock.patch.dict(os.environ, {'FAKETC_CC_LATENCY': str(self.latency)}):
+            return BuildItem.create({'compilers': (Compiler, specs)})['compilers']
+
+    def test00concurrent_in_spec_order(self):
+        specs = list(reversed(self.compilers))
+        t = time.time()
+        items = self.create(specs)
+        elapsed = time.time() - t
+        self.assertEqual([c.name for c in items],
+                         ['g++' + v + '.1' for v in reversed(self.versions)])
+        self.assertEqual([c.path for c in items], specs)
+        # each compiler is probed twice (--version and -dumpversion)
+        serial = 2 * self.latency * len(specs)
+        self.assertLess(elapsed, serial / 2)
+
+    def test01first_error_in_spec_order(self):
+        specs = self.compilers[:2] + ['nonexisting-a++', 'nonexisting-b++'] + self.compilers[2:]
+        with self.assertRaises(err.CompilerNotFound) as cm:
+            self.create(specs)
+        self.assertIn('nonexisting-a++', str(cm.exception))
+
+    def test02probed_once(self):
+        self.create(self.compilers[:2])
+        with mock.patch.object(Compiler, '_probe_version') as probe:
+            self.create(self.compilers[:2])
+            probe.assert_not_called()
+
+
+# -----------------------------------------------------------------------------
+class Test01SysInfoPrewarm(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.sysinfo.'
+    gens = [f"Fake Generator {i}" for i in range(4)]
+    latency = 0.3
+
+    def tearDown(self):
+        super().tearDown()
+        for g in self.gens:
+            attr = '_info_' + cmake._genid(g)
+            if hasattr(cmake.CMakeSysInfo, attr):
+                delattr(cmake.CMakeSysInfo, attr)
+
+    def prewarm(self, specs):
+        env = faketc.env(self.env, cmake_latency=self.latency)
+        with mock.patch.dict(os.environ, env), mock.patch.object(cmake, 'USER_DIR', self.userdir):
+            t = time.time()
+            cmake.CMakeSysInfo.prewarm(specs)
+            return time.time() - t
+
+    def sysinfo_calls(self):
+        return self.calls(None, '--system-information')
+
+    def test00concurrent(self):
+        specs = [(g, ['-G', g]) for g in self.gens]
+        elapsed = self.prewarm(specs + specs)
+        self.assertEqual(len(self.sysinfo_calls()), len(self.gens))
+        self.assertLess(elapsed, self.latency * len(self.gens) / 2)
+        for g in self.gens:
+            self.assertEqual(cmake.CMakeSysInfo.var('CMAKE_GENERATOR', g), g)
+        # the results are kept, and also stored
+        self.prewarm(specs)
+        self.assertEqual(len(self.sysinfo_calls()), len(self.gens))
+        for g in self.gens:
+            self.assertTrue(os.path.exists(os.path.join(self.userdir, 'cmake_info', cmake._genid(g), 'info')))
+
+    def test01project(self):
+        # a full project: the default generator is run first, and then the
+        # generator of the builds; a second project finds them stored
+        for expected in ([['--system-information'], ['-G', 'Unix Makefiles', '--system-information']], []):
+            r = self.cmany('show_build_names', '-t', 'Debug,Release', os.path.join(mydir, 'hello'))
+            self.assertEqual(r.returncode, 0, r.stdout)
+            self.assertEqual([c['args'] for c in self.sysinfo_calls()], expected)
+            if os.path.exists(self.log):
+                os.remove(self.log)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+from c4.cmany import artifacts
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+def _mktree(d, **files):
+    os.makedirs(d)
+    for name, contents in files.items():
+        with open(os.path.join(d, name), 'w') as f:
+            f.write(contents)
+
+
+# -----------------------------------------------------------------------------
+class Test00Store(ut.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.artifacts.')
+        self.store = artifacts.ArtifactStore(os.path.join(self.tmpdir, 'store'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test00parse_size(self):
+        self.assertEqual(artifacts.parse_size("100"), 100)
+        self.assertEqual(artifacts.parse_size("2k"), 2048)
+        self.assertEqual(artifacts.parse_size("1.5M"), 3 * 512 * 1024)
+        self.assertEqual(artifacts.parse_size("10GB"), 10 * 1024 ** 3)
+
+    def test01publish_restore(self):
+        src = os.path.join(self.tmpdir, 'src')
+        _mktree(src, a="aaa", b="bbbb")
+        self.assertTrue(self.store.publish('f00', src, {'x': 1}))
+        self.assertFalse(self.store.publish('f00', src))
+        self.assertIn('f00', self.store)
+        self.assertEqual(self.store.size(), 7)
+        self.assertEqual(os.listdir(self.store.tmpdir), [])
+        dst = os.path.join(self.tmpdir, 'dst')
+        _mktree(dst, stale="x")
+        self.assertTrue(self.store.restore('f00', dst))
+        self.assertEqual(sorted(os.listdir(dst)), ['a', 'b'])
+        self.assertFalse(self.store.restore('baa', dst))
+
+    def test02lru_eviction(self):
+        for i, fp in enumerate(('a0', 'b0', 'c0')):
+            src = os.path.join(self.tmpdir, fp)
+            _mktree(src, f="x" * 10)
+            self.store.publish(fp, src)
+            os.utime(os.path.join(self.store.entry(fp), 'last_used'), (i, i))
+        # restoring marks as used
+        self.store.restore('a0', os.path.join(self.tmpdir, 'dst'))
+        self.assertEqual(self.store.evict(20), ['b0'])
+        self.assertEqual(sorted(e[0] for e in self.store.entries()), ['a0', 'c0'])
+        self.assertEqual(self.store.evict(0), ['c0', 'a0'])
+        self.assertEqual(self.store.entries(), [])
+
+    def test03hash_sources(self):
+        proj = os.path.join(self.tmpdir, 'proj')
+        _mktree(proj, **{'CMakeLists.txt': "project(p)", 'main.cpp': "int main(){}"})
+        _mktree(os.path.join(proj, '.git'), HEAD="x")
+        _mktree(os.path.join(proj, 'build'), **{'CMakeCache.txt': ""})
+        _mktree(os.path.join(proj, 'install'), lib="x")
+        exclude = [os.path.join(proj, 'install')]
+        self.assertEqual([os.path.basename(f) for f in artifacts.source_files(proj, exclude)],
+                         ['CMakeLists.txt', 'main.cpp'])
+        memo = {}
+        h = artifacts.hash_sources(proj, exclude, memo)
+        self.assertEqual(len(memo), 2)
+        self.assertEqual(artifacts.hash_sources(proj, exclude, memo), h)
+        with open(os.path.join(proj, 'main.cpp'), 'w') as f:
+            f.write("int main(){return 0;}")
+        self.assertNotEqual(artifacts.hash_sources(proj, exclude, memo), h)
+
+
+# -----------------------------------------------------------------------------
+class Test01Install(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.artifacts.'
+
+    def setUp(self):
+        super().setUp()
+        self.proj = os.path.join(self.tmpdir, 'proj')
+        shutil.copytree(os.path.join(mydir, 'hello'), self.proj,
+                        ignore=shutil.ignore_patterns('.test', 'build', 'install'))
+        self.store = os.path.join(self.tmpdir, 'store')
+
+    def install(self, *args):
+        if os.path.exists(self.log):
+            os.remove(self.log)
+        r = self.cmany('install',
+                       '--build-dir', os.path.join(self.tmpdir, 'build'),
+                       '--install-dir', os.path.join(self.tmpdir, 'install'),
+                       '--artifact-store', self.store, *args, self.proj)
+        self.assertEqual(r.returncode, 0, r.stdout)
+        # the compilers are always probed; return the calls to the build tools
+        return [c['tool'] for c in self.calls() if c['tool'] in ('cmake', 'make')]
+
+    def installed(self):
+        d = os.path.join(self.tmpdir, 'install')
+        return sorted(os.path.relpath(os.path.join(root, f), d)
+                      for root, _, files in os.walk(d) for f in files)
+
+    def test00restore_and_publish(self):
+        store = artifacts.ArtifactStore(self.store)
+        tools = self.install()
+        self.assertIn('make', tools)
+        entries = store.entries()
+        self.assertEqual(len(entries), 1)
+        with open(os.path.join(store.entry(entries[0][0]), 'meta.json')) as f:
+            meta = json.load(f)
+        self.assertEqual(meta['data']['generator'], "Unix Makefiles")
+        manifest = self.installed()
+        self.assertTrue(manifest)
+        shutil.rmtree(os.path.join(self.tmpdir, 'install'))
+        # the fingerprint matches: restored without building or installing
+        self.assertEqual(self.install(), [])
+        self.assertEqual(self.installed(), manifest)
+        # changing the sources or the vars changes the fingerprint
+        with open(os.path.join(self.proj, 'main.cpp'), 'a') as f:
+            f.write("\n// changed\n")
+        self.assertIn('cmake', self.install())
+        self.assertEqual(len(store.entries()), 2)
+        self.assertIn('cmake', self.install('-V', 'FOO=1'))
+        self.assertEqual(len(store.entries()), 3)
+        self.assertEqual(self.install('-V', 'FOO=1'), [])
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+import json
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from c4.cmany import plan
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+def make_build(builddir, configured=True, built=True, deps=''):
+    os.makedirs(builddir)
+    return SimpleNamespace(builddir=builddir, deps=deps, deps_done=configured,
+                           needs_configure=lambda: not configured,
+                           needs_build=lambda: not built)
+
+
+# -----------------------------------------------------------------------------
+class Test00Plan(ut.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.plan.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test00schedule(self):
+        self.assertEqual(plan.schedule([], 4), 0.)
+        self.assertEqual(plan.schedule([1, 2, 3], 1), 6)
+        self.assertEqual(plan.schedule([3, 3, 2, 2, 2], 2), 7)
+        self.assertEqual(plan.schedule([5, 1, 1, 1], 8), 5)
+
+    def test01record(self):
+        d = os.path.join(self.tmpdir, 'b')
+        os.makedirs(d)
+        for i in range(plan.timings_history + 2):
+            plan.record_timing(d, 'build', float(i))
+        self.assertEqual(plan.load_timings(d)['build'],
+                         [float(i) for i in range(2, plan.timings_history + 2)])
+        with self.assertRaises(RuntimeError):
+            with plan.timed(d, 'configure'):
+                raise RuntimeError("failed steps are not recorded")
+        self.assertNotIn('configure', plan.load_timings(d))
+
+    def test02pending_steps(self):
+        fresh = make_build(os.path.join(self.tmpdir, 'fresh'), configured=False,
+                           built=False, deps='extern')
+        done = make_build(os.path.join(self.tmpdir, 'done'), deps='extern')
+        self.assertEqual(plan.pending_steps(fresh, 'install'),
+                         ['configure', 'deps', 'build', 'install'])
+        self.assertEqual(plan.pending_steps(done, 'install'), ['install'])
+        self.assertEqual(plan.pending_steps(done, 'build'), ['build'])
+        self.assertEqual(plan.pending_steps(done, 'configure'), ['configure'])
+        self.assertEqual(plan.pending_steps(fresh, 'reinstall'), ['build', 'install'])
+
+    def test03estimates(self):
+        a = make_build(os.path.join(self.tmpdir, 'a'), configured=False)
+        b = make_build(os.path.join(self.tmpdir, 'b'), configured=False)
+        c = make_build(os.path.join(self.tmpdir, 'c'))
+        plan.record_timing(a.builddir, 'configure', 2.)
+        plan.record_timing(a.builddir, 'build', 10.)
+        plan.record_timing(a.builddir, 'build', 20.)
+        plan.record_timing(c.builddir, 'build', 5.)
+        p = plan.Plan('build', [a, b, c], parallel=2)
+        self.assertEqual([dict(steps) for _, steps in p.builds], [
+            {'configure': 2., 'build': 15.},
+            # no history: the average of the other builds
+            {'configure': 2., 'build': 10.},
+            {'build': 5.},
+        ])
+        self.assertEqual(p.total, 34.)
+        self.assertEqual(p.wall, 17.)
+        self.assertEqual(p.unknown, [])
+        data = p.json_data()
+        self.assertEqual(data['wall'], 17.)
+        self.assertEqual([b['duration'] for b in data['builds']], [17., 12., 5.])
+        # no history at all for install
+        p = plan.Plan('install', [a, b, c])
+        self.assertEqual(len(p.unknown), 3)
+        self.assertIn("3 steps without history", p.table())
+
+
+# -----------------------------------------------------------------------------
+class Test01PlanCmd(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.plan.'
+    faketc_settings = {'latency': 0.1}
+
+    def cmany(self, *args):
+        r = super().cmany(*args, '--build-dir', os.path.join(self.tmpdir, 'build'),
+                          '--install-dir', os.path.join(self.tmpdir, 'install'),
+                          os.path.join(mydir, 'hello'))
+        self.assertEqual(r.returncode, 0, r.stdout)
+        return r.stdout
+
+    def test00plan_after_build(self):
+        self.cmany('build', '-t', 'Debug')
+        os.remove(self.log)
+        data = json.loads(self.cmany('plan', '-t', 'Debug,Release', '--command', 'install',
+                                     '-P', '2', '--json'))
+        # the plan ran no build tool (only the compilers were probed)
+        tools = set(c['tool'] for c in self.calls())
+        self.assertEqual(tools - {'g++', 'gcc'}, set())
+        self.assertEqual([list(b['steps'].keys()) for b in data['builds']],
+                         [['install'], ['configure', 'build', 'install']])
+        steps = data['builds'][1]['steps']
+        self.assertGreaterEqual(steps['configure'], 0.1)
+        self.assertGreaterEqual(steps['build'], 0.1)
+        self.assertIsNone(steps['install'])
+        self.assertEqual(data['unknown'], 2)
+        self.assertAlmostEqual(data['wall'], steps['configure'] + steps['build'])
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
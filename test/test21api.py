@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import io
+import os
+import sys
+import asyncio
+from unittest import mock
+
+from c4.cmany import err
+from c4.cmany.project import Project
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+# -----------------------------------------------------------------------------
+class Test00PythonApi(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.api.'
+
+    def setUp(self):
+        super().setUp()
+        self.patch_environ()
+
+    def proj(self, **kwargs):
+        return Project.from_spec(os.path.join(mydir, 'hello'),
+                                 build_dir=os.path.join(self.tmpdir, 'build'),
+                                 install_dir=os.path.join(self.tmpdir, 'install'),
+                                 compilers=[os.path.join(faketc.bindir, 'g++')],
+                                 **kwargs)
+
+    def test00from_spec(self):
+        p = self.proj(build_types="Debug,Release")
+        self.assertEqual([str(b.build_type) for b in p.builds], ['Debug', 'Release'])
+        with self.assertRaises(err.Error) as cm:
+            self.proj(build_typez=['Debug'])
+        self.assertIn('build_typez', str(cm.exception))
+
+    def test01run(self):
+        p = self.proj(build_types=['Debug', 'Release'])
+        r = p.run(['configure', 'install'])
+        self.assertTrue(r.ok)
+        self.assertEqual([(str(s.build.build_type), s.step) for s in r], [
+            ('Debug', 'configure'), ('Debug', 'install'),
+            ('Release', 'configure'), ('Release', 'install')])
+        for s in r:
+            self.assertEqual(s.returncode, 0)
+            self.assertGreater(s.duration, 0.)
+            self.assertTrue(os.path.exists(s.log), s.log)
+        with open(r.results[1].log) as f:
+            log = f.read()
+        self.assertIn("$ cd ", log)
+        self.assertIn("faketc cmake: install", log)
+        self.assertEqual(r.json_data()['results'][0]['step'], 'configure')
+
+    def test02failure(self):
+        p = self.proj()
+        with mock.patch.dict(os.environ, {'FAKETC_FAIL': 'build'}):
+            r = p.run(['build', 'install'])
+        self.assertFalse(r.ok)
+        self.assertEqual(len(r), 1)
+        s = r.failed[0]
+        self.assertEqual((s.step, s.returncode), ('build', 2))
+        self.assertIn("faketc: build failed", s.error + open(s.log).read())
+        with self.assertRaises(err.Error):
+            p.run('compile')
+
+    def test03async(self):
+        p = self.proj()
+        async def main():
+            r = await p.arun('build')
+            plan = await p.aplan('install')
+            return r, plan
+        r, plan = asyncio.run(main())
+        self.assertTrue(r.ok)
+        self.assertEqual(plan.command, 'install')
+        self.assertEqual(list(plan.builds[0][1].keys())[-1], 'install')
+
+    def test04parallel(self):
+        p = self.proj(build_types=['Debug', 'Release'])
+        r = p.run('build', parallel=2)
+        self.assertTrue(r.ok, r.failed)
+        self.assertEqual([str(s.build.build_type) for s in r], ['Debug', 'Release'])
+        for s in r:
+            self.assertEqual(s.returncode, 0)
+            with open(s.log) as f:
+                self.assertIn("faketc", f.read())
+
+    def test05log_has_cmany_messages(self):
+        p = self.proj()
+        self.assertTrue(p.run('configure').ok)
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+            r = p.run('configure')
+        self.assertTrue(r.ok, r.failed)
+        with open(r.results[0].log) as f:
+            self.assertIn(": configure is up to date", f.read())
+        self.assertNotIn(": configure is up to date", out.getvalue())
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
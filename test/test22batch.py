@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+
+from c4.cmany.project import Project, ProjectCache
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+# -----------------------------------------------------------------------------
+class Test00Batch(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.batch.'
+
+    def setUp(self):
+        super().setUp()
+        dirs = (f"--build-dir {os.path.join(self.tmpdir, 'build')} "
+                f"--install-dir {os.path.join(self.tmpdir, 'install')}")
+        self.proj = f"{dirs} {os.path.join(mydir, 'libhello')}"
+
+    def batch(self, lines, *args):
+        return self.cmany('batch', '-', *args, input="\n".join(lines))
+
+    def test00shared(self):
+        r = self.batch([
+            "# comments and empty lines are skipped",
+            "",
+            f"cmany configure -t Debug,Release {self.proj}",
+            f"build -t Debug,Release {self.proj} hello",
+            f"show_build_names -t Debug,Release {self.proj}  # trailing comment",
+        ])
+        self.assertEqual(r.returncode, 0, r.stdout)
+        self.assertIn("linux-x86_64-gxx12.1-Release\n", r.stdout)
+        calls = self.calls()
+        # the compiler and the system information were probed only once
+        self.assertEqual(len([c for c in calls if c['tool'] == 'g++']), 2)
+        self.assertEqual(len([c for c in calls if '--system-information' in c['args']]), 2)
+        makes = [c['args'] for c in calls if c['tool'] == 'make']
+        self.assertEqual(makes, [['-j', '1', 'hello'], ['-j', '1', 'hello']])
+
+    def test01failure(self):
+        lines = [f"show_build_names {self.proj}",
+                 "build --no-such-option",
+                 f"show_build_dirs {self.proj}"]
+        r = self.batch(lines)
+        self.assertEqual(r.returncode, 1, r.stdout)
+        self.assertIn("commands failed at lines 2", r.stdout)
+        self.assertNotIn(os.path.join(self.tmpdir, 'build', ''), r.stdout)
+        r = self.batch(lines, '--keep-going')
+        self.assertEqual(r.returncode, 1, r.stdout)
+        self.assertIn(os.path.join(self.tmpdir, 'build', ''), r.stdout)
+        r = self.batch(["batch -"])
+        self.assertEqual(r.returncode, 1, r.stdout)
+        self.assertIn("cannot be nested", r.stdout)
+
+
+# -----------------------------------------------------------------------------
+class Test01ProjectCache(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.batch.'
+
+    def setUp(self):
+        super().setUp()
+        self.patch_environ()
+
+    def test00shared_across_commands(self):
+        spec = Project.from_spec(os.path.join(mydir, 'hello'),
+                                 build_dir=os.path.join(self.tmpdir, 'build'),
+                                 install_dir=os.path.join(self.tmpdir, 'install'),
+                                 compilers=[os.path.join(faketc.bindir, 'g++')]).kwargs
+        configure = {k: v for k, v in spec.items() if k not in ('target',)}
+        build = dict(spec, target=['hello'], changed_files=None)
+        cache = ProjectCache()
+        p = cache.get(**configure)
+        self.assertIsNone(p.targets)
+        self.assertIs(cache.get(**build), p)
+        self.assertEqual(p.targets, ['hello'])
+        self.assertIsNot(cache.get(**dict(build, build_types=['Debug'])), p)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
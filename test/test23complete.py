@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+import shutil
+import tempfile
+from unittest import mock
+
+from c4.cmany import conf, complete, fileapi
+from c4.cmany import main
+from c4.cmany import args as c4args
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+# -----------------------------------------------------------------------------
+class Test00Candidates(ut.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.spec = complete.describe(c4args.setup(main.cmds, main))
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.complete.')
+        self.root = os.path.join(self.tmpdir, 'build')
+        for name in ('linux-x86_64-gxx12.1-Debug', 'linux-x86_64-gxx12.1-Release'):
+            d = os.path.join(self.root, name)
+            os.makedirs(d)
+            with open(os.path.join(d, 'CMakeCache.txt'), 'w'):
+                pass
+        os.makedirs(os.path.join(self.root, 'not-a-build'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def c(self, line):
+        words = line.split(' ')
+        return complete.candidates(self.spec, words[:-1], words[-1])
+
+    def test00commands(self):
+        self.assertEqual(self.c("bu"), ['build'])
+        self.assertEqual(self.c("show_b"), ['show_build_dirs', 'show_build_names', 'show_builds'])
+        self.assertIn('rb', self.c(""))
+        self.assertIn('--show-args', self.c("--show"))
+
+    def test01options(self):
+        self.assertEqual(self.c("build --build-t"), ['--build-types'])
+        self.assertEqual(self.c("b --changed"), ['--changed-files'])
+        self.assertEqual(self.c("plan --command re"), ['reconfigure', 'rebuild', 'reinstall'])
+        self.assertEqual(self.c("build --build-dir "), [])
+
+    def test02builds_and_targets(self):
+        bd = f"--build-dir {self.root}"
+        self.assertEqual(self.c(f"rebuild {bd} . linux"),
+                         ['linux-x86_64-gxx12.1-Debug', 'linux-x86_64-gxx12.1-Release'])
+        model = {'targets': [{'name': 'hello'}, {'name': 'test_hello'}]}
+        with mock.patch.object(fileapi, 'load', return_value=model) as load:
+            self.assertEqual(self.c(f"build {bd} proj "), ['hello', 'test_hello'])
+            self.assertEqual(load.call_count, 2)
+            self.assertEqual(self.c(f"run {bd} -tg te"), ['test_hello'])
+        # the first positional is the project dir, completed by the shell
+        self.assertEqual(self.c(f"build {bd} "), [])
+
+
+# -----------------------------------------------------------------------------
+class Test01Autocomplete(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.complete.'
+
+    def setUp(self):
+        super().setUp()
+        self.out = os.path.join(self.tmpdir, 'completions')
+
+    def complete(self, line):
+        if os.path.exists(self.out):
+            os.remove(self.out)
+        r = self.cmany(extra_env=dict(_ARGCOMPLETE='1', COMP_LINE=line, COMP_POINT=str(len(line)),
+                                      _ARGCOMPLETE_STDOUT_FILENAME=self.out))
+        self.assertEqual(r.returncode, 0, r.stdout)
+        with open(self.out) as f:
+            return f.read()
+
+    def test00from_cache(self):
+        cache = os.path.join(self.env['CMANY_USER_DIR'], complete.cache_name)
+        # the other commands do not save the description
+        r = self.cmany('show_build_names', os.path.join(mydir, 'hello'))
+        self.assertEqual(r.returncode, 0, r.stdout)
+        self.assertFalse(os.path.exists(cache))
+        # the first completion builds the parser and saves its description
+        self.assertEqual(self.complete("cmany show_build_n"), "show_build_names")
+        self.assertTrue(os.path.exists(cache))
+        os.remove(self.log)
+        self.assertEqual(self.complete("cmany show_build_d"), "show_build_dirs")
+        # nothing was probed
+        self.assertEqual(self.calls(), [])
+
+    def test01stale(self):
+        with mock.patch.object(conf, 'USER_DIR', self.userdir):
+            self.assertIsNone(complete.load())
+            complete.save(c4args.setup(main.cmds, main))
+            self.assertIsNotNone(complete.load())
+            with mock.patch.object(complete, 'stamp', return_value=['changed']):
+                self.assertIsNone(complete.load())
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+import shutil
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+# -----------------------------------------------------------------------------
+class Test00Preload(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.preload.'
+
+    def setUp(self):
+        super().setUp()
+        self.proj = os.path.join(self.tmpdir, 'hello')
+        shutil.copytree(os.path.join(mydir, 'hello'), self.proj,
+                        ignore=shutil.ignore_patterns('.test'))
+        self.builddir = os.path.join(self.tmpdir, 'build', 'linux-x86_64-gxx12.1-Release')
+        self.preload = os.path.join(self.builddir, 'cmany_preload.cmake')
+
+    def cmany(self, *args):
+        r = super().cmany(*args, self.proj)
+        self.assertEqual(r.returncode, 0, r.stdout)
+        return r
+
+    def cmake_runs(self):
+        return len([c for c in self.calls('cmake')
+                    if '--system-information' not in c['args']])
+
+    def test00skip_configure(self):
+        self.cmany('configure')
+        self.assertEqual(self.cmake_runs(), 1)
+        with open(self.preload) as f:
+            txt = f.read()
+        mtime = os.stat(self.preload).st_mtime_ns
+        # nothing changed: cmake does not run, and the preload file is kept
+        r = self.cmany('configure')
+        self.assertIn("configure is up to date", r.stdout)
+        self.cmany('build')
+        self.assertEqual(self.cmake_runs(), 1)
+        self.assertEqual(os.stat(self.preload).st_mtime_ns, mtime)
+        with open(self.preload) as f:
+            self.assertEqual(f.read(), txt)
+        # the project changed
+        with open(os.path.join(self.proj, 'CMakeLists.txt'), 'a') as f:
+            f.write("\n# changed\n")
+        self.cmany('configure')
+        self.assertEqual(self.cmake_runs(), 2)
+        # the variables changed
+        self.cmany('configure', '-V', 'FOO=1')
+        self.assertEqual(self.cmake_runs(), 3)
+        with open(self.preload) as f:
+            self.assertIn('_cmany_set(FOO "1" BOOL)', f.read())
+        self.cmany('configure', '-V', 'FOO=1')
+        self.assertEqual(self.cmake_runs(), 3)
+        # the generated build system is gone
+        for fn in ('Makefile', 'CMakeCache.txt'):
+            with self.subTest(removed=fn):
+                os.remove(os.path.join(self.builddir, fn))
+                runs = self.cmake_runs()
+                r = self.cmany('configure', '-V', 'FOO=1')
+                self.assertNotIn("configure is up to date", r.stdout)
+                self.assertEqual(self.cmake_runs(), runs + 1)
+                self.assertTrue(os.path.exists(os.path.join(self.builddir, fn)))
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()
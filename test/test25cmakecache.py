@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import unittest as ut
+import subtest_fix
+import os
+import sys
+import shutil
+import tempfile
+from unittest import mock
+
+import dill
+
+from c4.cmany import cmake, artifacts
+from c4.cmany.project import Project
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(mydir, 'faketc'))
+
+import faketc
+
+
+_cache = """\
+# This is the CMakeCache file.
+//Flags used by the CXX compiler
+CMAKE_CXX_FLAGS:STRING=-O2
+CMAKE_CXX_COMPILER:STRING=/usr/bin/g++
+CMAKE_INSTALL_PREFIX:PATH=/usr/local
+FOO:BOOL=ON
+"""
+
+
+# -----------------------------------------------------------------------------
+class Test00CMakeCache(ut.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='cmany.cmakecache.')
+        self.cache_file = os.path.join(self.tmpdir, 'CMakeCache.txt')
+        with open(self.cache_file, 'w') as f:
+            f.write(_cache)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test00lazy(self):
+        c = cmake.CMakeCache(self.tmpdir)
+        # setting vars does not read the file
+        c.f('CMAKE_CXX_COMPILER', '/usr/bin/g++', from_input=True)
+        c.p('CMAKE_INSTALL_PREFIX', '/opt/foo', from_input=True)
+        self.assertEqual(len(c._vars), 0)
+        self.assertTrue(c.dirty)
+        # only the vars which were set or asked for are kept
+        self.assertEqual(list(c._vars.keys()), ['CMAKE_CXX_COMPILER', 'CMAKE_INSTALL_PREFIX'])
+        self.assertFalse(c['CMAKE_CXX_COMPILER'].dirty)
+        self.assertTrue(c['CMAKE_INSTALL_PREFIX'].dirty)
+        self.assertEqual(c['FOO'].val, 'ON')
+        self.assertNotIn('BAR', c)
+        self.assertEqual(c.keys(), ['CMAKE_CXX_FLAGS', 'CMAKE_CXX_COMPILER',
+                                    'CMAKE_INSTALL_PREFIX', 'FOO'])
+        self.assertTrue(c.commit(self.tmpdir))
+        self.assertFalse(c.dirty)
+        self.assertEqual(cmake.getcachevar(self.tmpdir, 'CMAKE_INSTALL_PREFIX'), '/opt/foo')
+        self.assertEqual(cmake.getcachevar(self.tmpdir, 'CMAKE_CXX_FLAGS'), '-O2')
+
+    def test01no_file(self):
+        c = cmake.CMakeCache(os.path.join(self.tmpdir, 'nothere'))
+        self.assertTrue(c.s('FOO', 'bar'))
+        self.assertTrue(c.dirty)
+        self.assertEqual(c.keys(), ['FOO'])
+
+    def test02serialize(self):
+        c = cmake.CMakeCache(self.tmpdir)
+        c.s('CMAKE_CXX_FLAGS', '-O3', from_input=True)
+        self.assertEqual(c['CMAKE_CXX_FLAGS'].val, '-O3')
+        c2 = dill.loads(dill.dumps(c, 0))
+        v = c2['CMAKE_CXX_FLAGS']
+        self.assertEqual((v.name, v.val, v.vartype, v.dirty, v.from_input),
+                         ('CMAKE_CXX_FLAGS', '-O3', 'STRING', True, True))
+        self.assertFalse(hasattr(v, '__dict__'))
+
+    def test03lookups_use_the_index(self):
+        c = cmake.CMakeCache(self.tmpdir)
+        with mock.patch.object(cmake, '_indexvars', wraps=cmake._indexvars) as index, \
+             mock.patch.object(cmake, '_readvars', wraps=cmake._readvars) as read:
+            for _ in range(3):
+                self.assertNotIn('BAR', c)
+                self.assertIsNone(c.get('BAR'))
+                self.assertEqual(len(c), 4)
+                self.assertIn('FOO', c)
+            self.assertEqual(index.call_count, 1)
+            self.assertEqual(read.call_count, 0)
+            self.assertEqual(c['FOO'].val, 'ON')
+            self.assertEqual(c['FOO'].val, 'ON')
+            self.assertEqual(read.call_count, 1)
+            self.assertEqual([v.val for v in c.values()],
+                             ['-O2', '/usr/bin/g++', '/usr/local', 'ON'])
+            c.values()
+            self.assertEqual(read.call_count, 2)
+            # a changed file is indexed again
+            with open(self.cache_file, 'a') as f:
+                f.write("BAR:STRING=bar\n")
+            self.assertEqual(c['BAR'].val, 'bar')
+            self.assertEqual(len(c), 5)
+            self.assertEqual(index.call_count, 2)
+
+    def test04from_input_vars(self):
+        with open(self.cache_file, 'a') as f:
+            for i in range(5000):
+                f.write(f"VAR{i}:STRING={i}\n")
+        c = cmake.CMakeCache(self.tmpdir)
+        c.s('CMAKE_CXX_FLAGS', '-O3', from_input=True)
+        c.s('VAR10', '10', from_input=True)
+        c.s('NEW', 'new', from_input=True)
+        self.assertIn('FOO', c)
+        self.assertEqual([(v.name, v.val, v.dirty) for v in c.from_input_vars()],
+                         [('CMAKE_CXX_FLAGS', '-O3', True), ('VAR10', '10', False),
+                          ('NEW', 'new', True)])
+        self.assertEqual(len(c._vars), 3)
+        # items() keeps all the vars in memory
+        self.assertEqual(len(list(c.items())), 5005)
+        self.assertEqual(len(c._vars), 5005)
+
+    def test05type_only_changes_are_not_dirty(self):
+        # only the values are committed to the cache, and cmake may store a
+        # var with another type than the given one (eg, the compilers are
+        # given as FILEPATH and stored as STRING)
+        c = cmake.CMakeCache(self.tmpdir)
+        self.assertIsNone(c.f('CMAKE_CXX_COMPILER', '/usr/bin/g++', from_input=True))
+        self.assertFalse(c.dirty)
+        self.assertEqual(c['CMAKE_CXX_COMPILER'].vartype, 'FILEPATH')
+        self.assertFalse(c['CMAKE_CXX_COMPILER'].dirty)
+        self.assertFalse(c.commit(self.tmpdir))
+        self.assertTrue(c.f('CMAKE_CXX_COMPILER', '/usr/bin/clang++'))
+        self.assertTrue(c.dirty)
+
+
+# -----------------------------------------------------------------------------
+class Test01ResidentVars(faketc.FakeTcTestCase, ut.TestCase):
+
+    tmp_prefix = 'cmany.cmakecache.'
+
+    def setUp(self):
+        super().setUp()
+        self.patch_environ()
+
+    def proj(self):
+        return Project.from_spec(os.path.join(mydir, 'hello'),
+                                 build_dir=os.path.join(self.tmpdir, 'build'),
+                                 install_dir=os.path.join(self.tmpdir, 'install'),
+                                 compilers=[os.path.join(faketc.bindir, 'g++')],
+                                 cmake_vars=['FOO=1'])
+
+    def test00configure_and_fingerprint(self):
+        self.proj().configure()
+        b = self.proj().builds[0]
+        # a cache as large as those of real projects
+        with open(b.cachefile, 'a') as f:
+            for i in range(5000):
+                f.write(f"VAR{i}:STRING={i}\n")
+        ninput = len(b.varcache.from_input_vars())
+        self.assertLess(ninput, 20)
+        b.configure()
+        self.assertLessEqual(len(b.varcache._vars), ninput)
+        artifacts.fingerprint(b)
+        self.assertLessEqual(len(b.varcache._vars), ninput)
+        self.assertIn('FOO', [v.name for v in b.varcache.from_input_vars()])
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    ut.main()